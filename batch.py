@@ -0,0 +1,207 @@
+"""
+Batch summary requests, evaluated in the same scan as the summaries.
+
+Instead of one app run per question, analysts' summary requests are
+queued as JSON files in the datasite's requests folder (REQUESTS_DIR in
+main.py), one request per file, named <request name>.json:
+
+  {
+    "group_by": ["race", "strategy_type"],   optional; default: one group
+    "metrics": ["sample_count", "confidence"],
+                                             optional numeric fields
+    "quantiles": [0.5, 0.9],                 optional; see groupby.py
+    "filter": "confidence > 0.8",            optional; see filters.py
+    "output": "confident_strategies.json"    optional; default: <name>.json
+  }
+
+Per group, the number of patterns and, for every metrics field, its
+count, sum, mean, min, max, standard deviation and approximate quantiles
+are published (see groupby.py).
+
+Every queued request is compiled once and evaluated on each entry of the
+run's single pass over the patterns, and each result is published to its
+own file in the public results folder. Requests stay queued: like the
+other summaries, their results are refreshed whenever the dataset (or
+the queue) changes.
+
+Group keys are field values (race and strategy_type normalized, see
+normalize.py), so groups of fewer than MIN_GROUP_SIZE patterns are
+suppressed (only their number is published); grouping by an identifying
+field can never single out a pattern.
+
+A malformed request does not fail the run; its result file holds the
+error message instead.
+"""
+
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+import re
+
+from decoder import loads
+from filters import Filter, FilterError
+from groupby import DEFAULT_QUANTILES, GroupBy
+
+# Smallest number of patterns a group must have to be published.
+MIN_GROUP_SIZE = 5
+
+# Request names and output file names; both end up in public file names.
+_NAME = re.compile(r"[A-Za-z0-9_-]+")
+_OUTPUT_NAME = re.compile(r"[A-Za-z0-9_-][A-Za-z0-9_.-]*\.json")
+_FIELD_PATH = re.compile(r"[A-Za-z_][A-Za-z0-9_]*(?:\.[A-Za-z_][A-Za-z0-9_]*)*")
+
+_SPEC_KEYS = {"group_by", "metrics", "quantiles", "filter", "output"}
+
+
+class RequestError(ValueError):
+    """A queued summary request is invalid."""
+
+
+def _field_list(spec: dict, key: str) -> List[str]:
+    fields = spec.get(key, [])
+    if isinstance(fields, str):
+        fields = [fields]
+    if not isinstance(fields, list) or not all(
+        isinstance(field, str) and _FIELD_PATH.fullmatch(field) for field in fields
+    ):
+        raise RequestError(f"{key} must be a list of field names")
+    return fields
+
+
+class SummaryRequest:
+    """One compiled request: a filter plus a group-by."""
+
+    def __init__(self, name: str, spec: dict) -> None:
+        if not isinstance(spec, dict):
+            raise RequestError("a request must be a JSON object")
+        unknown = set(spec) - _SPEC_KEYS
+        if unknown:
+            raise RequestError(f"unknown request keys: {', '.join(sorted(unknown))}")
+
+        group_by = _field_list(spec, "group_by")
+        metrics = _field_list(spec, "metrics")
+        quantiles = spec.get("quantiles", list(DEFAULT_QUANTILES))
+        if not isinstance(quantiles, list) or not all(
+            isinstance(q, (int, float)) and not isinstance(q, bool) and 0 <= q <= 1
+            for q in quantiles
+        ):
+            raise RequestError("quantiles must be a list of numbers between 0 and 1")
+
+        output = spec.get("output", f"{name}.json")
+        if not isinstance(output, str) or not _OUTPUT_NAME.fullmatch(output):
+            raise RequestError(f"output must be a plain .json file name, got {output!r}")
+
+        expression = spec.get("filter")
+        try:
+            self.filter = Filter(name, expression) if expression is not None else None
+        except FilterError as exc:
+            raise RequestError(str(exc)) from None
+
+        self.name = name
+        self.spec = spec
+        self.output = output
+        self.groups = GroupBy(group_by, metrics, quantiles)
+
+    @property
+    def fields(self) -> frozenset:
+        """Top-level entry fields the request reads."""
+        fields = self.groups.fields
+        if self.filter is not None:
+            fields |= self.filter.fields
+        return fields
+
+    def observe(self, entry: dict) -> None:
+        if self.filter is None or self.filter.predicate(entry):
+            self.groups.add(entry)
+
+    def to_dict(self) -> dict:
+        """
+        The privacy-safe result document. Groups are sorted by their
+        values, so the document does not depend on the input order.
+        """
+        rows, suppressed = self.groups.rows(MIN_GROUP_SIZE)
+        return {
+            "request": self.name,
+            "group_by": self.groups.keys,
+            "metrics": self.groups.metrics,
+            "filter": self.filter.expression if self.filter is not None else None,
+            "matching_patterns": self.groups.total,
+            "groups": rows,
+            "suppressed_groups": suppressed,
+        }
+
+
+class RequestQueue:
+    """All queued requests, evaluated together on every entry."""
+
+    def __init__(self) -> None:
+        self.requests: List[SummaryRequest] = []
+        # name -> (output file name, error message) of rejected requests.
+        self.rejected: Dict[str, Tuple[str, str]] = {}
+        # name -> raw spec of every queued request, valid or not.
+        self.specs: Dict[str, object] = {}
+
+    def __bool__(self) -> bool:
+        return bool(self.requests)
+
+    @property
+    def fields(self) -> frozenset:
+        return frozenset().union(*(request.fields for request in self.requests))
+
+    def observe(self, entry: dict) -> None:
+        for request in self.requests:
+            request.observe(entry)
+
+    def state(self) -> dict:
+        """The aggregates so far, to resume from (see checkpoint.py)."""
+        return {request.name: request.groups.state() for request in self.requests}
+
+    def restore(self, state: dict) -> None:
+        """Continue from aggregates saved by state()."""
+        for request in self.requests:
+            request.groups.restore(state[request.name])
+
+    def outputs(self) -> Iterable[str]:
+        """Output file names of all requests, valid or not."""
+        for request in self.requests:
+            yield request.output
+        for output, _error in self.rejected.values():
+            yield output
+
+    def documents(self) -> Iterable[Tuple[str, dict]]:
+        """(output file name, result document) per queued request."""
+        for request in self.requests:
+            yield request.output, request.to_dict()
+        for name, (output, error) in self.rejected.items():
+            yield output, {"request": name, "error": error}
+
+
+def load_requests(requests_dir: Path) -> RequestQueue:
+    """Read and compile every request queued in `requests_dir`."""
+    queue = RequestQueue()
+    if not requests_dir.is_dir():
+        return queue
+
+    outputs = set()
+    for path in sorted(requests_dir.glob("*.json")):
+        name = path.stem
+        if not _NAME.fullmatch(name):
+            print(f"[App] Ignoring request with an invalid file name: {path.name}")
+            continue
+        spec: Optional[object] = None
+        try:
+            spec = loads(path.read_bytes())
+            request = SummaryRequest(name, spec)
+            if request.output in outputs:
+                raise RequestError(f"another request already writes {request.output}")
+        except (OSError, ValueError) as exc:
+            print(f"[App] Request {name} rejected: {exc}")
+            output = f"{name}.json"
+            if output in outputs:
+                continue
+            queue.rejected[name] = (output, str(exc))
+        else:
+            queue.requests.append(request)
+            output = request.output
+        outputs.add(output)
+        queue.specs[name] = spec
+    return queue
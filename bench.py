@@ -0,0 +1,286 @@
+"""
+Benchmark harness for the summary pipeline.
+
+This script is NOT run by SyftBox. It is a developer tool that:
+  - Generates synthetic patterns.json datasets of a configurable size
+    (10k to 50M patterns) with realistic signature payloads and
+    race/strategy distributions
+  - Lays them out in a temporary SyftBox directory tree
+  - Runs the real pipeline (main.summarize_datasite) against that tree
+  - Reports wall time, peak RSS and throughput (patterns/s)
+  - Saves the results as JSON for regression comparison
+
+Usage:
+    python bench.py --sizes 10k 100k 1M --output bench_results.json
+
+Datasets can be laid out as patterns.json or as patterns.jsonl
+(--layouts), and every run can be repeated per JSON backend
+(--json-backends, see decoder.py) to compare them:
+    python bench.py --sizes 100k 1M --layouts json jsonl --json-backends json auto
+
+Every measurement runs in a fresh Python process, so peak RSS and
+interpreter startup are measured exactly as SyftBox would see them.
+"""
+
+from pathlib import Path
+from typing import List
+import argparse
+import json
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+# The app itself (main.py next to this file).
+import main as app
+from convert import convert_to_json_lines
+from decoder import use_json_backend
+from instrument import peak_rss_bytes
+
+# Datasite owner used inside the temporary SyftBox tree.
+BENCH_OWNER = "bench@example.com"
+
+# Relative frequency of each race value in generated data. Includes the
+# messy variants real datasets contain (casing, missing values).
+RACE_WEIGHTS = {
+    "Protoss": 30,
+    "protoss": 3,
+    "Terran": 30,
+    "Zerg": 30,
+    "Random": 4,
+    None: 3,
+}
+
+# Plausible strategy types per race; a few patterns get none at all.
+STRATEGY_TYPES = {
+    "protoss": ["protoss_aggression", "economic_expansion", "tech_rush", "proxy_gates", "carrier_turtle"],
+    "terran": ["bio_timing", "economic_expansion", "mech_turtle", "proxy_rax", "drop_harass"],
+    "zerg": ["ling_flood", "economic_expansion", "roach_timing", "muta_harass", "ravager_allin"],
+    "random": ["economic_expansion", "cheese"],
+}
+
+UNITS = {
+    "protoss": ["Probe", "Pylon", "Gateway", "Assimilator", "CyberneticsCore", "Stalker", "WarpGate", "Nexus"],
+    "terran": ["SCV", "SupplyDepot", "Barracks", "Refinery", "Factory", "Marine", "OrbitalCommand"],
+    "zerg": ["Drone", "Overlord", "SpawningPool", "Extractor", "Hatchery", "Zergling", "Queen"],
+}
+
+# Benchmark scenarios, run in this order against the same dataset:
+#   cold       - no private state at all (first run on a datasite)
+#   unchanged  - same input again; should hit the skip-if-unchanged path
+#   index      - summaries deleted, input unchanged; pattern index path
+#   cache      - the same with the pattern index off; columnar cache path
+SCENARIOS = ("cold", "unchanged", "index", "cache")
+
+# Dataset layouts: the patterns.json object, or patterns.jsonl.
+LAYOUTS = ("json", "jsonl")
+
+
+# ================================================================
+# SYNTHETIC DATA
+# ================================================================
+
+def parse_size(text: str) -> int:
+    """Parse a pattern count such as 10000, 10k or 50M."""
+    multipliers = {"k": 1_000, "m": 1_000_000}
+    suffix = text[-1].lower()
+    if suffix in multipliers:
+        return int(float(text[:-1]) * multipliers[suffix])
+    return int(text)
+
+
+def _synthetic_entry(rnd: random.Random, races: list, weights: list) -> dict:
+    """One realistic pattern entry."""
+    race = rnd.choices(races, weights)[0]
+    race_key = (race or "random").lower()
+    units = UNITS.get(race_key, UNITS["protoss"])
+
+    supply = 12
+    steps = []
+    for _ in range(rnd.randint(6, 18)):
+        supply += rnd.randint(0, 3)
+        steps.append({
+            "supply": supply,
+            "unit": rnd.choice(units),
+            "time": f"{supply // 6}:{rnd.randint(0, 59):02d}",
+        })
+
+    entry = {
+        "race": race,
+        "strategy_type": rnd.choice(STRATEGY_TYPES[race_key]) if rnd.random() > 0.02 else None,
+        "signature": {"early_game": steps, "key_timings": {s["unit"]: s["time"] for s in steps[:4]}},
+        "sample_count": int(rnd.paretovariate(1.5)) + 1,
+        "confidence": round(rnd.betavariate(5, 2), 4),
+        "games_seen": [f"replay_{rnd.getrandbits(32):08x}" for _ in range(rnd.randint(1, 4))],
+    }
+    if race is None:
+        del entry["race"]
+    return entry
+
+
+def generate_patterns(path: Path, count: int, seed: int = 0) -> None:
+    """
+    Write a synthetic patterns.json with `count` entries to `path`.
+
+    Entries are written one at a time, so generating 50M patterns needs
+    no more memory than generating 10k.
+    """
+    rnd = random.Random(seed)
+    races = list(RACE_WEIGHTS)
+    weights = list(RACE_WEIGHTS.values())
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w", encoding="utf-8") as f:
+        f.write("{")
+        for i in range(count):
+            if i:
+                f.write(",")
+            f.write(f'\n  "pattern_{i:08d}": ')
+            json.dump(_synthetic_entry(rnd, races, weights), f)
+        f.write("\n}\n")
+
+
+def dataset_path(data_dir: Path, count: int, seed: int, layout: str = "json") -> Path:
+    """Path of the (reusable) generated dataset for a size, seed and layout."""
+    return data_dir / f"patterns-{count}-seed{seed}.{layout}"
+
+
+def ensure_dataset(data_dir: Path, count: int, seed: int, layout: str) -> Path:
+    """Generate the dataset for a size, seed and layout unless it exists."""
+    source = dataset_path(data_dir, count, seed, layout)
+    if source.exists():
+        return source
+    if layout == "jsonl":
+        # Same patterns as the .json dataset, so results are comparable.
+        json_source = ensure_dataset(data_dir, count, seed, "json")
+        print(f"[Bench] Converting {count:,} patterns -> {source}")
+        convert_to_json_lines(json_source, [source])
+    else:
+        print(f"[Bench] Generating {count:,} patterns -> {source}")
+        generate_patterns(source, count, seed)
+    return source
+
+
+# ================================================================
+# MEASUREMENT
+# ================================================================
+
+def _run_one(datasite_root: Path, result_path: Path, json_backend: str, pattern_index: bool) -> None:
+    """Child-process side: run the pipeline once and record measurements."""
+    app.JSON_BACKEND = json_backend
+    app.PATTERN_INDEX = pattern_index
+    started = time.perf_counter()
+    status = app.summarize_datasite(datasite_root)
+    result = {
+        "json_backend": use_json_backend(json_backend),
+        "status": status,
+        "wall_seconds": time.perf_counter() - started,
+        "peak_rss_bytes": peak_rss_bytes(),
+    }
+    result_path.write_text(json.dumps(result), encoding="utf-8")
+
+
+def measure(datasite_root: Path, json_backend: str, pattern_index: bool = True) -> dict:
+    """Run the pipeline in a fresh interpreter and return its measurements."""
+    with tempfile.TemporaryDirectory() as tmp:
+        result_path = Path(tmp) / "result.json"
+        started = time.perf_counter()
+        subprocess.run(
+            [sys.executable, str(Path(__file__).resolve()), "--run-one",
+             str(datasite_root), str(result_path), "--json-backend", json_backend,
+             "--pattern-index", "on" if pattern_index else "off"],
+            check=True,
+            stdout=subprocess.DEVNULL,
+        )
+        result = json.loads(result_path.read_text(encoding="utf-8"))
+        # Including interpreter startup, as SyftBox pays it on every run.
+        result["process_seconds"] = time.perf_counter() - started
+    return result
+
+
+def bench_size(count: int, data_dir: Path, seed: int, layout: str, json_backend: str) -> List[dict]:
+    """Benchmark every scenario for one dataset size, layout and backend."""
+    source = ensure_dataset(data_dir, count, seed, layout)
+    source_bytes = source.stat().st_size
+    target_name = f"patterns.{layout}"
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="syftbox-bench-") as tmp:
+        # Same layout SyftBox uses: SyftBox/datasites/<owner>/...
+        datasite_root = Path(tmp) / "datasites" / BENCH_OWNER
+        dataset_dir = datasite_root / app.DATASET_REL_PATH
+        dataset_dir.mkdir(parents=True)
+        try:
+            (dataset_dir / target_name).symlink_to(source)
+        except OSError:  # no symlink permission (e.g. Windows)
+            shutil.copyfile(source, dataset_dir / target_name)
+
+        for scenario in SCENARIOS:
+            if scenario in ("index", "cache"):
+                shutil.rmtree(datasite_root / "public", ignore_errors=True)
+
+            result = measure(datasite_root, json_backend, pattern_index=scenario != "cache")
+            result.update({
+                "patterns": count,
+                "layout": layout,
+                "scenario": scenario,
+                "input_bytes": source_bytes,
+                "patterns_per_second": count / result["wall_seconds"] if result["wall_seconds"] else None,
+            })
+            results.append(result)
+
+            rss = result["peak_rss_bytes"]
+            print(
+                f"[Bench] {count:>12,} patterns  {layout:<5}  {result['json_backend']:<7}  {scenario:<9}  "
+                f"{result['wall_seconds']:9.3f}s  "
+                f"{(rss or 0) / 2**20:9.1f} MiB peak  "
+                f"{result['patterns_per_second'] or 0:14,.0f} patterns/s  ({result['status']})"
+            )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the summary pipeline.")
+    parser.add_argument("--sizes", nargs="+", default=["10k", "100k"],
+                        help="dataset sizes in patterns, e.g. 10k 1M 50M")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for generated data")
+    parser.add_argument("--data-dir", type=Path, default=Path(tempfile.gettempdir()) / "syftbox-bench-data",
+                        help="where generated datasets are kept and reused")
+    parser.add_argument("--output", type=Path, default=Path("bench_results.json"),
+                        help="where to save the JSON results")
+    parser.add_argument("--layouts", nargs="+", choices=LAYOUTS, default=["json"],
+                        help="dataset layouts to benchmark")
+    parser.add_argument("--json-backends", nargs="+", default=["auto"],
+                        help="JSON backends to benchmark, e.g. json auto orjson msgspec")
+    parser.add_argument("--run-one", nargs=2, metavar=("DATASITE", "RESULT"), help=argparse.SUPPRESS)
+    parser.add_argument("--json-backend", default="auto", help=argparse.SUPPRESS)
+    parser.add_argument("--pattern-index", choices=("on", "off"), default="on", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_one:
+        _run_one(Path(args.run_one[0]), Path(args.run_one[1]), args.json_backend, args.pattern_index == "on")
+        return
+
+    results = []
+    for size in args.sizes:
+        for layout in args.layouts:
+            for json_backend in args.json_backends:
+                results.extend(
+                    bench_size(parse_size(size), args.data_dir, args.seed, layout, json_backend)
+                )
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    args.output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(f"[Bench] Results saved to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+Counting engines for the (race, strategy_type) breakdowns.
+
+Instead of normalizing every entry with pattern_contribution() and
+updating counters one entry at a time, the raw "race" and
+"strategy_type" values are dictionary-encoded into two integer code
+arrays (two dictionary lookups and two array appends per entry), and all
+pairs are counted at once at the end:
+
+  numpy   - numpy.bincount over the combined code
+            race * <number of strategies> + strategy,
+            i.e. a 2-D histogram in a few C calls
+  python  - Counter(zip(...)) over the code arrays (always available)
+
+Only the DISTINCT value pairs then go through pattern_contribution(), so
+the result is identical to counting entry by entry.
+
+NumPy is optional: "auto" uses it when it is installed and the pure
+Python engine otherwise. No extra dependency is required.
+"""
+
+from array import array
+from collections import Counter
+from typing import Dict, Optional, Sequence
+import importlib.util
+
+from summary import SummaryAccumulator, pattern_contribution
+
+# Engines tried, in order, by use_engine("auto").
+ENGINES = ("numpy", "python")
+
+# Smallest unsigned typecodes first; a column is widened on demand once
+# its dictionary outgrows the current type.
+TYPECODES = ("B", "H", "I")
+
+# Rows combined per bincount call, which bounds the temporary arrays.
+_NUMPY_BLOCK_ROWS = 1 << 20
+
+# Engine in use; None until use_engine() (or the first count) picks one.
+_engine: Optional[str] = None
+
+# The numpy module, imported on the first count that needs it.
+_numpy = None
+
+
+def use_engine(name: str = "auto") -> str:
+    """
+    Select the counting engine: "auto" or one of ENGINES.
+
+    A named engine that is not installed falls back to "python" with a
+    warning. Returns the name of the engine now in use.
+
+    Only checks that NumPy is installed: the import itself waits for the
+    first count, so runs that count nothing (e.g. an unchanged dataset)
+    never pay for it.
+    """
+    global _engine
+
+    if name not in ("auto",) + ENGINES:
+        raise ValueError(f"unknown aggregation engine: {name!r}")
+    _engine = "python"
+    if name in ("auto", "numpy"):
+        if importlib.util.find_spec("numpy") is not None:
+            _engine = "numpy"
+        elif name == "numpy":
+            print("[App] Aggregation engine 'numpy' is not installed; using 'python'")
+    return _engine
+
+
+def engine() -> str:
+    """Name of the counting engine in use."""
+    return _engine or use_engine("auto")
+
+
+def _import_numpy():
+    global _numpy
+
+    if _numpy is None:
+        import numpy
+
+        _numpy = numpy
+    return _numpy
+
+
+class CodeColumn:
+    """One dictionary-encoded column: integer codes plus their values."""
+
+    def __init__(self) -> None:
+        self.codes = array(TYPECODES[0])
+        self.values = []
+        self._index: Dict[Optional[str], int] = {}
+        self._append_code = self.codes.append
+
+    def append(self, value) -> None:
+        try:
+            self._append_code(self._index[value])
+        except (KeyError, TypeError):
+            self._append_new(value)
+
+    def _append_new(self, value) -> None:
+        try:
+            code = self._index.get(value)
+        except TypeError:
+            # Only hashable scalars can be dictionary-encoded; anything
+            # else is not a valid category and is stored as missing.
+            value = None
+            code = self._index.get(value)
+        if code is None:
+            code = self._index[value] = len(self.values)
+            self.values.append(value)
+            limit = 1 << (8 * self.codes.itemsize)
+            if code >= limit:
+                wider = TYPECODES[TYPECODES.index(self.codes.typecode) + 1]
+                self.codes = array(wider, self.codes)
+                self._append_code = self.codes.append
+        self._append_code(code)
+
+
+def count_code_pairs(
+    race_codes: Sequence[int], strategy_codes: Sequence[int], races: int, strategies: int
+) -> Counter:
+    """
+    Count (race code, strategy code) pairs of two equally long code
+    arrays (arrays or memoryviews of unsigned integers). `races` and
+    `strategies` are the numbers of distinct codes in each.
+    """
+    if engine() == "python":
+        return Counter(zip(race_codes, strategy_codes))
+
+    np = _import_numpy()
+    race_array = np.frombuffer(race_codes, dtype=_typecode(race_codes))
+    strategy_array = np.frombuffer(strategy_codes, dtype=_typecode(strategy_codes))
+    counts = np.zeros(races * strategies, dtype=np.int64)
+    for start in range(0, len(race_array), _NUMPY_BLOCK_ROWS):
+        block = race_array[start:start + _NUMPY_BLOCK_ROWS].astype(np.int64)
+        block *= strategies
+        block += strategy_array[start:start + _NUMPY_BLOCK_ROWS]
+        counts += np.bincount(block, minlength=len(counts))
+    return Counter({
+        divmod(int(code), strategies): int(counts[code]) for code in np.flatnonzero(counts)
+    })
+
+
+def _typecode(codes) -> str:
+    return codes.typecode if isinstance(codes, array) else codes.format
+
+
+def accumulate_value_pairs(pairs: Counter) -> SummaryAccumulator:
+    """
+    Build a summary from counts of raw (race, strategy_type) values,
+    running each distinct pair through pattern_contribution() once.
+    """
+    acc = SummaryAccumulator()
+    for (race, strategy_type), count in pairs.items():
+        acc.add(pattern_contribution({"race": race, "strategy_type": strategy_type}), count)
+    return acc
+
+
+class PairCounter:
+    """
+    Breakdown of a stream of entries: add() every entry, then call
+    accumulate() once.
+    """
+
+    def __init__(self) -> None:
+        self.races = CodeColumn()
+        self.strategies = CodeColumn()
+
+    def add(self, entry: dict) -> None:
+        self.races.append(entry.get("race"))
+        self.strategies.append(entry.get("strategy_type"))
+
+    def value_pairs(self) -> Counter:
+        """Counts of the raw (race, strategy_type) value pairs seen."""
+        code_pairs = count_code_pairs(
+            self.races.codes,
+            self.strategies.codes,
+            len(self.races.values),
+            len(self.strategies.values),
+        )
+        races, strategies = self.races.values, self.strategies.values
+        return Counter({(races[r], strategies[s]): count for (r, s), count in code_pairs.items()})
+
+    def accumulate(self) -> SummaryAccumulator:
+        return accumulate_value_pairs(self.value_pairs())
@@ -0,0 +1,227 @@
+"""
+Time budgets and resumable full passes over the patterns dataset.
+
+SyftBox runs the app on a schedule, without a time limit of its own, so
+a huge dataset could keep the owner's machine busy for a long time or
+still be running when the next scheduled run starts. With a time budget
+(TIME_BUDGET_SECONDS in main.py), a full pass that is not done by the
+deadline stops there, and the next run carries on where it stopped:
+
+  - Every CHECKPOINT_SECONDS, and at the deadline, the pass saves a
+    checkpoint to the PRIVATE state folder: the position just past the
+    last entry it saw (file and byte offset, see reader.DatasetCursor),
+    and the running state of everything computed in the pass (summary
+    totals, comment join, filters, requests).
+  - A run that finds a checkpoint of the same input (content hashes)
+    and settings resumes from its position; any other checkpoint is
+    ignored.
+  - Nothing is published until a pass is complete, so readers never see
+    partial totals. The checkpoint is then removed.
+
+Only work since the last checkpoint is lost if the process is killed; a
+run that reaches its deadline always checkpoints before it stops.
+
+Budgets are measured on the wall clock or, with the "cpu" clock, in CPU
+time of this process (all of its threads, but not of worker processes).
+"""
+
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import time
+
+from reader import DatasetCursor, Fields
+from state import read_json_object, write_json_atomic
+from summary import SUMMARY_VERSION, SummaryAccumulator, pattern_contribution
+
+# Bump the first part whenever the layout of checkpoint files changes;
+# older checkpoints are then ignored. So are checkpoints of another
+# summary.SUMMARY_VERSION, whose running totals counted other
+# contributions. (Up to 3, checkpoints carried state.STATE_VERSION.)
+CHECKPOINT_VERSION = f"5.{SUMMARY_VERSION}"
+
+# Budget clocks: elapsed wall time, or CPU time of this process.
+CLOCKS = {"wall": time.monotonic, "cpu": time.process_time}
+
+# The clock is checked once per this many entries.
+_CHECK_EVERY = 1024
+
+
+class Budget:
+    """A time budget that starts when it is created; None is unlimited."""
+
+    def __init__(self, seconds: Optional[float] = None, clock: str = "wall") -> None:
+        if clock not in CLOCKS:
+            raise ValueError(f"unknown budget clock: {clock!r}")
+        self.seconds = seconds
+        self.clock = clock
+        self._now = CLOCKS[clock]
+        self._started = self._now()
+
+    def __bool__(self) -> bool:
+        return self.seconds is not None
+
+    def used(self) -> float:
+        return self._now() - self._started
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left (never negative), or None if unlimited."""
+        if self.seconds is None:
+            return None
+        return max(0.0, self.seconds - self.used())
+
+    def expired(self) -> bool:
+        return self.seconds is not None and self.used() >= self.seconds
+
+
+class ScanCheckpoint:
+    """
+    The checkpoint file of one pass over a dataset. Only a checkpoint of
+    the input identified by `source` (JSON-serializable, e.g. content
+    hashes), taken with the same `settings`, is ever loaded.
+    """
+
+    def __init__(self, path: Path, source, settings=None) -> None:
+        self.path = path
+        self.source = source
+        self.settings = settings
+
+    def load(self) -> Optional[dict]:
+        saved = read_json_object(self.path)
+        if (
+            saved.get("version") != CHECKPOINT_VERSION
+            or self.source is None
+            or saved.get("source") != self.source
+            or saved.get("settings") != self.settings
+        ):
+            return None
+        return saved
+
+    def save(self, position: Tuple[int, int], parts: Dict[str, object]) -> None:
+        write_json_atomic(
+            self.path,
+            {
+                "version": CHECKPOINT_VERSION,
+                "source": self.source,
+                "settings": self.settings,
+                "position": list(position),
+                "parts": {name: part.state() for name, part in parts.items()},
+            },
+            separators=(",", ":"),
+        )
+
+    def clear(self) -> None:
+        self.path.unlink(missing_ok=True)
+
+
+class _SummaryPart:
+    """The running summary totals of a scan, as a part of its pass."""
+
+    def __init__(self) -> None:
+        self.acc = SummaryAccumulator()
+
+    def state(self) -> dict:
+        return self.acc.to_dict()
+
+    def restore(self, state: dict) -> None:
+        self.acc = SummaryAccumulator.from_dict(state)
+
+
+def resumable_pass(
+    paths: List[Path],
+    checkpoint: ScanCheckpoint,
+    budget: Budget,
+    interval: float,
+    fields: Fields = None,
+    on_entry=None,
+    parts: Optional[Dict[str, object]] = None,
+) -> Tuple[bool, dict]:
+    """
+    Call `on_entry` with the ID and entry of every pattern in the files
+    `paths` within `budget`, resuming from `checkpoint`.
+
+    `parts` names the things `on_entry` accumulates (e.g. a FilterSet);
+    each one needs state() and restore() methods, and is restored from
+    the checkpoint before the pass continues.
+
+    Returns whether the pass is complete (if not, the deadline came first
+    and a checkpoint was saved), and stats: the offset into all files
+    together that the run resumed from and got to, the position (file,
+    offset) it got to and the entries it saw. A checkpoint is saved every
+    `interval` seconds of wall time as well.
+    """
+    parts = parts or {}
+    start = (0, 0)
+    saved = checkpoint.load()
+    if saved is not None:
+        for name, part in parts.items():
+            part.restore(saved["parts"][name])
+        start = tuple(saved["position"])
+
+    cursor = DatasetCursor(paths, fields, start)
+    resumed_from = cursor.bytes_read()
+    patterns = iter(cursor)
+    entries = 0
+    complete = True
+    next_checkpoint = time.monotonic() + interval
+    for pattern_id, entry in patterns:
+        on_entry(pattern_id, entry)
+        entries += 1
+        if entries % _CHECK_EVERY == 0:
+            if budget.expired():
+                complete = False
+                break
+            if time.monotonic() >= next_checkpoint:
+                checkpoint.save(cursor.position(), parts)
+                next_checkpoint = time.monotonic() + interval
+    patterns.close()
+
+    stats = {
+        "resumed_from": resumed_from,
+        "offset": cursor.bytes_read(),
+        "position": list(cursor.position()),
+        "entries": entries,
+    }
+    if not complete:
+        checkpoint.save(cursor.position(), parts)
+        return False, stats
+    checkpoint.clear()
+    return True, stats
+
+
+def resumable_scan(
+    patterns_path: Path,
+    checkpoint: ScanCheckpoint,
+    budget: Budget,
+    interval: float,
+    fields: Fields = None,
+    on_entry=None,
+    parts: Optional[Dict[str, object]] = None,
+) -> Tuple[Optional[SummaryAccumulator], dict]:
+    """
+    Summarize patterns.json within `budget`, resuming from `checkpoint`;
+    a resumable_pass() that also counts the summary.
+
+    `on_entry`, if given, is called with the ID and entry of every
+    pattern counted in this run, and `parts` are what it accumulates, as
+    in resumable_pass().
+
+    Returns the summary, or None if the deadline came first (a checkpoint
+    is then saved), and the stats of resumable_pass().
+    """
+    summary = _SummaryPart()
+
+    def count(pattern_id: str, entry: dict) -> None:
+        if on_entry is not None:
+            on_entry(pattern_id, entry)
+        summary.acc.add(pattern_contribution(entry))
+
+    complete, stats = resumable_pass(
+        [patterns_path],
+        checkpoint,
+        budget,
+        interval,
+        fields=fields,
+        on_entry=count,
+        parts={**(parts or {}), "summary": summary},
+    )
+    return (summary.acc if complete else None), stats
@@ -0,0 +1,155 @@
+"""
+Columnar binary cache of the fields the summary needs.
+
+Parsing JSON text dominates the cost of a run; the counting itself is
+trivial. So the first scan of a given patterns.json also writes the two
+categorical fields the summary depends on, "race" and "strategy_type",
+into a compact sidecar cache:
+
+  header.json    - source content hash, row count, byte order and the
+                   dictionaries mapping integer codes back to values
+  race.col       - one unsigned integer code per pattern (native order)
+  strategy.col   - same, for strategy_type
+
+The code arrays are raw machine integers that are memory-mapped on
+later runs, so re-aggregating an unchanged dataset is a count over two
+small integer arrays (numpy.bincount when NumPy is installed, see
+breakdown.py) instead of a full JSON parse. The cache is only trusted
+while its recorded source hash matches the current file.
+
+The cache lives in the PRIVATE state folder: it is per-pattern data.
+"""
+
+from collections import Counter
+from pathlib import Path
+from typing import Optional
+import mmap
+import sys
+
+from breakdown import CodeColumn, accumulate_value_pairs, count_code_pairs
+from state import read_json_object, write_json_atomic
+from summary import SummaryAccumulator
+
+# Bump whenever the on-disk layout changes; older caches are then ignored.
+COLUMNS_VERSION = 1
+
+# Categorical fields stored in the cache, with their column file names.
+COLUMN_FIELDS = {"race": "race.col", "strategy_type": "strategy.col"}
+
+class ColumnCacheBuilder:
+    """
+    Collects the cached fields during a scan, then writes the cache.
+
+    Pass each decoded entry to add() (in any order) and call save() once
+    the scan completed successfully.
+    """
+
+    def __init__(self) -> None:
+        self.columns = {field: CodeColumn() for field in COLUMN_FIELDS}
+
+    def add(self, entry: dict) -> None:
+        for field, column in self.columns.items():
+            column.append(entry.get(field))
+
+    def save(self, cache_dir: Path, source_hash: str) -> None:
+        """
+        Write the cache for a source file with content hash `source_hash`.
+
+        The header is removed first and written last, so a crash halfway
+        leaves no header (a cache miss) rather than a mismatched cache.
+        """
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        header_path = cache_dir / "header.json"
+        header_path.unlink(missing_ok=True)
+
+        header = {
+            "version": COLUMNS_VERSION,
+            "source_hash": source_hash,
+            "byteorder": sys.byteorder,
+            "rows": 0,
+            "columns": {},
+        }
+        for field, column in self.columns.items():
+            with (cache_dir / COLUMN_FIELDS[field]).open("wb") as f:
+                column.codes.tofile(f)
+            header["rows"] = len(column.codes)
+            header["columns"][field] = {
+                "typecode": column.codes.typecode,
+                "values": column.values,
+            }
+        write_json_atomic(header_path, header, separators=(",", ":"))
+
+
+def _load_header(cache_dir: Path, source_hash: str) -> Optional[dict]:
+    """Return the cache header if the cache is valid for `source_hash`."""
+    header = read_json_object(cache_dir / "header.json")
+    if (
+        header.get("version") != COLUMNS_VERSION
+        or header.get("source_hash") != source_hash
+        or header.get("byteorder") != sys.byteorder
+    ):
+        return None
+    return header
+
+
+def count_value_pairs(cache_dir: Path, source_hash: str) -> Optional[Counter]:
+    """
+    Count (race, strategy_type) value pairs straight from the cache.
+
+    Returns None when there is no valid cache for `source_hash`. The code
+    arrays are memory-mapped and counted in C (see
+    breakdown.count_code_pairs()); no Python object is created per
+    pattern.
+    """
+    header = _load_header(cache_dir, source_hash)
+    if header is None:
+        return None
+    if header["rows"] == 0:
+        return Counter()
+
+    maps = []
+    views = []
+    try:
+        for field in ("race", "strategy_type"):
+            meta = header["columns"][field]
+            with (cache_dir / COLUMN_FIELDS[field]).open("rb") as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            maps.append(mm)
+            view = memoryview(mm).cast(meta["typecode"])
+            if len(view) != header["rows"]:
+                view.release()
+                return None
+            views.append(view)
+
+        code_pairs = count_code_pairs(
+            *views,
+            len(header["columns"]["race"]["values"]),
+            len(header["columns"]["strategy_type"]["values"]),
+        )
+    except (OSError, ValueError):
+        return None
+    finally:
+        for view in views:
+            view.release()
+        for mm in maps:
+            mm.close()
+
+    races = header["columns"]["race"]["values"]
+    strategies = header["columns"]["strategy_type"]["values"]
+    return Counter(
+        {(races[r], strategies[s]): count for (r, s), count in code_pairs.items()}
+    )
+
+
+def aggregate_from_cache(cache_dir: Path, source_hash: str) -> Optional[SummaryAccumulator]:
+    """
+    Build the summary from the columnar cache, or None on a cache miss.
+
+    Each distinct (race, strategy_type) pair is run through the usual
+    pattern_contribution() once and counted with its multiplicity, so the
+    result is identical to a full scan.
+    """
+    pairs = count_value_pairs(cache_dir, source_hash)
+    if pairs is None:
+        return None
+    return accumulate_value_pairs(pairs)
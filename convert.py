@@ -0,0 +1,108 @@
+"""
+Converter from patterns.json to the JSON Lines layout.
+
+This script is NOT run by SyftBox. It is a tool for the datasite owner
+that rewrites the existing dictionary layout
+
+  {"pattern_001": {"race": "Protoss", ...}, "pattern_002": {...}, ...}
+
+as patterns.jsonl, one pattern per line with its ID inline:
+
+  {"pattern_id": "pattern_001", "race": "Protoss", ...}
+  {"pattern_id": "pattern_002", ...}
+
+The app detects patterns.jsonl automatically and parses it in parallel
+byte ranges (see shards.py). With --shards, the output is split into
+that many shard files under patterns/ instead, so later edits rewrite
+only one shard.
+
+Usage:
+    python convert.py path/to/patterns.json
+    python convert.py path/to/patterns.json --shards 16
+
+The input is streamed entry by entry and every output file is written
+to a temporary file first and renamed into place, so a multi-GB dataset
+converts in constant memory and an interrupted run leaves no partial
+output. Remove (or move away) patterns.json once the result looks right;
+while both exist, patterns.jsonl wins.
+"""
+
+from pathlib import Path
+from typing import List, Optional
+import argparse
+import json
+import os
+
+from reader import PATTERN_ID_FIELD, SHARD_DIR_NAME, iter_patterns
+
+
+def _encode_line(pattern_id: str, entry) -> str:
+    """One JSON Lines record; the ID goes first for readability."""
+    if not isinstance(entry, dict):
+        raise ValueError(f"pattern {pattern_id!r} is not an object")
+    inline_id = entry.get(PATTERN_ID_FIELD, pattern_id)
+    if inline_id != pattern_id:
+        raise ValueError(
+            f"pattern {pattern_id!r} already has a different {PATTERN_ID_FIELD!r}: {inline_id!r}"
+        )
+    record = {PATTERN_ID_FIELD: pattern_id}
+    record.update(entry)
+    return json.dumps(record, separators=(",", ":"), ensure_ascii=False) + "\n"
+
+
+def convert_to_json_lines(source: Path, destinations: List[Path]) -> int:
+    """
+    Stream the patterns of `source` (patterns.json layout) into the
+    JSON Lines files `destinations`, dealing them out round-robin.
+    Returns the number of patterns written.
+    """
+    tmp_paths = [path.with_name(path.name + ".tmp") for path in destinations]
+    files = []
+    try:
+        for tmp_path in tmp_paths:
+            tmp_path.parent.mkdir(parents=True, exist_ok=True)
+            files.append(tmp_path.open("w", encoding="utf-8"))
+
+        count = 0
+        for pattern_id, entry in iter_patterns(source):
+            files[count % len(files)].write(_encode_line(pattern_id, entry))
+            count += 1
+
+        for f in files:
+            f.flush()
+            os.fsync(f.fileno())
+            f.close()
+        for tmp_path, path in zip(tmp_paths, destinations):
+            os.replace(tmp_path, path)
+        return count
+    finally:
+        for f in files:
+            f.close()
+        for tmp_path in tmp_paths:
+            tmp_path.unlink(missing_ok=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Convert patterns.json to JSON Lines.")
+    parser.add_argument("source", type=Path, help="patterns.json to convert")
+    parser.add_argument("--shards", type=int, default=None,
+                        help="write this many shard files under patterns/ instead of patterns.jsonl")
+    args = parser.parse_args()
+
+    shards: Optional[int] = args.shards
+    if shards is None:
+        destinations = [args.source.with_name("patterns.jsonl")]
+    elif shards < 1:
+        parser.error("--shards must be at least 1")
+    else:
+        shard_dir = args.source.parent / SHARD_DIR_NAME
+        destinations = [shard_dir / f"part-{i:04d}.jsonl" for i in range(shards)]
+
+    count = convert_to_json_lines(args.source, destinations)
+    print(f"[Convert] Wrote {count} patterns to {len(destinations)} file(s):")
+    for path in destinations:
+        print(f"[Convert]   {path}")
+
+
+if __name__ == "__main__":
+    main()
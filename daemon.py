@@ -0,0 +1,286 @@
+"""
+Long-running (resident) mode: watch the dataset and republish on change.
+
+Instead of SyftBox starting a fresh interpreter for every scheduled run
+(paying startup, imports and state loading each time), the app can stay
+resident:
+  - it summarizes once at startup
+  - then watches the dataset folder and the request queue for changes,
+    using inotify on Linux and polling everywhere else
+  - bursts of writes (e.g. a sync client writing a big file in pieces)
+    are debounced into a single rerun
+  - the incremental state database stays open between reruns
+
+A run lock in the private state folder makes sure a scheduled one-shot
+run does not work on the same datasite while the daemon is doing so.
+"""
+
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+import ctypes
+import ctypes.util
+import os
+import select
+import signal
+import struct
+import sys
+import time
+import traceback
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# inotify event flags (see <sys/inotify.h>).
+_IN_MODIFY = 0x00000002
+_IN_ATTRIB = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_IGNORED = 0x00008000
+_IN_ISDIR = 0x40000000
+
+_WATCH_MASK = (
+    _IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO
+    | _IN_CREATE | _IN_DELETE | _IN_DELETE_SELF | _IN_MOVE_SELF
+)
+
+# struct inotify_event { int wd; uint32_t mask, cookie, len; char name[]; }
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+# ================================================================
+# RUN LOCK
+# ================================================================
+
+@contextmanager
+def run_lock(lock_path: Path) -> Iterator[bool]:
+    """
+    Try to take the per-datasite run lock without blocking.
+
+    Yields True if the lock was taken (it is released on exit) and False
+    if another process holds it. Where file locking is unavailable the
+    lock is always granted.
+    """
+    if fcntl is None:
+        yield True
+        return
+
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with lock_path.open("a") as f:
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+# ================================================================
+# WATCHERS
+# ================================================================
+
+class PollingWatcher:
+    """
+    Detects changes by comparing (mtime, size) of every file under the
+    watched directories every `interval` seconds. Works everywhere.
+    """
+
+    def __init__(self, directories: Sequence[Path], interval: float) -> None:
+        self.directories = list(directories)
+        self.interval = interval
+        self._snapshot = self._scan()
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        snapshot = {}
+        for directory in self.directories:
+            self._scan_tree(directory, snapshot)
+        return snapshot
+
+    @staticmethod
+    def _scan_tree(directory: Path, snapshot: Dict[str, Tuple[int, int]]) -> None:
+        for dirpath, _dirnames, filenames in os.walk(directory):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                snapshot[path] = (st.st_mtime_ns, st.st_size)
+
+    def wait(self, timeout: Optional[float]) -> bool:
+        """
+        Block until something changed (True) or `timeout` seconds passed
+        without a change (False). A timeout of None waits forever.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            snapshot = self._scan()
+            if snapshot != self._snapshot:
+                self._snapshot = snapshot
+                return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            pause = self.interval
+            if deadline is not None:
+                pause = min(pause, max(0.0, deadline - time.monotonic()))
+            time.sleep(pause)
+
+    def close(self) -> None:
+        pass
+
+
+class InotifyWatcher:
+    """
+    Detects changes with Linux inotify (through libc via ctypes, so no
+    extra dependency). The directories and all of their subdirectories
+    are watched; subdirectories created later are added as they appear,
+    and so are watched directories that do not exist yet.
+    """
+
+    def __init__(self, directories: Sequence[Path]) -> None:
+        libc_name = ctypes.util.find_library("c") or "libc.so.6"
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self._libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+
+        self.directories = list(directories)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._watches: Dict[int, Path] = {}
+        for directory in self.directories:
+            self._watch_tree(directory)
+
+    def _watch_tree(self, root: Path) -> None:
+        for dirpath, _dirnames, _filenames in os.walk(root):
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(dirpath), _WATCH_MASK)
+            if wd >= 0:
+                self._watches[wd] = Path(dirpath)
+
+    def _unwatched(self) -> List[Path]:
+        """Watched directories that are missing (or were replaced)."""
+        watched = set(self._watches.values())
+        return [directory for directory in self.directories if directory not in watched]
+
+    def _drain(self) -> bool:
+        """Read all pending events; returns True if any was relevant."""
+        changed = False
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                return changed
+            offset = 0
+            while offset < len(data):
+                wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+                name = data[offset + _EVENT_HEADER.size: offset + _EVENT_HEADER.size + length]
+                offset += _EVENT_HEADER.size + length
+
+                if mask & _IN_IGNORED:
+                    # The watched directory itself went away.
+                    self._watches.pop(wd, None)
+                    continue
+                if mask & _IN_ISDIR and mask & (_IN_CREATE | _IN_MOVED_TO):
+                    parent = self._watches.get(wd)
+                    if parent is not None:
+                        self._watch_tree(parent / os.fsdecode(name.rstrip(b"\0")))
+                changed = True
+
+    def wait(self, timeout: Optional[float]) -> bool:
+        """Same contract as PollingWatcher.wait()."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            unwatched = self._unwatched()
+            appeared = [directory for directory in unwatched if directory.is_dir()]
+            if appeared:
+                # A folder was created or replaced; watch the new one.
+                for directory in appeared:
+                    self._watch_tree(directory)
+                return True
+
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if unwatched:
+                # A folder can only be watched once it (re)appears; check
+                # again periodically.
+                remaining = 1.0 if remaining is None else min(remaining, 1.0)
+
+            ready, _, _ = select.select([self._fd], [], [], remaining)
+            if ready and self._drain():
+                return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+
+def make_watcher(directories: Sequence[Path], poll_interval: float):
+    """inotify where available, polling otherwise."""
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(directories)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(directories, poll_interval)
+
+
+# ================================================================
+# DAEMON LOOP
+# ================================================================
+
+def run_daemon(
+    watch_dirs: Sequence[Path],
+    summarize: Callable[[], str],
+    debounce: float,
+    poll_interval: float,
+) -> None:
+    """
+    Call `summarize` once, then again after every (debounced) change
+    under any of `watch_dirs`, until interrupted.
+
+    A failing run is logged and the daemon keeps watching; the next
+    change gets a fresh attempt.
+    """
+    # SyftBox (and most process managers) stop apps with SIGTERM; treat it
+    # like Ctrl-C so the watcher and the run lock are released cleanly.
+    # Shutdown starts with the first TERM: repeats are ignored, so they
+    # cannot interrupt the cleanup itself.
+    def _stop(signum, frame):
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, _stop)
+
+    watcher = make_watcher(watch_dirs, poll_interval)
+    watched = ", ".join(str(directory) for directory in watch_dirs)
+    print(f"[App] Watching {watched} ({type(watcher).__name__}, debounce {debounce}s)")
+
+    try:
+        while True:
+            started = time.perf_counter()
+            try:
+                status = summarize()
+            except Exception:
+                traceback.print_exc()
+                status = "failed"
+            print(f"[App] Run {status} in {time.perf_counter() - started:.3f}s; waiting for changes")
+            sys.stdout.flush()
+
+            # Block until the first change, then keep absorbing changes
+            # until the folder has been quiet for `debounce` seconds.
+            watcher.wait(None)
+            while watcher.wait(debounce):
+                pass
+    except KeyboardInterrupt:
+        print("[App] Daemon stopped")
+    finally:
+        watcher.close()
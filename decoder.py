@@ -0,0 +1,100 @@
+"""
+Pluggable JSON decoding with an optional accelerated backend.
+
+The app needs nothing beyond the standard library, but when a faster
+JSON library happens to be installed, whole JSON documents and records
+are decoded with it:
+  - JSON Lines pattern records (patterns.jsonl and .jsonl shards)
+  - the private state files (incremental state, manifest, caches)
+
+Supported backends, in the order "auto" tries them:
+  orjson   - https://pypi.org/project/orjson/
+  msgspec  - https://pypi.org/project/msgspec/
+  json     - the standard library (always available)
+
+Decoded values are identical across backends: anything an accelerated
+backend rejects (e.g. the NaN/Infinity literals the standard library
+accepts) is decoded again with the standard library, which then either
+succeeds or raises its usual ValueError.
+
+The streaming reader for the patterns.json object layout keeps using
+the standard library's raw_decode(), because none of the accelerated
+libraries can decode one value at an offset inside a larger text and
+report where it ended. Converting the dataset to JSON Lines (see
+convert.py) lets the fast backend decode every pattern.
+"""
+
+from typing import Callable, Optional, Tuple, Union
+import json
+
+# Backends tried, in order, by use_json_backend("auto").
+FAST_BACKENDS = ("orjson", "msgspec")
+
+Data = Union[bytes, bytearray, str]
+
+
+def _import_backend(name: str) -> Optional[Tuple[Callable, tuple]]:
+    """Return (decode function, its error types) for `name`, or None."""
+    try:
+        if name == "orjson":
+            import orjson
+            return orjson.loads, (orjson.JSONDecodeError,)
+        if name == "msgspec":
+            import msgspec
+            return msgspec.json.decode, (msgspec.DecodeError,)
+    except ImportError:
+        return None
+    raise ValueError(f"unknown JSON backend: {name!r}")
+
+
+_backend_name = "json"
+_fast_loads: Optional[Callable] = None
+_fast_errors: tuple = ()
+
+
+def use_json_backend(name: str = "auto") -> str:
+    """
+    Select the JSON backend: "auto", "json" or one of FAST_BACKENDS.
+
+    "auto" picks the first installed fast backend. A named backend that
+    is not installed falls back to the standard library with a warning.
+    Returns the name of the backend now in use.
+    """
+    global _backend_name, _fast_loads, _fast_errors
+
+    if name == "json":
+        candidates = ()
+    elif name == "auto":
+        candidates = FAST_BACKENDS
+    else:
+        candidates = (name,)
+
+    for candidate in candidates:
+        backend = _import_backend(candidate)
+        if backend is not None:
+            _backend_name = candidate
+            _fast_loads, _fast_errors = backend
+            return _backend_name
+
+    if name not in ("auto", "json"):
+        print(f"[App] JSON backend {name!r} is not installed; using the standard library")
+    _backend_name, _fast_loads, _fast_errors = "json", None, ()
+    return _backend_name
+
+
+def json_backend() -> str:
+    """Name of the JSON backend in use."""
+    return _backend_name
+
+
+def loads(data: Data):
+    """Decode one JSON document from bytes or text with the selected backend."""
+    if _fast_loads is not None:
+        try:
+            return _fast_loads(data)
+        except _fast_errors:
+            pass
+    return json.loads(data)
+
+
+use_json_backend("auto")
@@ -0,0 +1,259 @@
+"""
+Privacy-safe summaries of comments.json and learning_stats.json.
+
+The dataset folder holds two more files next to patterns.json. Both are
+streamed in background threads WHILE patterns.json is being aggregated
+(see main.py), and their aggregates are published together with the
+pattern summaries.
+
+comments.json
+-------------
+Accepted layouts (the reader is deliberately tolerant):
+  - a list of comment objects
+  - an object mapping comment IDs to comment objects
+  - an object mapping pattern IDs to lists of comments
+A comment is attributed to a strategy type through its own
+"strategy_type" field or, failing that, through the pattern its
+"pattern_id" points at. Only counts per strategy type are published.
+
+learning_stats.json
+-------------------
+Every numeric value is grouped by "<top-level section>.<field name>"
+and summarized as a count/mean distribution. Group names are built from
+LEARNING_STAT_FIELDS only: any other key (a pattern ID, a player, a
+game) is dropped from the name, so the values under it are pooled with
+those of its siblings, and numbers under no listed key at all are not
+published. Groups with fewer than MIN_DISTRIBUTION_SIZE values are
+suppressed, and no single value (such as a minimum or maximum) is ever
+published, so nothing can be tied to one pattern, player or game.
+"""
+
+from collections import Counter
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Optional, Set
+
+from normalize import STRATEGY_TYPE
+from reader import iter_json_items
+from summary import pattern_contribution
+
+# Smallest number of values a learning-stat distribution must summarize
+# to be published.
+MIN_DISTRIBUTION_SIZE = 5
+
+# The only keys of learning_stats.json that may appear in published
+# group names. Anything else could be an identifier; add a field here
+# (never an ID) to publish it under its own name.
+LEARNING_STAT_FIELDS = frozenset({
+    "per_game",
+    "per_pattern",
+    "per_player",
+    "per_strategy",
+    "games",
+    "games_analyzed",
+    "wins",
+    "losses",
+    "win_rate",
+    "accuracy",
+    "confidence",
+    "duration",
+    "apm",
+    "supply",
+    "sample_count",
+    "success_rate",
+})
+
+
+# ================================================================
+# COMMENTS
+# ================================================================
+
+@dataclass
+class CommentStats:
+    """Comment counts gathered from comments.json."""
+
+    total: int = 0
+    # Comments that name their strategy type directly.
+    by_strategy: Counter = field(default_factory=Counter)
+    # Comments that only point at a pattern, resolved after the scan.
+    by_pattern: Counter = field(default_factory=Counter)
+    # Comments with neither.
+    unattributed: int = 0
+
+    def add(self, comment, pattern_id: Optional[str] = None) -> None:
+        self.total += 1
+        if isinstance(comment, dict):
+            strategy_type = comment.get("strategy_type")
+            if isinstance(strategy_type, str) and strategy_type:
+                # Same spelling as the pattern breakdowns' keys.
+                self.by_strategy[STRATEGY_TYPE(strategy_type)] += 1
+                return
+            linked = comment.get("pattern_id", pattern_id)
+        else:
+            linked = pattern_id
+        if isinstance(linked, str):
+            self.by_pattern[linked] += 1
+        else:
+            self.unattributed += 1
+
+
+def summarize_comments(path: Path) -> Optional[CommentStats]:
+    """Stream comments.json into CommentStats (None if it is missing)."""
+    if not path.exists():
+        return None
+
+    stats = CommentStats()
+    for key, value in iter_json_items(path):
+        if isinstance(value, list):
+            # {pattern_id: [comment, ...]}
+            for comment in value:
+                stats.add(comment, pattern_id=key)
+        else:
+            # [comment, ...] or {comment_id: comment}
+            stats.add(value)
+    return stats
+
+
+class PatternStrategyJoin:
+    """
+    Remembers the strategy type of commented patterns during the
+    patterns.json scan, so comments that only carry a pattern_id can be
+    attributed afterwards.
+
+    The comments scan runs concurrently, so the set of commented
+    patterns is not known up front. Until it is, every pattern is
+    remembered; as soon as the comments future is done, the map is cut
+    down to commented patterns only and stays that small.
+    """
+
+    def __init__(
+        self,
+        comments: "Optional[Future[Optional[CommentStats]]]" = None,
+        wanted: Optional[Set[str]] = None,
+    ) -> None:
+        """Pass the comments future, or the commented pattern IDs if known."""
+        self._comments = comments
+        self._wanted = wanted
+        self.strategies: Dict[str, str] = {}
+
+    def observe(self, pattern_id: str, entry: dict) -> None:
+        if self._wanted is None and self._comments.done():
+            self._cut_down()
+        if self._wanted is None or pattern_id in self._wanted:
+            self.strategies[pattern_id] = pattern_contribution(entry)[1]
+
+    def _cut_down(self) -> None:
+        # Blocks until the comments scan is done.
+        stats = None if self._comments.exception() else self._comments.result()
+        self._wanted = set(stats.by_pattern) if stats else set()
+        self.strategies = {
+            pid: strategy for pid, strategy in self.strategies.items() if pid in self._wanted
+        }
+
+    def state(self) -> Dict[str, str]:
+        """
+        The strategies of commented patterns seen so far, to resume from
+        (see checkpoint.py). Waits for the comments scan, so that only
+        commented patterns are included.
+        """
+        if self._wanted is None:
+            self._cut_down()
+        return dict(self.strategies)
+
+    def restore(self, strategies: Dict[str, str]) -> None:
+        """Continue from strategies saved by state()."""
+        self.strategies.update(strategies)
+
+
+def comments_summary(stats: CommentStats, join: Optional[PatternStrategyJoin]) -> dict:
+    """Build the privacy-safe comments section."""
+    per_strategy = Counter(stats.by_strategy)
+    strategies = join.strategies if join is not None else {}
+    unattributed = stats.unattributed
+    for pattern_id, count in stats.by_pattern.items():
+        strategy_type = strategies.get(pattern_id)
+        if strategy_type is None:
+            unattributed += count
+        else:
+            per_strategy[strategy_type] += count
+
+    return {
+        "total_comments": stats.total,
+        "commented_patterns": len(stats.by_pattern),
+        "comments_per_strategy_type": dict(sorted(per_strategy.items())),
+        "unattributed_comments": unattributed,
+    }
+
+
+# ================================================================
+# LEARNING STATS
+# ================================================================
+
+class _Distribution:
+    """count/mean of a stream of numbers."""
+
+    __slots__ = ("count", "total")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+
+    def to_dict(self) -> dict:
+        return {"count": self.count, "mean": self.total / self.count}
+
+
+def _listed(key) -> Optional[str]:
+    """`key` if it may be published, else None."""
+    return key if isinstance(key, str) and key in LEARNING_STAT_FIELDS else None
+
+
+def _collect_numbers(
+    value, section: Optional[str], leaf: Optional[str], out: Dict[Optional[str], _Distribution]
+) -> None:
+    """
+    Add every number under `value` to the "<section>.<leaf>" groups,
+    where `leaf` is the innermost listed key above it. Numbers under no
+    listed key go to the None group.
+    """
+    if isinstance(value, bool):
+        return
+    if isinstance(value, (int, float)):
+        name = ".".join(part for part in (section, leaf) if part) or None
+        out.setdefault(name, _Distribution()).add(value)
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            _collect_numbers(item, section, _listed(key) or leaf, out)
+    elif isinstance(value, list):
+        for item in value:
+            _collect_numbers(item, section, leaf, out)
+
+
+def summarize_learning_stats(path: Path) -> Optional[dict]:
+    """
+    Stream learning_stats.json, one top-level section at a time, into
+    published distributions (None if the file is missing).
+    """
+    if not path.exists():
+        return None
+
+    groups: Dict[Optional[str], _Distribution] = {}
+    for key, value in iter_json_items(path):
+        _collect_numbers(value, _listed(key), None, groups)
+
+    unlisted = groups.pop(None, None)
+    published = {
+        name: dist.to_dict()
+        for name, dist in sorted(groups.items())
+        if dist.count >= MIN_DISTRIBUTION_SIZE
+    }
+    return {
+        "distributions": published,
+        "suppressed_groups": len(groups) - len(published),
+        # Numbers under no key of LEARNING_STAT_FIELDS.
+        "unlisted_values": unlisted.count if unlisted is not None else 0,
+    }
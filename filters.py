@@ -0,0 +1,412 @@
+"""
+Named filter expressions over pattern entries.
+
+Filters are configured in main.py (FILTERS) as name -> expression, e.g.
+
+  "confident_protoss_aggression":
+      'race == "Protoss" and strategy_type == "protoss_aggression"'
+      ' and confidence > 0.8 and sample_count >= 20'
+
+Every filter is compiled ONCE into a plain Python function, and all of
+them are evaluated in the same scan as the main summaries; each one
+publishes the per-race strategy breakdown of the patterns it matches.
+
+Expression syntax
+-----------------
+  comparisons   field == value, !=, <, <=, >, >=
+                field in [value, value, ...]
+                field not in [...]
+  logic         and, or, not, parentheses
+  fields        top-level names (race, confidence, ...) or dotted paths
+                into nested objects (signature.key_timings.Pylon)
+  values        "strings" or 'strings', numbers, true, false, null
+  truth test    a bare field matches when its value is truthy
+
+A missing field is null. Ordering comparisons only match values of the
+literal's kind (numbers with numbers, strings with strings), so a
+missing or malformed field never matches instead of raising.
+
+Categorical fields (race, strategy_type; see normalize.py) are compared
+by their canonical forms, like the summaries count them: on both sides,
+so 'race == "toss"' matches a race of "Protoss", "protoss" or "P", and a
+missing race is "unknown". A race that cannot exist is a syntax error.
+A bare categorical field matches when its category is not "unknown".
+"""
+
+from collections import namedtuple
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import ast
+import operator
+import re
+
+from normalize import CATEGORICAL_FIELDS, UNKNOWN, Categorical
+from summary import SummaryAccumulator, pattern_contribution
+
+# Filter names become public file names.
+_NAME = re.compile(r"[A-Za-z0-9_-]+")
+
+_TOKEN = re.compile(
+    r"""
+    (?:
+        (?P<number>-?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)
+      | (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+      | (?P<name>[A-Za-z_][A-Za-z0-9_]*(?:\.[A-Za-z_][A-Za-z0-9_]*)*)
+      | (?P<op>==|!=|<=|>=|<|>|\(|\)|\[|\]|,)
+    )
+    """,
+    re.VERBOSE,
+)
+
+_KEYWORDS = {"and", "or", "not", "in"}
+_CONSTANTS = {"true": True, "false": False, "null": None}
+_ORDERING = {"<", "<=", ">", ">="}
+_FLIPPED = {"==": "==", "!=": "!=", "<": ">", "<=": ">=", ">": "<", ">=": "<="}
+
+# Value kinds allowed in `in [...]` lists, and the kind groups ordering
+# comparisons check against.
+_SCALAR_TYPES = (str, int, float, bool, type(None))
+_NUMBER_TYPES = (int, float)
+
+
+class FilterError(ValueError):
+    """A filter expression or name is invalid."""
+
+
+# Parsed expression nodes.
+Field = namedtuple("Field", "path")
+Literal = namedtuple("Literal", "value")
+Compare = namedtuple("Compare", "left op right")
+Member = namedtuple("Member", "field values negated")
+Truth = namedtuple("Truth", "field")
+Not = namedtuple("Not", "operand")
+BoolOp = namedtuple("BoolOp", "op operands")
+
+
+# ================================================================
+# PARSING
+# ================================================================
+
+def _tokenize(expression: str) -> List[Tuple[str, str, int]]:
+    tokens = []
+    pos = 0
+    while True:
+        while pos < len(expression) and expression[pos].isspace():
+            pos += 1
+        if pos == len(expression):
+            return tokens
+        match = _TOKEN.match(expression, pos)
+        if match is None:
+            raise FilterError(f"unexpected character at {pos}: {expression[pos:pos + 10]!r}")
+        kind = match.lastgroup
+        text = match.group(kind)
+        if kind == "name" and text in _KEYWORDS:
+            kind = "keyword"
+        tokens.append((kind, text, pos))
+        pos = match.end()
+
+
+class _Parser:
+    """Recursive-descent parser; precedence: not > and > or."""
+
+    def __init__(self, expression: str) -> None:
+        self.expression = expression
+        self.tokens = _tokenize(expression)
+        self.pos = 0
+
+    def parse(self):
+        if not self.tokens:
+            raise FilterError("empty expression")
+        node = self._or()
+        if self.pos < len(self.tokens):
+            self._fail("unexpected")
+        return node
+
+    def _peek(self, text: str, ahead: int = 0) -> bool:
+        pos = self.pos + ahead
+        return pos < len(self.tokens) and self.tokens[pos][1] == text
+
+    def _take(self, text: str) -> None:
+        if not self._peek(text):
+            self._fail(f"expected {text!r}, got")
+        self.pos += 1
+
+    def _fail(self, message: str):
+        if self.pos < len(self.tokens):
+            _kind, text, offset = self.tokens[self.pos]
+            raise FilterError(f"{message} {text!r} at {offset} in {self.expression!r}")
+        raise FilterError(f"{message} end of expression in {self.expression!r}")
+
+    def _or(self):
+        operands = [self._and()]
+        while self._peek("or"):
+            self.pos += 1
+            operands.append(self._and())
+        return operands[0] if len(operands) == 1 else BoolOp("or", operands)
+
+    def _and(self):
+        operands = [self._not()]
+        while self._peek("and"):
+            self.pos += 1
+            operands.append(self._not())
+        return operands[0] if len(operands) == 1 else BoolOp("and", operands)
+
+    def _not(self):
+        if self._peek("not"):
+            self.pos += 1
+            return Not(self._not())
+        return self._comparison()
+
+    def _comparison(self):
+        if self._peek("("):
+            self.pos += 1
+            node = self._or()
+            self._take(")")
+            return node
+
+        left = self._operand()
+        negated = self._peek("not") and self._peek("in", ahead=1)
+        if negated or self._peek("in"):
+            if not isinstance(left, Field):
+                self._fail("'in' needs a field on its left, got")
+            self.pos += 2 if negated else 1
+            return Member(left, self._list(), negated)
+
+        if self.pos < len(self.tokens) and self.tokens[self.pos][1] in _FLIPPED:
+            op = self.tokens[self.pos][1]
+            self.pos += 1
+            right = self._operand()
+            if isinstance(left, Literal) and isinstance(right, Literal):
+                self.pos -= 1
+                self._fail("a comparison needs a field, got only values near")
+            return Compare(left, op, right)
+
+        if not isinstance(left, Field):
+            self.pos -= 1
+            self._fail("a value on its own is not a condition:")
+        return Truth(left)
+
+    def _operand(self):
+        if self.pos >= len(self.tokens):
+            self._fail("expected a field or value, got")
+        kind, text, _offset = self.tokens[self.pos]
+        if kind == "number":
+            value = float(text) if any(c in text for c in ".eE") else int(text)
+        elif kind == "string":
+            value = ast.literal_eval(text)
+        elif kind == "name" and text in _CONSTANTS:
+            value = _CONSTANTS[text]
+        elif kind == "name":
+            self.pos += 1
+            return Field(tuple(text.split(".")))
+        else:
+            self._fail("expected a field or value, got")
+        self.pos += 1
+        return Literal(value)
+
+    def _list(self) -> tuple:
+        self._take("[")
+        values = []
+        while not self._peek("]"):
+            item = self._operand()
+            if not isinstance(item, Literal):
+                self.pos -= 1
+                self._fail("lists may only hold values, got")
+            values.append(item.value)
+            if not self._peek("]"):
+                self._take(",")
+        self._take("]")
+        return tuple(values)
+
+
+# ================================================================
+# COMPILATION
+# ================================================================
+
+def _lookup(entry, path: tuple):
+    """Value at a dotted path inside an entry, or None."""
+    value = entry
+    for key in path:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+_COMPARISONS = {
+    "==": operator.eq, "!=": operator.ne,
+    "<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge,
+}
+
+
+def _safe_compare(op: str) -> Callable:
+    """Field-vs-field comparison that is False instead of raising."""
+    compare = _COMPARISONS[op]
+
+    def safe(left, right):
+        try:
+            return bool(compare(left, right))
+        except TypeError:
+            return False
+
+    return safe
+
+
+class _Compiler:
+    """
+    Turns a parsed expression into the source of ONE Python function,
+    so evaluating a filter costs a single call per entry. Literals and
+    helpers are passed in the function's globals; the source itself
+    only ever contains names generated here and repr()'d field names.
+    """
+
+    def __init__(self) -> None:
+        self.namespace = {
+            "__builtins__": {},
+            "_type": type,
+            "_lookup": _lookup,
+            "_SCALARS": frozenset(_SCALAR_TYPES),
+            "_NUMBERS": frozenset(_NUMBER_TYPES),
+            "_STRINGS": frozenset([str]),
+        }
+        self.fields = set()
+        self.temporaries = 0
+
+    def constant(self, value) -> str:
+        name = f"_c{len(self.namespace)}"
+        self.namespace[name] = value
+        return name
+
+    def temporary(self) -> str:
+        self.temporaries += 1
+        return f"v{self.temporaries}"
+
+    def field(self, node: Field) -> str:
+        self.fields.add(node.path[0])
+        normalizer = _categorical(node)
+        if normalizer is not None:
+            return f"{self.constant(normalizer)}(entry.get({node.path[0]!r}))"
+        if len(node.path) == 1:
+            return f"entry.get({node.path[0]!r})"
+        return f"_lookup(entry, {node.path!r})"
+
+    def literal(self, field: Field, value):
+        """`value` as compared with `field`: canonical for categories."""
+        normalizer = _categorical(field)
+        if normalizer is None:
+            return value
+        try:
+            return normalizer.literal(value)
+        except ValueError as exc:
+            raise FilterError(f"{'.'.join(field.path)}: {exc}") from None
+
+    def emit(self, node) -> str:
+        if isinstance(node, BoolOp):
+            return "(" + f" {node.op} ".join(self.emit(operand) for operand in node.operands) + ")"
+        if isinstance(node, Not):
+            return f"(not {self.emit(node.operand)})"
+        if isinstance(node, Truth):
+            if _categorical(node.field) is not None:
+                # A missing value is "unknown", a truthy string.
+                return f"({self.field(node.field)} != {self.constant(UNKNOWN)})"
+            return f"(not not {self.field(node.field)})"
+        if isinstance(node, Member):
+            values = self.constant(frozenset(
+                self.literal(node.field, value)
+                for value in node.values
+                if isinstance(value, _SCALAR_TYPES)
+            ))
+            v = self.temporary()
+            test = f"(_type({v} := {self.field(node.field)}) in _SCALARS and {v} in {values})"
+            return f"(not {test})" if node.negated else test
+        return self.compare(node)
+
+    def compare(self, node: Compare) -> str:
+        left, op, right = node.left, node.op, node.right
+        if isinstance(left, Literal):
+            left, op, right = right, _FLIPPED[op], left
+
+        if isinstance(right, Field):
+            safe = self.constant(_safe_compare(op))
+            return f"{safe}({self.field(left)}, {self.field(right)})"
+
+        if op not in _ORDERING:
+            value = self.constant(self.literal(left, right.value))
+            return f"({self.field(left)} {op} {value})"
+        if isinstance(right.value, bool) or not isinstance(right.value, (str, int, float)):
+            raise FilterError(f"{op} needs a number or string to compare with, got {right.value!r}")
+        value = self.constant(right.value)
+        kinds = "_STRINGS" if isinstance(right.value, str) else "_NUMBERS"
+        v = self.temporary()
+        return f"(_type({v} := {self.field(left)}) in {kinds} and {v} {op} {value})"
+
+
+def _categorical(node: Field) -> Optional[Categorical]:
+    """Normalizer of a categorical top-level field, else None."""
+    return CATEGORICAL_FIELDS.get(node.path[0]) if len(node.path) == 1 else None
+
+
+class Filter:
+    """A compiled filter: `predicate(entry)` tells whether it matches."""
+
+    def __init__(self, name: str, expression: str) -> None:
+        if not isinstance(name, str) or not _NAME.fullmatch(name):
+            raise FilterError(f"filter names may only use letters, digits, '_' and '-': {name!r}")
+        if not isinstance(expression, str):
+            raise FilterError(f"filter {name!r}: the expression must be a string")
+        compiler = _Compiler()
+        try:
+            source = f"def predicate(entry):\n    return {compiler.emit(_Parser(expression).parse())}\n"
+        except FilterError as exc:
+            raise FilterError(f"filter {name!r}: {exc}") from None
+        exec(compile(source, f"<filter {name}>", "exec"), compiler.namespace)
+
+        self.name = name
+        self.expression = expression
+        # Top-level entry fields the predicate reads.
+        self.fields = frozenset(compiler.fields)
+        self.predicate: Callable[[dict], bool] = compiler.namespace["predicate"]
+
+
+class FilterSet:
+    """All configured filters, evaluated together on every entry."""
+
+    def __init__(self, filters: Dict[str, str]) -> None:
+        self.filters = [Filter(name, expression) for name, expression in filters.items()]
+        self.matches = {f.name: SummaryAccumulator() for f in self.filters}
+        self._checks = [(f.predicate, self.matches[f.name]) for f in self.filters]
+
+    def __bool__(self) -> bool:
+        return bool(self.filters)
+
+    @property
+    def fields(self) -> frozenset:
+        """Top-level entry fields any of the filters reads."""
+        return frozenset().union(*(f.fields for f in self.filters))
+
+    def observe(self, entry: dict) -> None:
+        contribution = None
+        for predicate, acc in self._checks:
+            if predicate(entry):
+                if contribution is None:
+                    contribution = pattern_contribution(entry)
+                acc.add(contribution)
+
+    def state(self) -> dict:
+        """The running totals, to resume from (see checkpoint.py)."""
+        return {name: acc.to_dict() for name, acc in self.matches.items()}
+
+    def restore(self, state: dict) -> None:
+        """Continue from totals saved by state()."""
+        for name, acc in self.matches.items():
+            acc.merge(SummaryAccumulator.from_dict(state[name]))
+
+    def documents(self) -> Iterable[Tuple[str, dict]]:
+        """(name, privacy-safe summary of the matching patterns) per filter."""
+        for f in self.filters:
+            summary = self.matches[f.name].to_dict()
+            yield f.name, {
+                "filter": f.name,
+                "expression": f.expression,
+                "matching_patterns": summary["total_patterns_in_dataset"],
+                "races": summary["races"],
+            }
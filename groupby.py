@@ -0,0 +1,390 @@
+"""
+Streaming group-by over pattern fields, with numeric aggregates.
+
+GroupBy puts every entry into a group by the values of some fields
+(e.g. race and strategy_type) and keeps, per group, the number of
+entries and aggregates of numeric fields (e.g. sample_count and
+confidence):
+
+  count, sum, mean, min, max   exact
+  stddev                       exact, via Welford's online algorithm
+  quantiles (p50, p90, ...)    approximate, via a t-digest style sketch
+
+Everything is computed in a single pass over the entries, and the
+memory per group is bounded by a constant (the sketch's compression),
+no matter how many entries fall into it, so huge datasets are fine as
+long as the number of groups is reasonable. Aggregates of two GroupBys
+over different parts of the data can be merged.
+
+Categorical fields (race, strategy_type) are grouped by their canonical
+forms (see normalize.py), so "Protoss" and " protoss" are one group.
+
+Aggregates can also be saved as JSON-compatible data and restored
+(state() and restore()), so an interrupted pass can be resumed.
+
+Only finite numbers are aggregated; booleans, strings, missing values
+and the like are left out of a field's numeric count (the group's count
+still includes the entry).
+"""
+
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import math
+
+from normalize import CATEGORICAL_FIELDS
+
+# Default quantiles reported for every numeric field.
+DEFAULT_QUANTILES = (0.25, 0.5, 0.75, 0.9, 0.99)
+
+# Sketch accuracy: roughly the number of centroids a sketch keeps. The
+# error of a quantile estimate shrinks towards the tails (p1, p99) and is
+# about 1/COMPRESSION of the data's range in the middle at worst.
+COMPRESSION = 100
+
+_SCALAR_TYPES = (str, int, float, bool, type(None))
+
+
+def _lookup(entry, path: Tuple[str, ...]):
+    value = entry
+    for key in path:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def _number(value) -> Optional[float]:
+    """`value` if it is a finite number (not a bool), else None."""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return value if math.isfinite(value) else None
+
+
+def quantile_name(q: float) -> str:
+    """Output key of a quantile, e.g. 0.5 -> "p50", 0.999 -> "p99.9"."""
+    return f"p{q * 100:g}"
+
+
+# ================================================================
+# PER-FIELD AGGREGATES
+# ================================================================
+
+class RunningStats:
+    """Exact count/sum/min/max and Welford mean/variance of a stream."""
+
+    __slots__ = ("count", "total", "mean", "m2", "minimum", "maximum")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0
+        self.mean = 0.0
+        # Sum of squared differences from the running mean.
+        self.m2 = 0.0
+        self.minimum = None
+        self.maximum = None
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        if self.minimum is None or value < self.minimum:
+            self.minimum = value
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+
+    def merge(self, other: "RunningStats") -> None:
+        """Combine with the stats of another stream (Chan et al.)."""
+        if other.count == 0:
+            return
+        if self.count == 0:
+            for name in self.__slots__:
+                setattr(self, name, getattr(other, name))
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.total += other.total
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+
+    @property
+    def stddev(self) -> Optional[float]:
+        """Population standard deviation (None without values)."""
+        return math.sqrt(self.m2 / self.count) if self.count else None
+
+
+class QuantileSketch:
+    """
+    Approximate quantiles in bounded memory (a merging t-digest).
+
+    Values are buffered and periodically merged into at most about
+    `compression` weighted centroids. Centroids near the tails are kept
+    small and those near the median may grow large (the k1 scale
+    function), so extreme quantiles stay accurate.
+    """
+
+    __slots__ = ("compression", "means", "weights", "buffer", "minimum", "maximum")
+
+    def __init__(self, compression: int = COMPRESSION) -> None:
+        self.compression = compression
+        self.means: List[float] = []
+        self.weights: List[float] = []
+        self.buffer: List[float] = []
+        self.minimum = math.inf
+        self.maximum = -math.inf
+
+    def add(self, value: float) -> None:
+        self.buffer.append(value)
+        if value < self.minimum:
+            self.minimum = value
+        if value > self.maximum:
+            self.maximum = value
+        if len(self.buffer) >= 5 * self.compression:
+            self._compress()
+
+    def merge(self, other: "QuantileSketch") -> None:
+        other._compress()
+        self._compress(zip(other.means, other.weights))
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+
+    def _k(self, q: float) -> float:
+        return self.compression / (2 * math.pi) * math.asin(2 * q - 1)
+
+    def _compress(self, extra: Iterable[Tuple[float, float]] = ()) -> None:
+        items = list(zip(self.means, self.weights))
+        items.extend((value, 1) for value in self.buffer)
+        items.extend(extra)
+        self.buffer = []
+        if not items:
+            return
+        items.sort()
+        total = sum(weight for _mean, weight in items)
+
+        means, weights = [], []
+        mean, weight = items[0]
+        # Weight to the left of the centroid being built.
+        before = 0.0
+        k_left = self._k(0.0)
+        for item_mean, item_weight in items[1:]:
+            if self._k(min(1.0, (before + weight + item_weight) / total)) - k_left <= 1:
+                weight += item_weight
+                mean += (item_mean - mean) * item_weight / weight
+            else:
+                means.append(mean)
+                weights.append(weight)
+                before += weight
+                k_left = self._k(min(1.0, before / total))
+                mean, weight = item_mean, item_weight
+        means.append(mean)
+        weights.append(weight)
+        self.means, self.weights = means, weights
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate of the `q` quantile (0 <= q <= 1), None if empty."""
+        self._compress()
+        if not self.means:
+            return None
+        total = sum(self.weights)
+        target = q * total
+
+        # Each centroid's mean sits at the middle of its weight.
+        centers = []
+        cumulative = 0.0
+        for weight in self.weights:
+            centers.append(cumulative + weight / 2)
+            cumulative += weight
+
+        if target <= centers[0]:
+            return _interpolate(target, 0.0, centers[0], self.minimum, self.means[0])
+        if target >= centers[-1]:
+            return _interpolate(target, centers[-1], total, self.means[-1], self.maximum)
+        i = bisect_left(centers, target)
+        return _interpolate(target, centers[i - 1], centers[i], self.means[i - 1], self.means[i])
+
+
+def _interpolate(x: float, x0: float, x1: float, y0: float, y1: float) -> float:
+    if x1 <= x0:
+        return y0
+    return y0 + (y1 - y0) * (x - x0) / (x1 - x0)
+
+
+class NumericSummary:
+    """Everything reported for one numeric field in one group."""
+
+    __slots__ = ("stats", "sketch")
+
+    def __init__(self) -> None:
+        self.stats = RunningStats()
+        self.sketch = QuantileSketch()
+
+    def add(self, value: float) -> None:
+        self.stats.add(value)
+        self.sketch.add(value)
+
+    def merge(self, other: "NumericSummary") -> None:
+        self.stats.merge(other.stats)
+        self.sketch.merge(other.sketch)
+
+    def state(self) -> dict:
+        self.sketch._compress()
+        return {
+            "stats": [getattr(self.stats, name) for name in RunningStats.__slots__],
+            "centroids": [self.sketch.means, self.sketch.weights],
+        }
+
+    @classmethod
+    def from_state(cls, state: dict) -> "NumericSummary":
+        summary = cls()
+        for name, value in zip(RunningStats.__slots__, state["stats"]):
+            setattr(summary.stats, name, value)
+        summary.sketch.means, summary.sketch.weights = state["centroids"]
+        # The sketch saw the same values as the stats.
+        if summary.stats.count:
+            summary.sketch.minimum = summary.stats.minimum
+            summary.sketch.maximum = summary.stats.maximum
+        return summary
+
+    def to_dict(self, quantiles: Sequence[float]) -> dict:
+        stats = self.stats
+        if stats.count == 0:
+            return {"count": 0}
+        return {
+            "count": stats.count,
+            "sum": stats.total,
+            "mean": stats.mean,
+            "min": stats.minimum,
+            "max": stats.maximum,
+            "stddev": stats.stddev,
+            "quantiles": {quantile_name(q): self.sketch.quantile(q) for q in quantiles},
+        }
+
+
+# ================================================================
+# GROUP-BY
+# ================================================================
+
+class _Group:
+    __slots__ = ("count", "metrics")
+
+    def __init__(self, metric_count: int) -> None:
+        self.count = 0
+        self.metrics = [NumericSummary() for _ in range(metric_count)]
+
+
+class GroupBy:
+    """
+    Single-pass group-by: entries are grouped by the values at `keys`
+    (dotted field paths) and the numeric values at `metrics` are
+    aggregated per group.
+
+    Group values that are not strings, numbers, booleans or null are
+    grouped as null; categorical keys are grouped as normalized.
+    """
+
+    def __init__(
+        self,
+        keys: Sequence[str] = (),
+        metrics: Sequence[str] = (),
+        quantiles: Sequence[float] = DEFAULT_QUANTILES,
+    ) -> None:
+        self.keys = list(keys)
+        self.metrics = list(metrics)
+        self.quantiles = tuple(quantiles)
+        self._key_paths = [tuple(field.split(".")) for field in self.keys]
+        self._metric_paths = [tuple(field.split(".")) for field in self.metrics]
+        # Normalizer per key path; None for non-categorical keys.
+        self._key_normalizers = [
+            CATEGORICAL_FIELDS.get(path[0]) if len(path) == 1 else None
+            for path in self._key_paths
+        ]
+        self.groups: Dict[tuple, _Group] = {}
+
+    @property
+    def fields(self) -> frozenset:
+        """Top-level entry fields the group-by reads."""
+        return frozenset(path[0] for path in self._key_paths + self._metric_paths)
+
+    def add(self, entry: dict) -> None:
+        key = []
+        for path, normalizer in zip(self._key_paths, self._key_normalizers):
+            value = _lookup(entry, path)
+            if normalizer is not None:
+                key.append(normalizer(value))
+            else:
+                key.append(value if isinstance(value, _SCALAR_TYPES) else None)
+        key = tuple(key)
+
+        group = self.groups.get(key)
+        if group is None:
+            group = self.groups[key] = _Group(len(self._metric_paths))
+        group.count += 1
+        for path, summary in zip(self._metric_paths, group.metrics):
+            value = _number(_lookup(entry, path))
+            if value is not None:
+                summary.add(value)
+
+    def merge(self, other: "GroupBy") -> None:
+        """Add the groups of `other` (same keys and metrics) to these."""
+        for key, theirs in other.groups.items():
+            self._merge_group(key, theirs.count, theirs.metrics)
+
+    def _merge_group(self, key: tuple, count: int, metrics: Sequence[NumericSummary]) -> None:
+        group = self.groups.get(key)
+        if group is None:
+            group = self.groups[key] = _Group(len(self._metric_paths))
+        group.count += count
+        for summary, their_summary in zip(group.metrics, metrics):
+            summary.merge(their_summary)
+
+    def state(self) -> list:
+        """The groups' aggregates as JSON-compatible data."""
+        return [
+            [list(key), group.count, [summary.state() for summary in group.metrics]]
+            for key, group in self.groups.items()
+        ]
+
+    def restore(self, state: list) -> None:
+        """Add the groups saved by state() of a GroupBy like this one."""
+        for key, count, metrics in state:
+            self._merge_group(
+                tuple(key), count, [NumericSummary.from_state(saved) for saved in metrics]
+            )
+
+    @property
+    def total(self) -> int:
+        return sum(group.count for group in self.groups.values())
+
+    def rows(self, min_group_size: int = 1) -> Tuple[List[dict], int]:
+        """
+        One result row per group with at least `min_group_size` entries,
+        sorted by group values, plus the number of groups left out.
+        """
+        published = sorted(
+            (key for key, group in self.groups.items() if group.count >= min_group_size),
+            key=_group_order,
+        )
+        rows = []
+        for key in published:
+            group = self.groups[key]
+            row = {"group": dict(zip(self.keys, key)), "count": group.count}
+            if self.metrics:
+                row["metrics"] = {
+                    field: summary.to_dict(self.quantiles)
+                    for field, summary in zip(self.metrics, group.metrics)
+                }
+            rows.append(row)
+        return rows, len(self.groups) - len(published)
+
+
+def _group_order(key: tuple) -> list:
+    # Group values mix null, booleans, numbers and strings, which do not
+    # compare with each other; order by kind first.
+    return [
+        (0, 0) if value is None else (1, value) if isinstance(value, (int, float)) else (2, value)
+        for value in key
+    ]
@@ -0,0 +1,209 @@
+"""
+Private (race, strategy_type) index of the patterns dataset.
+
+Maps every (race, strategy_type) contribution (see summary.py) to the
+IDs of the patterns that have it, so questions about the dataset's
+breakdown can be answered without scanning patterns.json again:
+
+  index/counts.json       - number of patterns per (race, strategy_type);
+                            O(distinct keys), enough for every breakdown
+  index/postings.sqlite   - the pattern IDs per (race, strategy_type), as
+                            an SQLite table keyed by pattern ID
+
+Both files record the content hash of the patterns.json they describe
+and are only trusted while it matches. In incremental mode the index is
+kept up to date by applying the same per-pattern deltas as the summary
+(see state.update_incremental()), instead of being rebuilt.
+
+The postings stay on disk: changes are written in place as they are
+made and committed by save(), so neither memory nor the writes of a run
+grow with the size of the dataset, only with what changed.
+
+The index lives in the PRIVATE state folder: it holds pattern IDs.
+"""
+
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from state import open_database, read_json_object, read_meta, write_json_atomic, write_meta
+from summary import SUMMARY_VERSION, Contribution, SummaryAccumulator
+
+# Bump the first part whenever the on-disk layout changes; older indexes
+# are then ignored. So are indexes of another summary.SUMMARY_VERSION,
+# whose postings and counts are keyed by other contributions.
+INDEX_VERSION = f"4.{SUMMARY_VERSION}"
+
+# Postings are added, and looked up, this many at a time.
+INDEX_BATCH_SIZE = 512
+
+_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS postings ("
+    "pattern_id TEXT PRIMARY KEY, race TEXT NOT NULL, strategy_type TEXT NOT NULL"
+    ") WITHOUT ROWID",
+]
+
+
+class PatternIndex:
+    """
+    Pattern-ID postings per (race, strategy_type) contribution, in
+    `index_dir`/postings.sqlite (created if missing). Changes are only
+    kept once save() commits them.
+    """
+
+    def __init__(self, index_dir: Path) -> None:
+        self.index_dir = index_dir
+        self._conn = open_database(index_dir / "postings.sqlite", _SCHEMA, INDEX_VERSION)
+        # Content hash of the patterns.json this index describes (None
+        # for an index that was never saved).
+        self.source_hash: Optional[str] = read_meta(self._conn).get("source_hash")
+        self._added: List[Tuple[str, str, str]] = []
+
+    def _write(self) -> None:
+        """Start the transaction save() commits, if not done yet."""
+        if not self._conn.in_transaction:
+            self._conn.execute("BEGIN")
+
+    def _flush(self) -> None:
+        if self._added:
+            self._write()
+            self._conn.executemany("INSERT OR REPLACE INTO postings VALUES (?, ?, ?)", self._added)
+            self._added = []
+
+    def add(self, pattern_id: str, contribution: Contribution) -> None:
+        race, strategy_type = contribution
+        self._added.append((pattern_id, race, strategy_type))
+        if len(self._added) >= INDEX_BATCH_SIZE:
+            self._flush()
+
+    def remove(self, pattern_id: str, contribution: Contribution) -> None:
+        self._flush()
+        self._write()
+        race, strategy_type = contribution
+        self._conn.execute(
+            "DELETE FROM postings WHERE pattern_id = ? AND race = ? AND strategy_type = ?",
+            (pattern_id, race, strategy_type),
+        )
+
+    def clear(self) -> None:
+        self._added = []
+        self._write()
+        self._conn.execute("DELETE FROM postings")
+
+    def counts(self) -> Counter:
+        """Number of patterns per (race, strategy_type)."""
+        self._flush()
+        return Counter({
+            (race, strategy_type): count
+            for race, strategy_type, count in self._conn.execute(
+                "SELECT race, strategy_type, COUNT(*) FROM postings GROUP BY race, strategy_type"
+            )
+        })
+
+    def pattern_ids(
+        self, race: Optional[str] = None, strategy_type: Optional[str] = None
+    ) -> Set[str]:
+        """IDs of the patterns with the given race and/or strategy type."""
+        self._flush()
+        conditions, params = ["1"], []
+        for column, value in (("race", race), ("strategy_type", strategy_type)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        return {
+            pattern_id
+            for (pattern_id,) in self._conn.execute(
+                f"SELECT pattern_id FROM postings WHERE {' AND '.join(conditions)}", params
+            )
+        }
+
+    def contributions_of(self, pattern_ids: Iterable[str]) -> Dict[str, Contribution]:
+        """Look up the contribution of each of `pattern_ids` that is indexed."""
+        self._flush()
+        wanted = list(pattern_ids)
+        found = {}
+        for start in range(0, len(wanted), INDEX_BATCH_SIZE):
+            batch = wanted[start:start + INDEX_BATCH_SIZE]
+            for pattern_id, race, strategy_type in self._conn.execute(
+                "SELECT pattern_id, race, strategy_type FROM postings "
+                f"WHERE pattern_id IN ({','.join('?' * len(batch))})",
+                batch,
+            ):
+                found[pattern_id] = (race, strategy_type)
+        return found
+
+    def save(self) -> None:
+        """
+        Commit the postings, then write counts.json. Each carries
+        source_hash, so readers never combine files of different versions
+        of the dataset.
+        """
+        self._flush()
+        self._write()
+        write_meta(self._conn, version=INDEX_VERSION, source_hash=self.source_hash)
+        self._conn.execute("COMMIT")
+        # The postings of older versions were one JSON document.
+        (self.index_dir / "postings.json").unlink(missing_ok=True)
+        write_json_atomic(
+            self.index_dir / "counts.json",
+            {
+                "version": INDEX_VERSION,
+                "source_hash": self.source_hash,
+                "counts": [
+                    {"race": race, "strategy_type": strategy, "count": count}
+                    for (race, strategy), count in sorted(self.counts().items())
+                ],
+            },
+            indent=2,
+        )
+
+    def close(self) -> None:
+        """Close the database, dropping changes that were not saved."""
+        self._conn.close()
+
+    @classmethod
+    def load(cls, index_dir: Path, source_hash: Optional[str] = None) -> Optional["PatternIndex"]:
+        """
+        Open the saved index. With `source_hash`, only an index of exactly
+        that dataset is returned. None if there is no (matching) index.
+        """
+        if not (index_dir / "postings.sqlite").exists():
+            return None
+        index = cls(index_dir)
+        if "version" not in read_meta(index._conn) or (
+            source_hash is not None and index.source_hash != source_hash
+        ):
+            index.close()
+            return None
+        return index
+
+
+def _read_index_file(path: Path, source_hash: Optional[str]) -> Optional[dict]:
+    data = read_json_object(path)
+    if data.get("version") != INDEX_VERSION:
+        return None
+    if source_hash is not None and data.get("source_hash") != source_hash:
+        return None
+    return data
+
+
+def load_index_counts(index_dir: Path, source_hash: str) -> Optional[Dict[Tuple[str, str], int]]:
+    """
+    Read only the counts of the index of the dataset with content hash
+    `source_hash` (None if there is no such index).
+    """
+    data = _read_index_file(index_dir / "counts.json", source_hash)
+    if data is None:
+        return None
+    return {(row["race"], row["strategy_type"]): row["count"] for row in data["counts"]}
+
+
+def aggregate_from_index(index_dir: Path, source_hash: str) -> Optional[SummaryAccumulator]:
+    """Build the summary from the index counts, or None without an index."""
+    counts = load_index_counts(index_dir, source_hash)
+    if counts is None:
+        return None
+    acc = SummaryAccumulator()
+    for contribution, count in counts.items():
+        acc.add(contribution, count)
+    return acc
@@ -0,0 +1,118 @@
+"""
+Per-stage timing and memory instrumentation for a summary run.
+
+A RunReport records, for each stage of the pipeline (locate, check
+input, scan, summarize, write, ...):
+  - elapsed wall time
+  - change in resident memory (RSS) over the stage
+  - bytes read from disk, where the stage knows it
+  - entries processed, where the stage knows it
+
+The report is machine-readable JSON written to the datasite's PRIVATE
+state folder. It contains only timings and counts -- never pattern IDs
+or any other data -- but it describes the owner's machine, so it is not
+published.
+"""
+
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+import os
+import sys
+import time
+
+from state import write_json_atomic
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Bump whenever the layout of the report changes.
+REPORT_VERSION = 1
+
+
+def current_rss_bytes() -> Optional[int]:
+    """
+    Current resident set size of this process, or None if unknown.
+
+    Uses /proc on Linux. Elsewhere only the PEAK RSS is available, which
+    still shows which stage grew memory.
+    """
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    return peak_rss_bytes()
+
+
+def peak_rss_bytes() -> Optional[int]:
+    """Peak resident set size of this process, or None if unknown."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class RunReport:
+    """
+    Collects stage measurements for one run of one datasite.
+
+    Usage:
+        report = RunReport(datasite_name)
+        with report.stage("scan") as metrics:
+            ...
+            metrics["entries"] = n
+            metrics["bytes_read"] = size
+        report.status = "written"
+        report.save(path)
+    """
+
+    def __init__(self, datasite: str) -> None:
+        self.datasite = datasite
+        self.status = "failed"
+        self.stages = []
+        self._started_wall = time.time()
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[dict]:
+        """
+        Measure one stage. The yielded dict may be filled with extra
+        metrics such as "entries" and "bytes_read".
+        """
+        metrics = {}
+        rss_before = current_rss_bytes()
+        started = time.perf_counter()
+        try:
+            yield metrics
+        finally:
+            rss_after = current_rss_bytes()
+            record = {
+                "name": name,
+                "seconds": round(time.perf_counter() - started, 6),
+                "rss_delta_bytes": (
+                    rss_after - rss_before
+                    if rss_before is not None and rss_after is not None
+                    else None
+                ),
+            }
+            record.update(metrics)
+            self.stages.append(record)
+
+    def to_dict(self) -> dict:
+        return {
+            "version": REPORT_VERSION,
+            "datasite": self.datasite,
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime(self._started_wall)),
+            "status": self.status,
+            "total_seconds": round(time.perf_counter() - self._started, 6),
+            "peak_rss_bytes": peak_rss_bytes(),
+            "stages": self.stages,
+        }
+
+    def save(self, path: Path) -> None:
+        """Write the report as JSON (atomically) to `path`."""
+        write_json_atomic(path, self.to_dict(), indent=2)
@@ -11,9 +11,48 @@ All filesystem paths are computed dynamically based on where SyftBox
 installs the app, so no absolute paths are required.
 """
 
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from pathlib import Path
-from collections import Counter
-import json
+from typing import List, Tuple
+import argparse
+import time
+
+from columns import ColumnCacheBuilder, aggregate_from_cache
+from batch import load_requests
+from breakdown import engine, use_engine
+from checkpoint import Budget, ScanCheckpoint, resumable_pass, resumable_scan
+from daemon import run_daemon, run_lock
+from decoder import json_backend, use_json_backend
+from extras import (
+    PatternStrategyJoin,
+    comments_summary,
+    summarize_comments,
+    summarize_learning_stats,
+)
+from filters import FilterSet
+from index import PatternIndex, aggregate_from_index
+from instrument import RunReport
+from preview import preview_breakdown
+from publish import publish_json
+from reader import (
+    SHARD_DIR_NAME,
+    find_pattern_shards,
+    find_patterns_file,
+    is_json_lines,
+    iter_dataset_patterns,
+    iter_patterns,
+)
+from shards import aggregate_shards
+from state import (
+    check_manifest,
+    content_hash,
+    keep_state_resident,
+    manifest_key,
+    read_json_object,
+    save_manifest,
+    update_incremental,
+)
+from summary import CONTRIBUTION_FIELDS, SUMMARY_VERSION, SummaryAccumulator, pattern_contribution
 
 # ================================================================
 # CONFIGURATION SECTION
@@ -36,25 +75,176 @@ DATASET_REL_PATH = Path("semi-public") / "team-project"
 #   SyftBox/datasites/kj@psistorm.com/public/protoss_summary.json
 OUTPUT_FILE = Path("public") / "protoss_summary.json"
 
+# The all-races summary (per-race strategy breakdowns for Protoss, Terran,
+# Zerg, Random and unknown), computed in the same single pass. This ends
+# up at:
+#   SyftBox/datasites/kj@psistorm.com/public/race_summary.json
+ALL_RACES_OUTPUT_FILE = Path("public") / "race_summary.json"
+
+# Aggregates of the other two dataset files, comments.json (comment
+# counts per strategy type) and learning_stats.json (distributions of
+# numeric stats, grouped by known field names only), published in the
+# same run. This ends up at:
+#   SyftBox/datasites/kj@psistorm.com/public/dataset_summary.json
+DATASET_OUTPUT_FILE = Path("public") / "dataset_summary.json"
+
+# Named filters (see filters.py for the expression syntax). Each one is
+# compiled once, evaluated in the same scan as the summaries above, and
+# publishes the per-race strategy breakdown of the patterns it matches to
+#   SyftBox/datasites/kj@psistorm.com/public/filters/<name>.json
+# For example:
+#   FILTERS = {
+#       "confident_protoss_aggression": (
+#           'race == "Protoss" and strategy_type == "protoss_aggression"'
+#           " and confidence > 0.8 and sample_count >= 20"
+#       ),
+#   }
+FILTERS = {}
+FILTER_OUTPUT_DIR = Path("public") / "filters"
+
+# Batch mode: analysts' summary requests (group-by fields, a filter and
+# an output file name; see batch.py) queued as JSON files in
+#   SyftBox/datasites/kj@psistorm.com/private/summary_requests/
+# are all evaluated in the same single scan as the summaries, and each
+# result is published to its own file under
+#   SyftBox/datasites/kj@psistorm.com/public/summary_requests/
+# The queue is PRIVATE, so the datasite owner decides which requests
+# run. A daemon watches the queue too and answers new requests at once.
+REQUESTS_DIR = Path("private") / "summary_requests"
+REQUEST_OUTPUT_DIR = Path("public") / "summary_requests"
+
+# PRIVATE folder (inside the datasite) for the app's own bookkeeping
+# between runs. It holds pattern IDs and fingerprints, so it must never
+# be under public/. This ends up at:
+#   SyftBox/datasites/kj@psistorm.com/private/protoss_summary/
+STATE_DIR = Path("private") / "protoss_summary"
+
+# When True, remember per-pattern fingerprints and contributions in
+# STATE_DIR so the next run only applies deltas for patterns that were
+# added, removed or modified, instead of recounting everything.
+# The state is an SQLite database with one small record per pattern ID;
+# records stay on disk (see state.py), so memory does not grow with the
+# dataset, but the database takes roughly 70 bytes of disk per pattern.
+INCREMENTAL_STATE = True
+
+# When True, publish summaries without indentation or spaces. Smaller
+# files sync faster; False keeps them human-readable.
+COMPACT_OUTPUT = False
+
+# When True, remember the mtime, size and content hash of patterns.json
+# in STATE_DIR and exit early (without touching the public summary, which
+# would trigger a pointless sync upload) when the input is unchanged.
+SKIP_IF_UNCHANGED = True
+
+# When True, keep a columnar binary cache of "race" and "strategy_type"
+# in STATE_DIR. A dataset that was already scanned once (same content
+# hash) is then re-aggregated from small memory-mapped integer arrays
+# instead of being parsed again. Only used with PATTERN_INDEX off: the
+# index counts answer the same question first, so with both on the
+# cache would only ever be written.
+COLUMN_CACHE = True
+
+# When True, keep a (race, strategy_type) -> pattern IDs index with
+# per-key counts in STATE_DIR (see index.py), updated incrementally with
+# the summary. An unchanged dataset is then summarized from the counts
+# alone, and comments are attributed to strategies from the postings.
+PATTERN_INDEX = True
+
+# When True, write a machine-readable run report (time, RSS change, bytes
+# read and entries processed per pipeline stage) to
+#   STATE_DIR/run_report.json
+# It holds only timings and counts, but stays private like all state.
+INSTRUMENTATION = True
+
+# When True, summarize EVERY folder under SyftBox/datasites/ that has a
+# dataset at DATASET_REL_PATH (instead of only OWNER_EMAIL's), running
+# them concurrently in a process pool. Also available as --all-datasites.
+ALL_DATASITES = False
+
+# Maximum number of worker processes for multi-datasite runs.
+# None means one per CPU core.
+MAX_WORKERS = None
+
+# Maximum number of worker processes for aggregating the shards of a
+# sharded dataset, i.e. a folder of shard files
+#   DATASET_REL_PATH/patterns/part-0000.json   (same layout as patterns.json)
+#   DATASET_REL_PATH/patterns/part-0001.jsonl  (JSON Lines)
+# used instead of patterns.json. None means one per CPU core.
+SHARD_WORKERS = None
+
+# When True, stay resident instead of exiting after one run: watch the
+# dataset folder (inotify on Linux, polling elsewhere) and republish the
+# summaries shortly after every change. Also available as --daemon.
+DAEMON_MODE = False
+
+# Daemon mode: how long the dataset folder must be quiet after a change
+# before rerunning, so bursty writes cause one rerun instead of many.
+DEBOUNCE_SECONDS = 0.25
+
+# Daemon mode: how often the polling fallback checks for changes.
+POLL_INTERVAL_SECONDS = 1.0
+
+# The pattern entry fields the summaries are built from. Must include
+# what summary.py reads; the fields FILTERS and queued requests read are
+# added automatically. Only JSON Lines files (patterns.jsonl, shards)
+# skip every other field (signatures, build steps, ...) instead of
+# decoding it; see reader.py. patterns.json entries are decoded in full
+# either way, since their end can only be found by parsing them, and
+# then projected -- except with INCREMENTAL_STATE (the default), whose
+# scan fingerprints and hands on whole entries, so this setting saves
+# nothing on that path.
+PATTERN_FIELDS = CONTRIBUTION_FIELDS
+
+# JSON library used to decode JSON Lines pattern records and the private
+# state files (see decoder.py): "auto" uses orjson or msgspec when one is
+# installed and the standard library otherwise; "json" always uses the
+# standard library. No extra dependency is required either way.
+JSON_BACKEND = "auto"
+
+# Engine that counts the (race, strategy_type) breakdowns of shards and
+# of the columnar cache (see breakdown.py): "auto" uses NumPy (bincount
+# over dictionary-encoded fields) when it is installed and pure Python
+# otherwise; "python" never uses NumPy. No extra dependency is required.
+AGGREGATION_ENGINE = "auto"
+
+
+# Preview mode: before at least PREVIEW_MIN_BYTES of patterns are read
+# in full (patterns.json, or the shards that changed), spend
+# PREVIEW_SECONDS sampling the dataset and publish an APPROXIMATE
+# protoss_summary.json first -- estimated counts with 95% confidence
+# intervals, flagged "approximate": true (see preview.py) -- which the
+# exact summary replaces when the full pass finishes. Costs the budget
+# plus one extra write of the public file on such runs. Only the first
+# summary is ever previewed: once an exact protoss_summary.json is
+# published, readers keep it until the next exact one replaces it.
+PREVIEW_MODE = False
+PREVIEW_SECONDS = 2.0
+PREVIEW_MIN_BYTES = 256 * 1024 * 1024
+
+# Time budget of one run, in seconds; None means no limit. A full pass
+# over patterns.json that is not done by then checkpoints its progress
+# (the input offset and running totals, see checkpoint.py) in STATE_DIR
+# and stops, and the next run resumes from the checkpoint, until the pass
+# is complete and the summaries are published. Progress is checkpointed
+# every CHECKPOINT_SECONDS as well. Sharded and JSON Lines datasets stop
+# between work units instead, keeping the shards completed so far. The
+# extra pass for filters, requests or the comment join on such datasets
+# checkpoints and resumes like a scan of patterns.json.
+# TIME_BUDGET_CLOCK "wall" counts elapsed time, "cpu" the CPU time of the
+# app process. In daemon mode, a stopped pass resumes on the next change.
+TIME_BUDGET_SECONDS = None
+TIME_BUDGET_CLOCK = "wall"
+CHECKPOINT_SECONDS = 30.0
+
 
 # ================================================================
 # MAIN APPLICATION LOGIC
 # ================================================================
 
-def main() -> None:
+def find_syftbox_root() -> Path:
     """
-    Main entry point for the app.
-    This function:
-      - Locates the SyftBox installation and datasite folders
-      - Loads the patterns.json dataset file
-      - Filters Protoss patterns
-      - Computes privacy-safe summary statistics
-      - Writes a public JSON summary file
+    Locate the SyftBox root folder from where SyftBox installed this app.
     """
-
-    # ----------------------------------------------------------------
-    # 1. Figure out where SyftBox installed this app.
-    # ----------------------------------------------------------------
     # __file__  gives the path to THIS script.
     # parent    gives its directory.
     app_dir = Path(__file__).resolve().parent
@@ -67,37 +257,180 @@ def main() -> None:
     #   app folder              -> app_dir
     #   apps/ (folder)          -> app_dir.parent
     #   SyftBox root folder     -> app_dir.parent.parent
-    syftbox_root = app_dir.parent.parent
+    return app_dir.parent.parent
 
-    # ----------------------------------------------------------------
-    # 2. Build the path to the datasite owner's root folder.
-    # ----------------------------------------------------------------
-    # Datasites live under:
-    #   SyftBox/datasites/<owner-email>/
-    datasite_root = syftbox_root / "datasites" / OWNER_EMAIL
+
+def summarize_datasite(datasite_root: Path) -> str:
+    """
+    Summarize the dataset of ONE datasite and publish its summary.
+
+    Returns "written" when a new summary was published, "unchanged" when
+    the input (or the resulting summary) had not changed since the last
+    run, "partial" when the time budget ran out before the summary was
+    complete (the next run resumes), or "busy" when another process (e.g.
+    the daemon) is already working on this datasite.
+    """
+    with run_lock(datasite_root / STATE_DIR / "run.lock") as acquired:
+        if not acquired:
+            print(f"[App] {datasite_root.name} is busy in another process; skipping")
+            return "busy"
+        return run_summary(datasite_root)
+
+
+def run_summary(datasite_root: Path) -> str:
+    """
+    summarize_datasite() without taking the run lock; the caller must
+    hold it.
+
+    Every stage is timed and measured; with INSTRUMENTATION enabled, the
+    run report is written to the datasite's private state folder (even
+    when the run fails).
+    """
+    budget = Budget(TIME_BUDGET_SECONDS, TIME_BUDGET_CLOCK)
+    use_json_backend(JSON_BACKEND)
+    use_engine(AGGREGATION_ENGINE)
+    report = RunReport(datasite_root.name)
+    try:
+        report.status = _run_summary_stages(datasite_root, report, budget)
+        return report.status
+    finally:
+        if INSTRUMENTATION:
+            report.save(datasite_root / STATE_DIR / "run_report.json")
+
+
+def _run_summary_stages(datasite_root: Path, report: RunReport, budget: Budget) -> str:
+    """
+    The stages of run_summary(), each measured in `report`, within
+    `budget`.
+    """
 
     # ----------------------------------------------------------------
     # 3. Build the path to the dataset inside that datasite.
     # ----------------------------------------------------------------
-    dataset_root = datasite_root / DATASET_REL_PATH
-
-    # The dataset includes these files:
-    #   patterns.json
-    #   comments.json
-    #   learning_stats.json
-    # We only need patterns.json for this app.
-    patterns_path = dataset_root / "patterns.json"
-
-    # Check whether patterns.json actually exists.
-    # If not, fail early with a clear error message.
-    if not patterns_path.exists():
-        raise FileNotFoundError(
-            f"patterns.json not found at: {patterns_path}\n"
-            "Ensure the dataset files are in the expected SyftBox datasite folder."
-        )
+    with report.stage("locate") as metrics:
+        metrics["json_backend"] = json_backend()
+        metrics["aggregation_engine"] = engine()
+        dataset_root = datasite_root / DATASET_REL_PATH
+
+        # The dataset includes these files:
+        #   patterns.json        - required; the pattern summaries
+        #   comments.json        - optional; see extras.py
+        #   learning_stats.json  - optional; see extras.py
+        # A non-empty patterns/ folder of shard files, if present, is used
+        # instead of patterns.json (see shards.py). So is patterns.jsonl,
+        # the JSON Lines layout (one pattern per line, see convert.py);
+        # like JSON Lines content in patterns.json, it is detected
+        # automatically and aggregated as a dataset of one shard.
+        patterns_path = find_patterns_file(dataset_root)
+        comments_path = dataset_root / "comments.json"
+        learning_stats_path = dataset_root / "learning_stats.json"
+        shard_paths = find_pattern_shards(dataset_root)
+        if shard_paths is None and patterns_path.exists() and is_json_lines(patterns_path):
+            shard_paths = [patterns_path]
+        pattern_paths = shard_paths or [patterns_path]
+
+        # Check whether patterns.json actually exists.
+        # If not, fail early with a clear error message.
+        if shard_paths is None and not patterns_path.exists():
+            raise FileNotFoundError(
+                f"patterns.json not found at: {patterns_path}\n"
+                f"(and no patterns.jsonl or shard files in: {dataset_root / SHARD_DIR_NAME})\n"
+                "Ensure the dataset files are in the expected SyftBox datasite folder."
+            )
+        input_bytes = sum(path.stat().st_size for path in pattern_paths)
+
+        # Compile the configured filters and the queued requests once (a
+        # syntax error in FILTERS fails the run here, before anything is
+        # read; a bad request is only reported in its own result file).
+        # Both are evaluated on every scanned entry, so the fields they
+        # read are loaded along with the summary fields.
+        filter_set = FilterSet(FILTERS)
+        request_queue = load_requests(datasite_root / REQUESTS_DIR)
+        queries = [query for query in (filter_set, request_queue) if query]
+        query_fields = frozenset().union(*(query.fields for query in queries))
+        pattern_fields = tuple(PATTERN_FIELDS) + tuple(sorted(query_fields - set(PATTERN_FIELDS)))
+        query_output_paths = [
+            *(datasite_root / FILTER_OUTPUT_DIR / f"{name}.json" for name in FILTERS),
+            *(datasite_root / REQUEST_OUTPUT_DIR / output for output in request_queue.outputs()),
+        ]
+
+        output_path = datasite_root / OUTPUT_FILE
+        all_races_output_path = datasite_root / ALL_RACES_OUTPUT_FILE
+        dataset_output_path = datasite_root / DATASET_OUTPUT_FILE
+        manifest_path = datasite_root / STATE_DIR / "manifest.json"
+        columns_dir = datasite_root / STATE_DIR / "columns"
+        index_dir = datasite_root / STATE_DIR / "index"
+        checkpoint_path = datasite_root / STATE_DIR / "checkpoint.json"
+        pass_checkpoint_path = datasite_root / STATE_DIR / "pattern_pass_checkpoint.json"
+        tmp_dir = datasite_root / STATE_DIR / "tmp"
+        # Everything besides the input files that the outputs depend on:
+        # a new version of the summaries themselves, or other filters or
+        # requests, makes the next run redo its work.
+        settings = {
+            "summary_version": SUMMARY_VERSION,
+            "filters": FILTERS,
+            "requests": request_queue.specs,
+        }
+
+    # If the dataset files are identical to what the last run summarized
+    # and its summaries are still published, there is nothing to do. The
+    # stat check costs microseconds; a content hash is only computed when
+    # a stat changed (e.g. a file was re-synced with the same bytes).
+    source_hash = None
+    shard_hashes = None
+    comments_hash = None
+    with report.stage("check_input"):
+        if SKIP_IF_UNCHANGED:
+            unchanged, manifest = check_manifest(
+                pattern_paths + [comments_path, learning_stats_path],
+                manifest_path,
+                base_dir=dataset_root,
+                settings=settings,
+            )
+            pattern_hashes = {
+                path.name: manifest["files"][manifest_key(path, dataset_root)]["content_hash"]
+                for path in pattern_paths
+            }
+            if shard_paths is None:
+                source_hash = pattern_hashes[patterns_path.name]
+            else:
+                shard_hashes = pattern_hashes
+            comments_record = manifest["files"][manifest_key(comments_path, dataset_root)]
+            comments_hash = comments_record and comments_record["content_hash"]
+            published = (
+                output_path,
+                all_races_output_path,
+                dataset_output_path,
+                *query_output_paths,
+            )
+            if unchanged and all(path.exists() for path in published):
+                save_manifest(manifest_path, manifest)
+                print(f"[App] Dataset unchanged; keeping: {output_path}")
+                return "unchanged"
+        elif (COLUMN_CACHE or PATTERN_INDEX or budget) and shard_paths is None:
+            source_hash = content_hash(patterns_path)
+        if budget and not SKIP_IF_UNCHANGED:
+            if shard_paths is not None:
+                shard_hashes = {path.name: content_hash(path) for path in shard_paths}
+            if comments_path.exists():
+                comments_hash = content_hash(comments_path)
+        # A checkpoint is only resumed on the same input; the comment join
+        # in it depends on comments.json as well.
+        checkpoint_source = {
+            "patterns": source_hash if shard_paths is None else shard_hashes,
+            "comments": comments_hash,
+        }
+
+    def stop_partial(message: str) -> str:
+        # Keep the stat and hash records, so the next run need not hash
+        # the inputs again; it still does not count as unchanged.
+        if SKIP_IF_UNCHANGED:
+            save_manifest(manifest_path, manifest, complete=False)
+        print(message)
+        return "partial"
 
     # ----------------------------------------------------------------
-    # 4. Load patterns.json into memory.
+    # 4. Stream patterns.json one entry at a time.
     # ----------------------------------------------------------------
     # patterns.json is a dictionary mapping pattern IDs (like "pattern_001")
     # to pattern data structures that include:
@@ -107,62 +440,426 @@ def main() -> None:
     #   - sample_count
     #   - confidence
     #   - etc.
-    with patterns_path.open("r", encoding="utf-8") as f:
-        patterns = json.load(f)
+    #
+    # The file can be several GB, so we do NOT json.load() it. The reader
+    # hands us one entry at a time; each entry is reduced to its
+    # contribution to the summary and dropped before the next one is parsed.
+    #
+    # Steps 5 and 6 happen per entry inside that scan (see summary.py):
+    #
+    # 5. Classify each pattern by race (case-insensitive "race" check).
+    #
+    # 6. Count how many strategies fall into each strategy type, per race.
+    #    All races are counted in this one pass; the Protoss-only numbers
+    #    are a subset of them.
+    #
+    # In incremental mode, per-pattern fingerprints and contributions from
+    # the previous run are kept in the PRIVATE state folder, and only
+    # added/removed/modified patterns are applied as deltas to the old
+    # totals.
+    #
+    # With the pattern index enabled, a dataset whose content hash was
+    # already indexed is summarized from the index's per-key counts, and
+    # every scan brings the index up to date on the way. Otherwise, with
+    # the columnar cache enabled, a dataset that was already scanned once
+    # is aggregated from the cached integer columns.
+    #
+    # A sharded dataset is aggregated shard by shard in a process pool
+    # instead (see shards.py); partial summaries of unchanged shards are
+    # reused, which takes the place of the per-pattern incremental state
+    # and the columnar cache.
+    #
+    # The configured filters and queued requests need to see every entry,
+    # so with any of them the index and the columnar cache are not used to
+    # skip the scan; all of them are evaluated in it, on each entry.
+    #
+    # In preview mode, a large dataset that has to be read in full is
+    # sampled for a moment first, and an approximate Protoss summary is
+    # published right away (see preview.py).
+    #
+    # With a time budget, patterns.json is scanned from the checkpoint of
+    # an earlier run that ran out of time, if there is one, instead, and
+    # the scan itself checkpoints and stops when time runs out (see
+    # checkpoint.py). It then neither updates the incremental state nor
+    # the index; the next run without a budget brings them up to date.
+    # A run that stops early publishes nothing (but the preview) and
+    # saves the manifest marked incomplete.
+    #
+    # Meanwhile, comments.json and learning_stats.json are streamed in
+    # background threads. Comments that only point at a pattern ID are
+    # attributed to a strategy type through the same patterns.json scan.
+    acc = None
+    columns = None
+    index = None
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        comments_future = pool.submit(summarize_comments, comments_path)
+        learning_stats_future = pool.submit(summarize_learning_stats, learning_stats_path)
+        join = PatternStrategyJoin(comments_future)
+
+        def publish_preview(pass_bytes: int) -> None:
+            # Only worth it when the full pass that follows (reading
+            # `pass_bytes`) is slow.
+            if not PREVIEW_MODE or pass_bytes < PREVIEW_MIN_BYTES:
+                return
+            published = read_json_object(output_path)
+            # Never replace exact numbers (of an earlier input) with an
+            # estimate; and a pass that ran out of time already
+            # published its preview.
+            if published and (not published.get("approximate") or budget):
+                return
+            with report.stage("preview") as metrics:
+                try:
+                    preview = preview_breakdown(pattern_paths, PREVIEW_SECONDS)
+                except (OSError, ValueError) as exc:
+                    # The full pass reports real problems with the data.
+                    print(f"[App] Preview skipped: {exc}")
+                    return
+                if preview is None:
+                    return
+                metrics["entries"] = preview["sample_size"]
+                publish_json(output_path, preview, tmp_dir, compact=COMPACT_OUTPUT)
+                print(f"[App] Approximate preview written to: {output_path}")
+
+        if shard_paths is not None:
+            with report.stage("shards") as metrics:
+                acc, shard_stats = aggregate_shards(
+                    shard_paths,
+                    datasite_root / STATE_DIR / "shard_partials.json",
+                    shard_hashes=shard_hashes,
+                    max_workers=SHARD_WORKERS,
+                    fields=PATTERN_FIELDS,
+                    budget=budget,
+                    # Unchanged shards are reused, so only preview when
+                    # others need aggregating.
+                    before_work=lambda todo: publish_preview(
+                        sum(path.stat().st_size for path in todo)
+                    ),
+                )
+                metrics.update(shard_stats, shards=len(shard_paths))
+                if acc is None:
+                    return stop_partial(
+                        f"[App] Time budget used up with {shard_stats['unfinished']} of "
+                        f"{len(shard_paths)} shard(s) unfinished; the next run continues"
+                    )
+                metrics["entries"] = acc.total_patterns
+                print(
+                    f"[App] Aggregated {len(shard_paths)} shard(s) "
+                    f"({shard_stats['reused']} unchanged, {shard_stats['aggregated']} aggregated)"
+                )
+        if PATTERN_INDEX and shard_paths is None and not queries:
+            with report.stage("index") as metrics:
+                acc = aggregate_from_index(index_dir, source_hash)
+                if acc is not None:
+                    metrics["entries"] = acc.total_patterns
+                    print(f"[App] Aggregated from pattern index: {index_dir}")
+        use_cache = COLUMN_CACHE and not PATTERN_INDEX
+        if acc is None and shard_paths is None and use_cache and not queries:
+            with report.stage("columnar_cache") as metrics:
+                acc = aggregate_from_cache(columns_dir, source_hash)
+                if acc is None:
+                    columns = ColumnCacheBuilder()
+                else:
+                    metrics["entries"] = acc.total_patterns
+                    print(f"[App] Aggregated from columnar cache: {columns_dir}")
+        scanned = acc is None
+
+        def on_entry(pattern_id: str, entry: dict) -> None:
+            if columns is not None:
+                columns.add(entry)
+            join.observe(pattern_id, entry)
+            for query in queries:
+                query.observe(entry)
+
+        if scanned:
+            publish_preview(input_bytes)
+            with report.stage("scan") as metrics:
+                if budget:
+                    acc, progress = resumable_scan(
+                        patterns_path,
+                        ScanCheckpoint(checkpoint_path, checkpoint_source, settings),
+                        budget,
+                        CHECKPOINT_SECONDS,
+                        fields=pattern_fields,
+                        on_entry=on_entry,
+                        parts={"join": join, "filters": filter_set, "requests": request_queue},
+                    )
+                    metrics.update(progress)
+                    metrics["bytes_read"] = progress["offset"] - progress["resumed_from"]
+                    if acc is None:
+                        return stop_partial(
+                            f"[App] Time budget used up at byte {progress['offset']} of "
+                            f"{input_bytes}; checkpoint saved, the next run resumes"
+                        )
+                    if progress["resumed_from"]:
+                        # Only the rest of the file went through on_entry.
+                        columns = None
+                        print(f"[App] Resumed from checkpoint at byte {progress['resumed_from']}")
+                elif INCREMENTAL_STATE:
+                    state_path = datasite_root / STATE_DIR / "incremental_state.sqlite"
+                    if PATTERN_INDEX:
+                        index = PatternIndex(index_dir)
+                    acc, changes = update_incremental(
+                        patterns_path,
+                        state_path,
+                        on_entry=on_entry,
+                        index=index,
+                        source_hash=source_hash,
+                    )
+                    metrics["entries"] = sum(changes.values()) - changes["removed"]
+                    metrics["changes"] = changes
+                    print(
+                        "[App] Incremental update: "
+                        + ", ".join(f"{count} {kind}" for kind, count in changes.items())
+                    )
+                else:
+                    acc = SummaryAccumulator()
+                    if PATTERN_INDEX:
+                        index = PatternIndex(index_dir)
+                        index.clear()
+                        index.source_hash = source_hash
+                    for pattern_id, entry in iter_patterns(patterns_path, fields=pattern_fields):
+                        on_entry(pattern_id, entry)
+                        contribution = pattern_contribution(entry)
+                        acc.add(contribution)
+                        if index is not None:
+                            index.add(pattern_id, contribution)
+                    metrics["entries"] = acc.total_patterns
+                if not budget:
+                    metrics["bytes_read"] = input_bytes
+
+                if columns is not None:
+                    columns.save(columns_dir, source_hash)
+                if index is not None:
+                    index.save()
+                    index.close()
+
+        with report.stage("extras") as metrics:
+            comment_stats = comments_future.result()
+            learning_stats = learning_stats_future.result()
+            if comment_stats is not None:
+                metrics["comments"] = comment_stats.total
+
+    # When the patterns were not scanned, comments that point at a
+    # pattern are attributed through the index postings. The columnar
+    # cache and shard partials hold no pattern IDs (nor anything filters
+    # or requests could be evaluated on), so without an index, or with
+    # filters or requests on a sharded dataset, that takes one extra pass
+    # over the patterns, shared by the comments and all queries.
+    join_comments = comment_stats is not None and bool(comment_stats.by_pattern)
+    if not scanned and (join_comments or queries):
+        with report.stage("comment_join" if not queries else "pattern_pass") as metrics:
+            if join_comments:
+                join = PatternStrategyJoin(wanted=set(comment_stats.by_pattern))
+            if PATTERN_INDEX and shard_paths is None and not queries:
+                index = PatternIndex.load(index_dir, source_hash)
+            if index is not None:
+                for pattern_id, (race, strategy_type) in index.contributions_of(
+                    comment_stats.by_pattern
+                ).items():
+                    join.observe(pattern_id, {"race": race, "strategy_type": strategy_type})
+                index.close()
+            else:
+                def observe(pattern_id: str, entry: dict) -> None:
+                    if join_comments:
+                        join.observe(pattern_id, entry)
+                    for query in queries:
+                        query.observe(entry)
+
+                if budget:
+                    parts = {"filters": filter_set, "requests": request_queue}
+                    if join_comments:
+                        parts["join"] = join
+                    complete, progress = resumable_pass(
+                        pattern_paths,
+                        ScanCheckpoint(pass_checkpoint_path, checkpoint_source, settings),
+                        budget,
+                        CHECKPOINT_SECONDS,
+                        fields=pattern_fields,
+                        on_entry=observe,
+                        parts=parts,
+                    )
+                    metrics.update(progress)
+                    metrics["bytes_read"] = progress["offset"] - progress["resumed_from"]
+                    if not complete:
+                        return stop_partial(
+                            f"[App] Time budget used up at byte {progress['offset']} of "
+                            f"{input_bytes} in the pattern pass; checkpoint saved, the next run resumes"
+                        )
+                else:
+                    for pattern_id, entry in iter_dataset_patterns(pattern_paths, pattern_fields):
+                        observe(pattern_id, entry)
+                    metrics["bytes_read"] = input_bytes
 
     # ----------------------------------------------------------------
-    # 5. Filter to ONLY Protoss patterns.
+    # 7. Prepare the privacy-safe summaries.
     # ----------------------------------------------------------------
-    # We check each entry's "race" field and compare it case-insensitively.
-    protoss_patterns = {
-        pattern_id: entry
-        for pattern_id, entry in patterns.items()
-        if (entry.get("race") or "").lower() == "protoss"
-    }
+    # Only aggregate counts are returned; see SummaryAccumulator.to_dict()
+    # for the list of things that are deliberately left out. The
+    # Protoss-only document keeps its original format for existing readers.
+    with report.stage("summarize"):
+        outputs = {
+            output_path: acc.protoss_dict(),
+            all_races_output_path: acc.to_dict(),
+            dataset_output_path: {
+                "comments": (
+                    comments_summary(comment_stats, join) if comment_stats is not None else None
+                ),
+                "learning_stats": learning_stats,
+            },
+        }
+        for name, result in filter_set.documents():
+            outputs[datasite_root / FILTER_OUTPUT_DIR / f"{name}.json"] = result
+        for output, result in request_queue.documents():
+            outputs[datasite_root / REQUEST_OUTPUT_DIR / output] = result
 
     # ----------------------------------------------------------------
-    # 6. Count how many Protoss strategies fall into each strategy type.
+    # 8. Write the summaries to the public folder.
     # ----------------------------------------------------------------
-    # The "strategy_type" field is safe to share because it's a general
-    # category like "protoss_aggression" or "economic_expansion".
-    strategy_breakdown = Counter(
-        (entry.get("strategy_type") or "unknown")
-        for entry in protoss_patterns.values()
+    # This allows the requesting user (karl) to read the output safely.
+    with report.stage("write") as metrics:
+        # Each file is written to a private temporary file and renamed
+        # into place, and only if its content actually changed.
+        changed = [
+            path
+            for path, result in outputs.items()
+            if publish_json(path, result, tmp_dir, compact=COMPACT_OUTPUT)
+        ]
+        metrics["files_changed"] = len(changed)
+
+        # Remember which input this summary was built from, so the next run
+        # can skip if nothing changed.
+        if SKIP_IF_UNCHANGED:
+            save_manifest(manifest_path, manifest)
+
+    # Helpful log output for debugging.
+    for path in outputs:
+        if path in changed:
+            print(f"[App] Privacy-safe summary written to: {path}")
+        else:
+            print(f"[App] Summary content unchanged; keeping: {path}")
+    return "written" if changed else "unchanged"
+
+
+def discover_datasites(syftbox_root: Path) -> List[Path]:
+    """
+    Find every datasite under SyftBox/datasites/ that has a dataset at
+    DATASET_REL_PATH (patterns.json, patterns.jsonl or shard files).
+    """
+    datasites_dir = syftbox_root / "datasites"
+    if not datasites_dir.is_dir():
+        return []
+    return sorted(
+        datasite_root
+        for datasite_root in datasites_dir.iterdir()
+        if find_patterns_file(datasite_root / DATASET_REL_PATH).is_file()
+        or find_pattern_shards(datasite_root / DATASET_REL_PATH) is not None
     )
 
-    # ----------------------------------------------------------------
-    # 7. Prepare a privacy-safe summary.
-    # ----------------------------------------------------------------
-    # We DO NOT include:
-    #   - individual build steps
-    #   - pattern IDs
-    #   - comments
-    #   - timestamps
-    #   - opponent information
-    #   - raw gameplay data
-    #
-    # Only aggregate counts are returned.
-    result = {
-        "total_patterns_in_dataset": len(patterns),
-        "protoss_pattern_count": len(protoss_patterns),
-        "protoss_strategy_breakdown": dict(strategy_breakdown),
-    }
+
+def _timed_summarize_datasite(datasite_root: Path) -> Tuple[str, float]:
+    """Run summarize_datasite() and report how long it took (pool worker)."""
+    started = time.perf_counter()
+    status = summarize_datasite(datasite_root)
+    return status, time.perf_counter() - started
+
+
+def summarize_all_datasites(syftbox_root: Path) -> None:
+    """
+    Summarize every discovered datasite concurrently in a process pool.
+
+    Each datasite is independent (its own input, state and public
+    summary), so they parallelize cleanly. A failure in one datasite is
+    reported but does not stop the others.
+    """
+    datasite_roots = discover_datasites(syftbox_root)
+    if not datasite_roots:
+        print(f"[App] No datasites with a dataset found under: {syftbox_root / 'datasites'}")
+        return
+
+    started = time.perf_counter()
+    failures = []
+
+    with ProcessPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        futures = {
+            pool.submit(_timed_summarize_datasite, datasite_root): datasite_root
+            for datasite_root in datasite_roots
+        }
+        for future in as_completed(futures):
+            owner = futures[future].name
+            try:
+                status, seconds = future.result()
+            except Exception as exc:
+                failures.append(owner)
+                print(f"[App] {owner}: FAILED ({exc!r})")
+            else:
+                print(f"[App] {owner}: {status} in {seconds:.3f}s")
+
+    print(
+        f"[App] Processed {len(datasite_roots)} datasites in "
+        f"{time.perf_counter() - started:.3f}s ({len(failures)} failed)"
+    )
+    if failures:
+        raise RuntimeError(f"Summary failed for datasites: {', '.join(sorted(failures))}")
+
+
+def run_resident(datasite_root: Path) -> None:
+    """
+    Daemon mode for one datasite: keep incremental state in memory and
+    republish whenever the dataset folder or the request queue changes.
+
+    The run lock is held for the daemon's whole lifetime, so scheduled
+    one-shot runs of the app step aside while it is active.
+    """
+    with run_lock(datasite_root / STATE_DIR / "run.lock") as acquired:
+        if not acquired:
+            print(f"[App] {datasite_root.name} is already handled by another process")
+            return
+        keep_state_resident(True)
+        run_daemon(
+            [datasite_root / DATASET_REL_PATH, datasite_root / REQUESTS_DIR],
+            lambda: run_summary(datasite_root),
+            debounce=DEBOUNCE_SECONDS,
+            poll_interval=POLL_INTERVAL_SECONDS,
+        )
+
+
+def main(all_datasites: bool = ALL_DATASITES, daemon: bool = DAEMON_MODE) -> None:
+    """
+    Main entry point for the app.
+    This function:
+      - Locates the SyftBox installation and datasite folders
+      - Streams the patterns.json dataset file entry by entry
+      - Classifies patterns by race in a single pass
+      - Computes privacy-safe summary statistics
+      - Summarizes comments.json and learning_stats.json alongside
+      - Writes the public JSON summary files (Protoss-only, all races and
+        the other dataset files)
+
+    With `all_datasites`, it does so for every datasite that has the
+    dataset instead of only OWNER_EMAIL's. With `daemon`, it keeps
+    running and republishes OWNER_EMAIL's summaries on every change.
+    """
 
     # ----------------------------------------------------------------
-    # 8. Write summary to the public folder.
+    # 1. Figure out where SyftBox installed this app.
     # ----------------------------------------------------------------
-    # This allows the requesting user (karl) to read the output safely.
-    output_path = datasite_root / OUTPUT_FILE
+    syftbox_root = find_syftbox_root()
 
-    # Ensure the public folder exists.
-    output_path.parent.mkdir(parents=True, exist_ok=True)
+    if all_datasites:
+        summarize_all_datasites(syftbox_root)
+        return
 
-    # Write JSON output.
-    with output_path.open("w", encoding="utf-8") as f:
-        json.dump(result, f, indent=2)
+    # ----------------------------------------------------------------
+    # 2. Build the path to the datasite owner's root folder.
+    # ----------------------------------------------------------------
+    # Datasites live under:
+    #   SyftBox/datasites/<owner-email>/
+    datasite_root = syftbox_root / "datasites" / OWNER_EMAIL
 
-    # Helpful log output for debugging.
-    print(f"[App] Privacy-safe summary written to: {output_path}")
+    if daemon:
+        run_resident(datasite_root)
+    else:
+        summarize_datasite(datasite_root)
 
 
 # ================================================================
@@ -171,5 +868,21 @@ def main() -> None:
 
 # This ensures the app only executes when SyftBox runs it directly.
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Privacy-safe Protoss strategy summary.")
+    parser.add_argument(
+        "--all-datasites",
+        action="store_true",
+        default=ALL_DATASITES,
+        help="summarize every datasite that has the dataset, in parallel",
+    )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        default=DAEMON_MODE,
+        help="stay resident and republish whenever the dataset changes",
+    )
+    args = parser.parse_args()
+    if args.daemon and args.all_datasites:
+        parser.error("--daemon watches OWNER_EMAIL's datasite only; drop --all-datasites")
+    main(all_datasites=args.all_datasites, daemon=args.daemon)
 
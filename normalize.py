@@ -0,0 +1,105 @@
+"""
+Canonical forms of categorical pattern fields.
+
+Real datasets spell the same category in many ways ("Protoss",
+"protoss", " PROTOSS ", "toss", "P"; "Protoss Aggression",
+"protoss_aggression"). Every categorical field has one Categorical
+normalizer here, used everywhere its values are compared or counted:
+the summaries (summary.pattern_contribution()), filters (filters.py)
+and group-bys (groupby.py), so all of them agree on what a category is.
+
+A value is normalized by Unicode NFKC-normalizing and case-folding it,
+collapsing runs of whitespace into "_" and trimming it, then looking it
+up in the field's aliases. A "closed" field (race) only has the
+categories its aliases name, and anything else is "unknown"; other
+fields keep the folded value as the category. Missing, empty and
+non-string values are "unknown".
+
+Categories have a handful of distinct spellings but are normalized once
+per pattern, so canonical forms are memoized in a bounded LRU cache per
+field, which never allocates a new string for a spelling it has seen.
+Hot loops call Categorical.canonical, the cache itself, directly.
+
+To normalize a new categorical field, add a Categorical for it to
+CATEGORICAL_FIELDS. If it feeds the summaries, or an existing field
+changes how it normalizes, bump SUMMARY_VERSION in summary.py: every
+version derived from it then changes too, so the incremental state,
+the index, shard partials and checkpoints are rebuilt, and the next
+run does not skip as unchanged.
+"""
+
+from functools import lru_cache
+from typing import Dict, Optional
+import unicodedata
+
+# Category of missing, empty and unrecognized values.
+UNKNOWN = "unknown"
+
+# Distinct spellings remembered per field.
+CACHE_SIZE = 4096
+
+
+def fold(value: str) -> str:
+    """Case- and whitespace-insensitive key of a spelling."""
+    return "_".join(unicodedata.normalize("NFKC", value).casefold().split())
+
+
+class Categorical:
+    """Normalizer of one categorical field; call it with a raw value."""
+
+    def __init__(self, aliases: Optional[Dict[str, str]] = None, closed: bool = False) -> None:
+        self.aliases = {fold(spelling): canonical for spelling, canonical in (aliases or {}).items()}
+        self.closed = closed
+        # Memoized canonical form of a hashable value; raises TypeError
+        # for unhashable ones, which __call__ handles.
+        self.canonical = lru_cache(maxsize=CACHE_SIZE)(self._normalize)
+
+    def _normalize(self, value) -> str:
+        if not isinstance(value, str):
+            return UNKNOWN
+        key = fold(value)
+        if not key:
+            return UNKNOWN
+        canonical = self.aliases.get(key)
+        if canonical is not None:
+            return canonical
+        return UNKNOWN if self.closed else key
+
+    def __call__(self, value) -> str:
+        try:
+            return self.canonical(value)
+        except TypeError:
+            # Unhashable values (lists, objects) are not categories.
+            return UNKNOWN
+
+    def literal(self, value) -> str:
+        """
+        Canonical form of a value written in a filter. Raises ValueError
+        for a category a closed field cannot have.
+        """
+        canonical = self(value)
+        if canonical == UNKNOWN and self.closed and value is not None and (
+            not isinstance(value, str) or fold(value) != UNKNOWN
+        ):
+            names = sorted(set(self.aliases.values()))
+            raise ValueError(f"{value!r} is not one of {', '.join(names)} or {UNKNOWN!r}")
+        return canonical
+
+
+RACE = Categorical(
+    {
+        "Protoss": "Protoss", "toss": "Protoss", "P": "Protoss",
+        "Terran": "Terran", "T": "Terran",
+        "Zerg": "Zerg", "Z": "Zerg",
+        "Random": "Random", "R": "Random",
+    },
+    closed=True,
+)
+
+STRATEGY_TYPE = Categorical()
+
+# Field name -> normalizer. Only top-level fields are normalized.
+CATEGORICAL_FIELDS: Dict[str, Categorical] = {
+    "race": RACE,
+    "strategy_type": STRATEGY_TYPE,
+}
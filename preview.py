@@ -0,0 +1,196 @@
+"""
+Approximate preview of the Protoss strategy breakdown.
+
+On a multi-GB dataset, the exact summaries only appear once the whole
+file was read. In preview mode (PREVIEW_MODE in main.py), the app first
+spends a fixed time budget sampling patterns and publishes an estimate
+of protoss_summary.json, flagged "approximate": true and with confidence
+intervals, and replaces it with the exact summary when the full pass
+finishes. That is only done while no exact summary is published: the
+exact numbers of an earlier version of the dataset are kept until the
+new ones replace them.
+
+How patterns are sampled depends on the layout:
+
+  byte_offsets  JSON Lines (patterns.jsonl, or shard folders of only
+                .jsonl shards): lines are drawn at uniformly random
+                byte offsets of the files
+                (reader.iter_random_lines()), a random sample of the
+                whole dataset no matter how it is ordered. A line is
+                drawn with probability proportional to its length, so
+                each draw is weighed by (total bytes / line length), the
+                Hansen-Hurwitz estimator, which is unbiased.
+
+  prefix        patterns.json, or shard folders with any shard in
+                that layout: one object whose entries can only be found
+                by parsing from the start, so the preview reads the files
+                in order, counts the entries read within the budget and
+                scales them up by the fraction of bytes read
+                (reader.DatasetCursor). This is only a random sample if
+                the dataset's order is unrelated to strategies;
+                convert.py turns patterns.json into JSON Lines for true
+                random sampling.
+
+Confidence intervals are normal approximations (CONFIDENCE_Z standard
+errors either side of the estimate). Strategy types that no sampled
+pattern has are missing from the preview's breakdown.
+
+The preview holds nothing the exact summary does not: estimated counts
+of the same categories.
+"""
+
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import math
+import time
+
+from reader import DatasetCursor, is_json_lines, iter_random_lines
+from summary import CONTRIBUTION_FIELDS, Contribution, pattern_contribution
+
+# Width of the confidence intervals, in standard errors (95%).
+CONFIDENCE_Z = 1.96
+CONFIDENCE_LEVEL = 0.95
+
+# The clock is checked once per this many sampled patterns.
+_CHECK_EVERY = 256
+
+
+class _Cell:
+    """Sum and sum of squares of one estimated count's per-draw values."""
+
+    __slots__ = ("sum", "squares")
+
+    def __init__(self) -> None:
+        self.sum = 0.0
+        self.squares = 0.0
+
+    def add(self, weight: float) -> None:
+        self.sum += weight
+        self.squares += weight * weight
+
+
+class BreakdownSample:
+    """
+    Weighted draws of pattern contributions.
+
+    Every draw adds its weight to the counts it falls into (all patterns,
+    Protoss patterns, and its Protoss strategy type); each count is then
+    estimated as `scale` times the mean weight per draw.
+    """
+
+    def __init__(self, sampling: str) -> None:
+        self.sampling = sampling
+        self.draws = 0
+        self.total = _Cell()
+        self.protoss = _Cell()
+        self.strategies: Dict[str, _Cell] = {}
+
+    def add(self, contribution: Optional[Contribution], weight: float = 1.0) -> None:
+        """Record a draw; None for one that hit no pattern (a blank line)."""
+        self.draws += 1
+        if contribution is None:
+            return
+        self.total.add(weight)
+        race, strategy_type = contribution
+        if race == "Protoss":
+            self.protoss.add(weight)
+            cell = self.strategies.get(strategy_type)
+            if cell is None:
+                cell = self.strategies[strategy_type] = _Cell()
+            cell.add(weight)
+
+    def estimate(self, cell: _Cell, scale: float, correction: float) -> Tuple[int, List[int]]:
+        """
+        Estimated count and its confidence interval. `correction` scales
+        the variance (finite population correction).
+        """
+        n = self.draws
+        mean = cell.sum / n
+        variance = max(0.0, cell.squares / n - mean * mean) / max(1, n - 1)
+        error = CONFIDENCE_Z * scale * math.sqrt(variance * correction)
+        estimate = scale * mean
+        return round(estimate), [max(0, math.floor(estimate - error)), math.ceil(estimate + error)]
+
+    def to_dict(self, scale: float = 1.0, correction: float = 1.0, **details) -> dict:
+        """
+        The approximate counterpart of SummaryAccumulator.protoss_dict():
+        the same keys with estimated counts, plus the intervals.
+        """
+        total, _interval = self.estimate(self.total, scale, correction)
+        protoss, protoss_interval = self.estimate(self.protoss, scale, correction)
+        breakdown, intervals = {}, {}
+        for strategy_type, cell in sorted(self.strategies.items()):
+            breakdown[strategy_type], intervals[strategy_type] = self.estimate(cell, scale, correction)
+        return {
+            "approximate": True,
+            "sampling": self.sampling,
+            "sample_size": self.draws,
+            **details,
+            "confidence_level": CONFIDENCE_LEVEL,
+            "total_patterns_in_dataset": total,
+            "protoss_pattern_count": protoss,
+            "protoss_strategy_breakdown": breakdown,
+            "confidence_intervals": {
+                "protoss_pattern_count": protoss_interval,
+                "protoss_strategy_breakdown": intervals,
+            },
+        }
+
+
+def _sample_lines(paths: List[Path], deadline: float, max_samples: int, seed) -> Optional[dict]:
+    total_bytes = sum(path.stat().st_size for path in paths)
+    sample = BreakdownSample("byte_offsets")
+    for length, pattern in iter_random_lines(paths, CONTRIBUTION_FIELDS, seed):
+        sample.add(None if pattern is None else pattern_contribution(pattern[1]), total_bytes / length)
+        if sample.draws >= max_samples or (
+            sample.draws % _CHECK_EVERY == 0 and time.perf_counter() >= deadline
+        ):
+            break
+    if not sample.draws:
+        return None
+    return sample.to_dict()
+
+
+def _sample_prefix(paths: List[Path], deadline: float, max_samples: int) -> Optional[dict]:
+    sample = BreakdownSample("prefix")
+    cursor = DatasetCursor(paths, CONTRIBUTION_FIELDS)
+    patterns = iter(cursor)
+    finished = True
+    for _pattern_id, entry in patterns:
+        sample.add(pattern_contribution(entry))
+        if sample.draws >= max_samples or (
+            sample.draws % _CHECK_EVERY == 0 and time.perf_counter() >= deadline
+        ):
+            finished = False
+            break
+    patterns.close()
+    if finished or not sample.draws:
+        # The exact pass that follows is no slower than publishing this.
+        return None
+    fraction = cursor.bytes_read() / sum(cursor.sizes)
+    return sample.to_dict(
+        scale=sample.draws / fraction,
+        correction=1 - fraction,
+        sampled_fraction=round(fraction, 6),
+    )
+
+
+def preview_breakdown(
+    paths: List[Path],
+    seconds: float,
+    max_samples: int = 1_000_000,
+    seed=None,
+) -> Optional[dict]:
+    """
+    Sample the pattern files `paths` for about `seconds` (or
+    `max_samples` patterns) and return the approximate Protoss summary
+    document, or None when there is nothing to preview: no patterns, or
+    files read completely within the budget.
+
+    Byte offsets are sampled if every file is JSON Lines (see
+    reader.is_json_lines()), the prefix otherwise.
+    """
+    deadline = time.perf_counter() + seconds
+    if all(is_json_lines(path) for path in paths):
+        return _sample_lines(paths, deadline, max_samples, seed)
+    return _sample_prefix(paths, deadline, max_samples)
@@ -0,0 +1,62 @@
+"""
+Publishing of summary documents into the datasite's public folder.
+
+Files under public/ are picked up by SyftBox sync as soon as they
+change, so publishing has to be careful:
+  - Atomic: the document is fully written (and fsync'ed) to a temporary
+    file OUTSIDE public/, then renamed over the published file. Sync can
+    never observe a half-written summary, and the temporary file itself
+    is never synced.
+  - Change-aware: if the encoded document is byte-for-byte identical to
+    what is already published, the file is left alone, so its mtime does
+    not change and no pointless re-upload is triggered.
+  - Optionally compact: no indentation or spaces, for large breakdowns.
+"""
+
+from pathlib import Path
+import json
+import os
+import tempfile
+
+
+def encode_document(document, compact: bool = False) -> bytes:
+    """Encode a summary document exactly as it will be published."""
+    if compact:
+        text = json.dumps(document, separators=(",", ":"))
+    else:
+        text = json.dumps(document, indent=2)
+    return text.encode("utf-8")
+
+
+def publish_json(path: Path, document, tmp_dir: Path, compact: bool = False) -> bool:
+    """
+    Atomically publish `document` as JSON at `path`.
+
+    `tmp_dir` must be a private folder on the same filesystem as `path`
+    (the rename is only atomic within one filesystem). Returns True if
+    the published file changed, False if it already had this content.
+    """
+    data = encode_document(document, compact)
+
+    try:
+        if path.stat().st_size == len(data) and path.read_bytes() == data:
+            return False
+    except OSError:
+        pass  # not published yet
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(prefix=path.name + ".", suffix=".tmp", dir=tmp_dir)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        # mkstemp creates owner-only files; published files are readable
+        # like any other file the app writes.
+        os.chmod(tmp_name, 0o644)
+        os.replace(tmp_name, path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+    return True
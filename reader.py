@@ -0,0 +1,841 @@
+"""
+Incremental reader for the patterns.json dataset.
+
+patterns.json is a single JSON object mapping pattern IDs to pattern
+entries. Loading it with json.load() materializes EVERY entry (build
+steps, signatures and all) before the app can look at a single one,
+which does not fit in memory for multi-GB datasets.
+
+This module walks the top-level object one entry at a time instead:
+the file is read in fixed-size chunks, each pattern entry is decoded
+on its own, handed to the caller and then dropped. Peak memory is
+bounded by the largest single entry rather than by the whole file.
+
+Patterns may also be stored as JSON Lines (patterns.jsonl, or shard
+files): one pattern object per line with its ID inline. Every line
+stands on its own, so such a file can be cut into byte ranges and
+parsed by several workers at once (see shards.py); convert.py turns
+an existing patterns.json into that layout.
+
+Dataset files can be read through a read-only memory map (MMAP_READS):
+the parser then decodes its text window straight from the OS page
+cache, so there is no second copy of the file in a read buffer, and
+concurrent app instances (or the shard workers) reading the same file
+share its cached pages instead of each holding their own. It is off by
+default, because the dataset is written by others (see MMAP_READS).
+
+Callers that only need a few fields of each pattern (the summaries only
+read "race" and "strategy_type") can pass them as `fields`. JSON Lines
+records are then projected straight from the line text: top-level
+members are matched with one regular expression each, only the wanted
+values are decoded, and reading stops as soon as all of them were found,
+so the signature, build steps etc. are never turned into Python objects
+(unless an accelerated JSON backend decodes whole lines even faster).
+In the patterns.json layout, the end of an entry can only be found by
+parsing it, and the C decoder does that faster than any pure-Python
+skipper could; there, entries are decoded and projected right away.
+
+Both layouts can tell where in the file reading is: PatternCursor walks
+a pattern file of either layout, reports its byte offset and can resume
+from one (see checkpoint.py), DatasetCursor does the same across several
+files, and iter_random_lines() draws JSON Lines records at random byte
+offsets (see preview.py).
+"""
+
+from bisect import bisect_right
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+from typing import FrozenSet, Iterable, Iterator, List, Optional, Tuple
+import codecs
+import json
+import mmap
+import random
+import re
+
+from decoder import json_backend, loads
+
+# Number of characters pulled from the file per read. Large enough to
+# amortize read overhead, small enough to keep memory flat.
+CHUNK_SIZE = 1 << 20
+
+# One shared decoder; raw_decode() parses a single JSON value starting
+# at a given offset and reports where that value ended.
+_DECODER = json.JSONDecoder()
+
+# Field holding the pattern ID in line-oriented (JSON Lines) pattern
+# files, where there is no surrounding object to key entries by.
+PATTERN_ID_FIELD = "pattern_id"
+
+# Folder (inside the dataset folder) holding a sharded patterns dataset,
+# and the shard file suffixes recognized in it:
+#   patterns/part-0000.json   - same layout as patterns.json
+#   patterns/part-0001.jsonl  - JSON Lines, one pattern per line
+SHARD_DIR_NAME = "patterns"
+SHARD_SUFFIXES = (".json", ".jsonl")
+
+# How much of a pattern file is looked at to tell JSON Lines from the
+# patterns.json object layout (see is_json_lines()).
+_SNIFF_SIZE = 64 * 1024
+
+# When True, dataset files are memory-mapped instead of read through
+# buffered file objects (see map_file()). Files that cannot be mapped,
+# e.g. empty ones, are read the buffered way regardless.
+# Only turn this on if nothing truncates or rewrites the dataset files in
+# place while the app runs: touching a mapped page past the new end of
+# the file raises SIGBUS, which kills the process (a daemon included)
+# instead of failing the run. Sync clients writing to the dataset folder
+# can do exactly that. The app's own private caches are still mapped
+# (see columns.py); only the app writes those, and never in place.
+MMAP_READS = False
+
+# A decode error this close to the end of the read text may just mean
+# the value is cut off there (e.g. "tru" of "true", or half a \uXXXX
+# escape pair), so more text is read before giving up (see
+# _ChunkBuffer.decode()).
+_CUT_OFF_MARGIN = 16
+
+# JSON insignificant whitespace (RFC 8259, section 2).
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+# Building blocks for projecting JSON Lines records (see _project_record()).
+_WS = r"[ \t\n\r]*"
+_STRING = r'"[^"\\]*(?:\\.[^"\\]*)*"'
+_SCALAR = _STRING + r"|null|true|false|-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][-+]?[0-9]+)?"
+_RECORD_START = re.compile(_WS + r"\{")
+_RECORD_EMPTY = re.compile(_WS + r"\}")
+# A whole member with a scalar value, and the separator after it.
+_SCALAR_MEMBER = re.compile(
+    _WS + "(" + _STRING + ")" + _WS + ":" + _WS + "(" + _SCALAR + ")" + _WS + "([,}])"
+)
+# The key of a member whose value is an object or array.
+_MEMBER_KEY = re.compile(_WS + "(" + _STRING + ")" + _WS + ":" + _WS)
+_MEMBER_END = re.compile(_WS + "([,}])")
+
+Fields = Optional[Iterable[str]]
+
+
+@contextmanager
+def map_file(path: Path) -> Iterator[Optional[mmap.mmap]]:
+    """
+    Map `path` read-only for the duration of the block.
+
+    Yields None instead when MMAP_READS is off or the file cannot be
+    mapped (empty files, some special filesystems); callers then fall
+    back to ordinary reads.
+    """
+    with path.open("rb") as f:
+        mm = None
+        if MMAP_READS:
+            try:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError):
+                pass
+        if mm is None:
+            yield None
+            return
+        try:
+            if hasattr(mm, "madvise"):
+                # Every reader here makes one front-to-back pass.
+                mm.madvise(mmap.MADV_SEQUENTIAL)
+            yield mm
+        finally:
+            mm.close()
+
+
+class _MappedWindow:
+    """
+    Releases the already-read prefix of a memory map as reading moves on.
+
+    Mapped pages a process has touched count toward its RSS even though
+    they belong to the shared page cache. Dropping them from the mapping
+    (the cache keeps them) keeps RSS at a sliding window instead of
+    growing to the size of the file.
+    """
+
+    # Release in steps of this many bytes (a multiple of every page size).
+    STEP = 4 << 20
+
+    def __init__(self, mm: mmap.mmap) -> None:
+        self.mm = mm
+        self._released = 0
+
+    def consumed(self, offset: int) -> None:
+        """Everything before `offset` will not be read again."""
+        if offset - self._released < self.STEP or not hasattr(mmap, "MADV_DONTNEED"):
+            return
+        upto = offset - offset % self.STEP
+        self.mm.madvise(mmap.MADV_DONTNEED, self._released, upto - self._released)
+        self._released = upto
+
+
+class _MappedText:
+    """
+    Minimal text-file stand-in over a memory map, for _ChunkBuffer.
+
+    read(n) decodes the next `n` bytes straight from the mapping. UTF-8
+    sequences cut at a chunk edge are completed by the next read.
+    """
+
+    def __init__(self, mm: mmap.mmap, start: int = 0) -> None:
+        self._mm = mm
+        self._window = _MappedWindow(mm)
+        self._pos = start
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+
+    def read(self, size: int) -> str:
+        # _ChunkBuffer keeps the unconsumed text it already holds, so
+        # the bytes before this read are never needed again.
+        self._window.consumed(self._pos)
+        while True:
+            end = min(self._pos + size, len(self._mm))
+            with memoryview(self._mm) as view, view[self._pos:end] as chunk:
+                text = self._decoder.decode(chunk, final=end == len(self._mm))
+            self._pos = end
+            # Only a split multi-byte character can decode to nothing.
+            if text or end == len(self._mm):
+                return text
+
+    def tell(self) -> int:
+        """Byte offset of the end of the text read so far."""
+        return self._pos - len(self._decoder.getstate()[0])
+
+
+class _DecodedFile:
+    """_MappedText over a file object, for files that are not mapped."""
+
+    def __init__(self, f, start: int = 0) -> None:
+        self._f = f
+        self._f.seek(start)
+        self._pos = start
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+
+    def read(self, size: int) -> str:
+        while True:
+            chunk = self._f.read(size)
+            self._pos += len(chunk)
+            text = self._decoder.decode(chunk, final=not chunk)
+            if text or not chunk:
+                return text
+
+    def tell(self) -> int:
+        """Byte offset of the end of the text read so far."""
+        return self._pos - len(self._decoder.getstate()[0])
+
+
+def iter_file_chunks(path: Path, chunk_size: int) -> Iterator[memoryview]:
+    """
+    Yield the bytes of `path` in chunks of `chunk_size`, mapped if
+    possible. Each chunk is only valid until the next one is requested.
+    """
+    with map_file(path) as mm:
+        if mm is not None:
+            window = _MappedWindow(mm)
+            with memoryview(mm) as view:
+                for offset in range(0, len(mm), chunk_size):
+                    with view[offset:offset + chunk_size] as chunk:
+                        yield chunk
+                    window.consumed(offset + chunk_size)
+            return
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            yield memoryview(chunk)
+
+
+@contextmanager
+def _open_text(path: Path, start: int = 0) -> Iterator:
+    """
+    Open `path` as UTF-8 text for _ChunkBuffer, mapped if possible,
+    starting at byte offset `start` (which must not split a character).
+    """
+    with map_file(path) as mm:
+        if mm is not None:
+            yield _MappedText(mm, start)
+            return
+    with path.open("rb") as f:
+        yield _DecodedFile(f, start)
+
+
+def _iter_lines(path: Path, start: int, end: Optional[int]) -> Iterator[Tuple[int, bytes]]:
+    """
+    Yield (offset, line) for the lines of `path` that begin in the byte
+    range [start, end); see iter_pattern_lines().
+    """
+    with map_file(path) as mm:
+        if mm is not None:
+            window = _MappedWindow(mm)
+            size = len(mm)
+            limit = size if end is None else min(end, size)
+            offset = start
+            if start > 0:
+                # A range that starts mid-line skips the rest of that
+                # line; the worker of the previous range reads it.
+                newline = mm.find(b"\n", start - 1)
+                offset = size if newline < 0 else newline + 1
+            while offset < limit:
+                newline = mm.find(b"\n", offset)
+                line_end = size if newline < 0 else newline + 1
+                yield offset, mm[offset:line_end]
+                offset = line_end
+                window.consumed(offset)
+            return
+
+    with path.open("rb") as f:
+        if start > 0:
+            f.seek(start - 1)
+            f.readline()
+        offset = f.tell()
+        while end is None or offset < end:
+            line = f.readline()
+            if not line:
+                break
+            yield offset, line
+            offset += len(line)
+
+
+class _ChunkBuffer:
+    """
+    A sliding window of decoded text over an open file.
+
+    `text[pos:]` is the part of the file that has been read but not yet
+    consumed. Whenever a value is cut off at the end of the window, more
+    text is appended and the consumed prefix is dropped.
+    """
+
+    def __init__(self, f, chunk_size: int) -> None:
+        self.f = f
+        self.chunk_size = chunk_size
+        self.text = ""
+        self.pos = 0
+        self.start = 0
+        self.eof = False
+
+    def fill(self) -> bool:
+        """
+        Read more text into the window. Returns False at end of file.
+
+        The read size grows with the unconsumed text, so an entry much
+        larger than CHUNK_SIZE is re-parsed a logarithmic number of
+        times instead of once per chunk.
+        """
+        if self.eof:
+            return False
+        chunk = self.f.read(max(self.chunk_size, len(self.text) - self.pos))
+        if not chunk:
+            self.eof = True
+            return False
+        self.text = self.text[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Skip whitespace and return the next character ("" at EOF)."""
+        while True:
+            self.pos = _WHITESPACE.match(self.text, self.pos).end()
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, char: str) -> None:
+        """Consume `char` or raise the same error json.load() would."""
+        if self.peek() != char:
+            raise json.JSONDecodeError(f"Expecting '{char}'", self.text, self.pos)
+        self.pos += 1
+
+    def decode(self):
+        """
+        Decode the next JSON value, reading more text if it is cut off.
+
+        Afterwards `text[start:pos]` is the raw JSON text of that value.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError as exc:
+                # Anything else is a syntax error, raised right away
+                # instead of after reading the rest of the file.
+                if self._cut_off(exc) and self.fill():
+                    continue
+                raise
+            # A value ending exactly at the window edge may be a truncated
+            # number ("12" of "123"), so only trust it once more text (or
+            # EOF) confirms where it stops.
+            if end == len(self.text) and self.fill():
+                continue
+            self.start, self.pos = self.pos, end
+            return value
+
+    def _cut_off(self, exc: json.JSONDecodeError) -> bool:
+        """Whether `exc` may only mean the value is cut off at the window edge."""
+        # An unterminated string is reported where it starts, however
+        # far that is from the end it ran into.
+        return (
+            exc.msg.startswith("Unterminated string")
+            or exc.pos >= len(self.text) - _CUT_OFF_MARGIN
+        )
+
+    def byte_offset(self) -> int:
+        """
+        Byte offset in the file of `text[pos]`. Costs an encode of the
+        unconsumed text, so call it now and then, not per entry.
+        """
+        return self.f.tell() - len(self.text[self.pos:].encode("utf-8"))
+
+
+def _iter_entries(path: Path, chunk_size: int, with_raw: bool, allow_array: bool = False) -> Iterator[tuple]:
+    """
+    Walk the top-level object of `path`; see iter_patterns().
+
+    With `allow_array`, a top-level array is accepted too and its items
+    are yielded with their index in place of the key.
+    """
+    with _open_text(path) as f:
+        yield from _walk_entries(_ChunkBuffer(f, chunk_size), with_raw, allow_array)
+
+
+def _walk_entries(
+    buf: _ChunkBuffer, with_raw: bool, allow_array: bool = False, resume: bool = False
+) -> Iterator[tuple]:
+    """
+    The items of the top-level object (or array) read through `buf`.
+
+    With `resume`, `buf` starts right after an item of an object (where
+    PatternCursor.offset() points), and walking continues from there.
+    """
+    if resume:
+        is_array, closing = False, "}"
+        if not _next_item(buf, closing):
+            return
+    else:
+        is_array = allow_array and buf.peek() == "["
+        buf.expect("[" if is_array else "{")
+        closing = "]" if is_array else "}"
+        if buf.peek() == closing:
+            return
+
+    index = 0
+    while True:
+        if is_array:
+            key = index
+            index += 1
+        else:
+            key = buf.decode()
+            if not isinstance(key, str):
+                raise json.JSONDecodeError(
+                    "Expecting property name enclosed in double quotes",
+                    buf.text,
+                    buf.pos,
+                )
+            buf.expect(":")
+        value = buf.decode()
+        if with_raw:
+            yield key, value, buf.text[buf.start:buf.pos]
+        else:
+            yield key, value
+        if not _next_item(buf, closing):
+            return
+
+
+def _next_item(buf: _ChunkBuffer, closing: str) -> bool:
+    """Consume the separator after an item; False at the closing bracket."""
+    separator = buf.peek()
+    if separator == closing:
+        return False
+    if separator != ",":
+        raise json.JSONDecodeError("Expecting ',' delimiter", buf.text, buf.pos)
+    buf.pos += 1
+    return True
+
+
+def _projected(entry, fields: FrozenSet[str]):
+    """Only the `fields` of a decoded entry."""
+    if not isinstance(entry, dict):
+        return entry
+    return {key: value for key, value in entry.items() if key in fields}
+
+
+def _member_key(raw: str) -> str:
+    """Decode a member key matched by _STRING (quotes included)."""
+    return raw[1:-1] if "\\" not in raw else json.loads(raw)
+
+
+def _project_record(text: str, fields: FrozenSet[str]) -> Optional[dict]:
+    """
+    Pick `fields` out of the JSON object in `text` without decoding the
+    rest of it.
+
+    Scalar members are matched whole by one regular expression; object
+    and array values are only decoded (by the C scanner) when they come
+    before all wanted fields were found. Returns None when the text is
+    not a well-formed object as far as it was read; the caller then
+    decodes it normally, which raises the usual error. Members after the
+    last wanted field are not read at all, so a record is not validated
+    beyond that point.
+    """
+    match = _RECORD_START.match(text)
+    if match is None:
+        return None
+    pos = match.end()
+    if _RECORD_EMPTY.match(text, pos):
+        return {}
+
+    scan = _DECODER.scan_once
+    found = {}
+    try:
+        while True:
+            match = _SCALAR_MEMBER.match(text, pos)
+            if match is not None:
+                key = _member_key(match.group(1))
+                if key in fields:
+                    found[key] = scan(text, match.start(2))[0]
+                    if len(found) == len(fields):
+                        return found
+                if match.group(3) == "}":
+                    return found
+                pos = match.end()
+                continue
+
+            match = _MEMBER_KEY.match(text, pos)
+            if match is None:
+                return None
+            key = _member_key(match.group(1))
+            value, pos = scan(text, match.end())
+            if key in fields:
+                found[key] = value
+                if len(found) == len(fields):
+                    return found
+            match = _MEMBER_END.match(text, pos)
+            if match is None:
+                return None
+            if match.group(1) == "}":
+                return found
+            pos = match.end()
+    except (StopIteration, ValueError):
+        return None
+
+
+def iter_patterns(
+    path: Path, chunk_size: int = CHUNK_SIZE, fields: Fields = None
+) -> Iterator[Tuple[str, dict]]:
+    """
+    Yield (pattern_id, entry) pairs from patterns.json one at a time.
+
+    Only the current entry is held in memory; callers should pull out the
+    fields they need and let the entry go before asking for the next one.
+    With `fields`, entries only hold those fields.
+    """
+    entries = _iter_entries(path, chunk_size, with_raw=False)
+    if fields is None:
+        return entries
+    fields = frozenset(fields)
+    return ((pattern_id, _projected(entry, fields)) for pattern_id, entry in entries)
+
+
+def iter_pattern_spans(
+    path: Path, chunk_size: int = CHUNK_SIZE
+) -> Iterator[Tuple[str, dict, str]]:
+    """
+    Like iter_patterns(), but also yield each entry's raw JSON text.
+
+    The raw text lets callers fingerprint an entry exactly as it is
+    stored, e.g. to detect which patterns changed since the last run.
+    """
+    return _iter_entries(path, chunk_size, with_raw=True)
+
+
+class PatternCursor:
+    """
+    iter_pattern_file() that can also tell how far into the file it is.
+
+    Iterating yields (pattern_id, entry) pairs; meanwhile, offset() is
+    the byte offset just past the last entry yielded. A cursor created
+    with such an offset as `start` yields the entries after it.
+    """
+
+    def __init__(
+        self, path: Path, fields: Fields = None, start: int = 0, chunk_size: int = CHUNK_SIZE
+    ) -> None:
+        self.path = path
+        self.fields = None if fields is None else frozenset(fields)
+        self.start = start
+        self.chunk_size = chunk_size
+        self.json_lines = is_json_lines(path)
+        self._buf: Optional[_ChunkBuffer] = None
+        self._offset = start
+
+    def __iter__(self) -> Iterator[Tuple[str, dict]]:
+        if self.json_lines:
+            decode = _line_decoder(self.path, self.fields)
+            for line_offset, line in _iter_lines(self.path, self.start, None):
+                self._offset = line_offset + len(line)
+                if line.strip():
+                    yield decode(line_offset, line)
+            return
+
+        with _open_text(self.path, self.start) as f:
+            self._buf = _ChunkBuffer(f, self.chunk_size)
+            entries = _walk_entries(self._buf, with_raw=False, resume=self.start > 0)
+            try:
+                for pattern_id, entry in entries:
+                    if self.fields is not None:
+                        entry = _projected(entry, self.fields)
+                    yield pattern_id, entry
+            finally:
+                self._offset = self.offset()
+                self._buf = None
+
+    def offset(self) -> int:
+        """Bytes of the file consumed so far."""
+        if self._buf is None:
+            return self._offset
+        return self._buf.byte_offset()
+
+
+class DatasetCursor:
+    """
+    PatternCursor over several pattern files in turn.
+
+    position() is (index of the current file, offset in it) just past the
+    last entry yielded; a cursor created with such a position as `start`
+    yields the entries after it.
+    """
+
+    def __init__(self, paths: List[Path], fields: Fields = None, start: Tuple[int, int] = (0, 0)) -> None:
+        self.paths = paths
+        self.fields = fields
+        self.start = tuple(start)
+        self.sizes = [path.stat().st_size for path in paths]
+        self._index, offset = self.start
+        self._cursor: Optional[PatternCursor] = None
+        self._offset = offset
+
+    def __iter__(self) -> Iterator[Tuple[str, dict]]:
+        first, offset = self.start
+        for self._index in range(first, len(self.paths)):
+            self._cursor = PatternCursor(self.paths[self._index], self.fields, offset)
+            yield from self._cursor
+            offset = 0
+
+    def position(self) -> Tuple[int, int]:
+        if self._cursor is None:
+            return self._index, self._offset
+        return self._index, self._cursor.offset()
+
+    def bytes_read(self) -> int:
+        """Bytes of all files consumed so far (earlier files in full)."""
+        index, offset = self.position()
+        return sum(self.sizes[:index]) + offset
+
+
+def iter_json_items(path: Path, chunk_size: int = CHUNK_SIZE) -> Iterator[tuple]:
+    """
+    Stream the items of ANY top-level JSON object or array.
+
+    Yields (key, value) for objects and (index, value) for arrays, one
+    item at a time, for dataset files whose layout is less fixed than
+    patterns.json's.
+    """
+    return _iter_entries(path, chunk_size, with_raw=False, allow_array=True)
+
+
+def iter_pattern_lines(
+    path: Path, start: int = 0, end: Optional[int] = None, fields: Fields = None
+) -> Iterator[Tuple[str, dict]]:
+    """
+    Yield (pattern_id, entry) pairs from a JSON Lines pattern file.
+
+    Each non-blank line is one pattern object carrying its own ID in
+    PATTERN_ID_FIELD; the ID is removed from the yielded entry so it
+    looks exactly like an entry of patterns.json.
+
+    With `start`/`end`, only the lines that BEGIN in that byte range are
+    read, so split_line_ranges() can hand disjoint parts of one file to
+    parallel workers without any line being read twice or missed.
+
+    With `fields`, entries only hold those fields, and the rest of each
+    line is skipped instead of decoded (see _project_record()). With an
+    accelerated JSON backend, decoding the whole line natively is about
+    as fast, so lines are decoded and then projected instead.
+    """
+    decode = _line_decoder(path, fields)
+    for line_offset, line in _iter_lines(path, start, end):
+        if line.strip():
+            yield decode(line_offset, line)
+
+
+def _line_decoder(path: Path, fields: Fields):
+    """
+    Function decoding one non-blank line of `path` (given with its
+    offset, for error messages) into (pattern_id, entry); see
+    iter_pattern_lines().
+    """
+    wanted = None if fields is None else frozenset(fields) | {PATTERN_ID_FIELD}
+    skip_unwanted = wanted is not None and json_backend() == "json"
+
+    def decode(line_offset: int, line: bytes) -> Tuple[str, dict]:
+        entry = None
+        if skip_unwanted:
+            entry = _project_record(line.decode("utf-8"), wanted)
+        if entry is None:
+            entry = loads(line)
+            if wanted is not None:
+                entry = _projected(entry, wanted)
+        pattern_id = entry.pop(PATTERN_ID_FIELD, None) if isinstance(entry, dict) else None
+        if not isinstance(pattern_id, str):
+            raise ValueError(
+                f"{path} (line at byte {line_offset}): "
+                f"expected an object with a string {PATTERN_ID_FIELD!r}"
+            )
+        return pattern_id, entry
+
+    return decode
+
+
+def iter_random_lines(
+    paths: List[Path], fields: Fields = None, seed=None
+) -> Iterator[Tuple[int, Optional[Tuple[str, dict]]]]:
+    """
+    Endlessly draw lines of JSON Lines pattern files at random.
+
+    Each draw picks a uniformly random byte of all the files together and
+    yields the line holding it: the length of that line in bytes, and its
+    (pattern_id, entry), or None for a blank line. A line is drawn with
+    probability proportional to its length, which callers weigh out (see
+    preview.py). Lines are drawn with replacement.
+
+    Yields nothing if all files are empty. Raises ValueError if a file
+    is cut short while it is sampled.
+    """
+    rng = random.Random(seed)
+    with ExitStack() as stack:
+        files, sizes, decoders, ends = [], [], [], []
+        total = 0
+        for path in paths:
+            size = path.stat().st_size
+            if size == 0:
+                continue
+            files.append(stack.enter_context(_open_random(path)))
+            sizes.append(size)
+            decoders.append(_line_decoder(path, fields))
+            total += size
+            ends.append(total)
+        if not total:
+            return
+
+        while True:
+            offset = rng.randrange(total)
+            i = bisect_right(ends, offset)
+            start, line = _line_at(files[i], offset - (ends[i] - sizes[i]))
+            if not line:
+                raise ValueError(f"{paths[i]} changed while it was sampled")
+            yield len(line), decoders[i](start, line) if line.strip() else None
+
+
+@contextmanager
+def _open_random(path: Path) -> Iterator:
+    """Open `path` for reads at random offsets (see _line_at())."""
+    with map_file(path) as mm:
+        if mm is not None:
+            if hasattr(mm, "madvise"):
+                # Undo map_file()'s read-ahead hint; draws jump around.
+                mm.madvise(mmap.MADV_RANDOM)
+            yield mm
+            return
+    with path.open("rb") as f:
+        yield f
+
+
+def _line_at(f, offset: int) -> Tuple[int, bytes]:
+    """
+    The line of a binary file (or memory map) that holds byte `offset`,
+    and the offset it starts at. The start is found by reading backwards
+    in growing steps, so a draw costs about one read for typical lines.
+    """
+    start = 0
+    end = offset
+    step = 4096
+    while end > 0:
+        block_start = max(0, end - step)
+        f.seek(block_start)
+        newline = f.read(end - block_start).rfind(b"\n")
+        if newline >= 0:
+            start = block_start + newline + 1
+            break
+        end = block_start
+        step *= 2
+    f.seek(start)
+    return start, f.readline()
+
+
+def split_line_ranges(path: Path, parts: int) -> List[Tuple[int, int]]:
+    """
+    Split `path` into up to `parts` byte ranges of about equal size for
+    iter_pattern_lines(). Ranges need not fall on line boundaries.
+    """
+    size = path.stat().st_size
+    parts = max(1, min(parts, size))
+    bounds = [size * i // parts for i in range(parts + 1)]
+    return list(zip(bounds, bounds[1:]))
+
+
+def is_json_lines(path: Path) -> bool:
+    """
+    Tell whether a pattern file is JSON Lines rather than one object.
+
+    A .jsonl suffix decides right away. Otherwise the file is JSON Lines
+    if its first line on its own is a complete pattern object with a
+    string PATTERN_ID_FIELD (in patterns.json, the first line is at most
+    an opening brace, or the whole object keyed by IDs).
+    """
+    if path.suffix == ".jsonl":
+        return True
+    with path.open("rb") as f:
+        head = f.read(_SNIFF_SIZE)
+    first_line = head.split(b"\n", 1)[0].strip()
+    if not first_line.startswith(b"{"):
+        return False
+    try:
+        first = loads(first_line)
+    except ValueError:
+        return False
+    return isinstance(first.get(PATTERN_ID_FIELD), str)
+
+
+def find_patterns_file(dataset_root: Path) -> Path:
+    """
+    Return the single-file patterns dataset: patterns.jsonl if it exists,
+    otherwise patterns.json (which may not exist either).
+    """
+    jsonl_path = dataset_root / "patterns.jsonl"
+    return jsonl_path if jsonl_path.is_file() else dataset_root / "patterns.json"
+
+
+def find_pattern_shards(dataset_root: Path) -> Optional[List[Path]]:
+    """
+    Return the shard files of a sharded patterns dataset, in name order,
+    or None if `dataset_root` has no (non-empty) shard folder.
+    """
+    shard_dir = dataset_root / SHARD_DIR_NAME
+    if not shard_dir.is_dir():
+        return None
+    shards = sorted(
+        path for path in shard_dir.iterdir()
+        if path.is_file() and path.suffix in SHARD_SUFFIXES
+    )
+    return shards or None
+
+
+def iter_pattern_file(path: Path, fields: Fields = None) -> Iterator[Tuple[str, dict]]:
+    """Yield (pattern_id, entry) pairs from a pattern file of either layout."""
+    if is_json_lines(path):
+        return iter_pattern_lines(path, fields=fields)
+    return iter_patterns(path, fields=fields)
+
+
+def iter_dataset_patterns(
+    paths: Iterable[Path], fields: Fields = None
+) -> Iterator[Tuple[str, dict]]:
+    """Yield (pattern_id, entry) pairs from several pattern files in turn."""
+    for path in paths:
+        yield from iter_pattern_file(path, fields)
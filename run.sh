@@ -14,6 +14,6 @@ else
     exit 1
 fi
 
-# Execute the app
-"$PYTHON_BIN" main.py
+# Execute the app (extra arguments, e.g. --daemon, are passed through)
+"$PYTHON_BIN" main.py "$@"
 
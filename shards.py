@@ -0,0 +1,191 @@
+"""
+Parallel aggregation of a sharded patterns dataset.
+
+Instead of one monolithic patterns.json, the dataset folder may hold a
+folder of shard files (see reader.find_pattern_shards):
+
+  semi-public/team-project/patterns/part-0000.json
+  semi-public/team-project/patterns/part-0001.jsonl
+  ...
+
+Each shard is aggregated on its own in a process pool into a partial
+SummaryAccumulator, and the partials are merged, so throughput scales
+with the cores of the datasite owner's machine. A single patterns.jsonl
+is handled as a dataset of one shard.
+
+Large JSON Lines shards are additionally cut into byte ranges that are
+parsed by different workers (see reader.split_line_ranges()), so even
+one big file keeps every core busy.
+
+Partial summaries are remembered per shard (keyed by the shard's content
+hash) in the PRIVATE state folder. Editing one shard rewrites only that
+file, so on the next run only that shard is re-aggregated and all other
+partials are reused.
+
+The same partials let a run with a time budget (see checkpoint.py) stop
+early: at the deadline, work units that have not started yet are
+dropped, and the partials of the shards completed so far are saved for
+the next run to reuse.
+"""
+
+from concurrent.futures import ProcessPoolExecutor, TimeoutError, as_completed
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+import os
+
+from breakdown import PairCounter
+from checkpoint import Budget
+from reader import Fields, is_json_lines, iter_pattern_file, iter_pattern_lines, split_line_ranges
+from state import STATE_VERSION, content_hash, read_json_object, write_json_atomic
+from summary import CONTRIBUTION_FIELDS, SummaryAccumulator
+
+# JSON Lines shards are only split into byte ranges of at least this
+# size; below it, starting another worker costs more than it saves.
+MIN_RANGE_BYTES = 16 << 20
+
+# (path, start, end) byte range of a JSON Lines shard, or (path, 0, None)
+# for a whole shard of either layout.
+WorkUnit = Tuple[Path, int, Optional[int]]
+
+
+def aggregate_shard(
+    path: Path,
+    start: int = 0,
+    end: Optional[int] = None,
+    fields: Fields = CONTRIBUTION_FIELDS,
+) -> SummaryAccumulator:
+    """
+    Aggregate one shard file, or one byte range of a JSON Lines shard
+    (runs in a pool worker). Only `fields` of each pattern are read.
+
+    The breakdown is counted with the vectorized engine of breakdown.py,
+    which holds two bytes or so per pattern until the end of the unit.
+    """
+    counter = PairCounter()
+    if start or end is not None:
+        entries = iter_pattern_lines(path, start, end, fields=fields)
+    else:
+        entries = iter_pattern_file(path, fields=fields)
+    for _pattern_id, entry in entries:
+        counter.add(entry)
+    return counter.accumulate()
+
+
+def _work_units(paths: List[Path], workers: int) -> List[WorkUnit]:
+    """Split the shards to aggregate into units for the pool."""
+    units = []
+    for path in paths:
+        parts = min(workers, path.stat().st_size // MIN_RANGE_BYTES)
+        if parts > 1 and is_json_lines(path):
+            units.extend((path, start, end) for start, end in split_line_ranges(path, parts))
+        else:
+            units.append((path, 0, None))
+    return units
+
+
+def aggregate_shards(
+    shards: List[Path],
+    partials_path: Path,
+    shard_hashes: Optional[Dict[str, str]] = None,
+    max_workers: Optional[int] = None,
+    fields: Fields = CONTRIBUTION_FIELDS,
+    budget: Optional[Budget] = None,
+    before_work: Optional[Callable[[List[Path]], None]] = None,
+) -> Tuple[Optional[SummaryAccumulator], dict]:
+    """
+    Aggregate every shard, reusing remembered partials of unchanged ones.
+
+    `shard_hashes` maps shard file names to content hashes when they are
+    already known (e.g. from the input manifest); missing ones are
+    computed here. Only `fields` of each pattern are read; they must
+    cover what pattern_contribution() needs. Returns the merged accumulator and stats: counts of
+    reused and aggregated shards, and the bytes read to aggregate. The partials file is rewritten to cover
+    exactly the current shards.
+
+    With a `budget`, work units still waiting when it runs out (waited
+    for on the wall clock) are dropped; units that are running, and
+    those of the first shard, finish. The accumulator is then None, and
+    the partials file only covers the shards that were completed.
+
+    `before_work`, if given, is called with the shards that need
+    aggregating before any of them is read, and only if there are any
+    (e.g. to publish a preview while they are being aggregated).
+    """
+    hashes = dict(shard_hashes or {})
+    for path in shards:
+        if path.name not in hashes:
+            hashes[path.name] = content_hash(path)
+
+    remembered = read_json_object(partials_path)
+    if remembered.get("version") != STATE_VERSION:
+        remembered = {}
+    remembered_shards = remembered.get("shards", {})
+
+    partials: Dict[str, SummaryAccumulator] = {}
+    todo = []
+    for path in shards:
+        record = remembered_shards.get(path.name)
+        if record is not None and record.get("content_hash") == hashes[path.name]:
+            partials[path.name] = SummaryAccumulator.from_dict(record["summary"])
+        else:
+            todo.append(path)
+
+    if todo and before_work is not None:
+        before_work(todo)
+    units = _work_units(todo, max_workers or os.cpu_count() or 1)
+    dropped = set()
+    if len(units) == 1:
+        # Not worth starting a pool for a single small shard.
+        partials[todo[0].name] = aggregate_shard(*units[0], fields)
+    elif units:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = [pool.submit(aggregate_shard, *unit, fields) for unit in units]
+            # The first shard is always finished, so every run makes
+            # progress no matter how much of the budget is left.
+            for (path, _start, _end), future in zip(units, futures):
+                if path != units[0][0]:
+                    break
+                future.result()
+            try:
+                for future in as_completed(futures, timeout=budget.remaining() if budget else None):
+                    future.result()
+            except TimeoutError:
+                for future in futures:
+                    future.cancel()
+        for (path, _start, _end), future in zip(units, futures):
+            if future.cancelled():
+                dropped.add(path.name)
+            else:
+                partials.setdefault(path.name, SummaryAccumulator()).merge(future.result())
+        for name in dropped:
+            # A partial of some of a shard's byte ranges cannot be reused.
+            partials.pop(name, None)
+
+    merged = None
+    if not dropped:
+        merged = SummaryAccumulator()
+        for path in shards:
+            merged.merge(partials[path.name])
+
+    write_json_atomic(
+        partials_path,
+        {
+            "version": STATE_VERSION,
+            "shards": {
+                path.name: {
+                    "content_hash": hashes[path.name],
+                    "summary": partials[path.name].to_dict(),
+                }
+                for path in shards
+                if path.name in partials
+            },
+        },
+        separators=(",", ":"),
+    )
+    return merged, {
+        "reused": len(shards) - len(todo),
+        "aggregated": len(todo) - len(dropped),
+        "unfinished": len(dropped),
+        "work_units": len(units),
+        "bytes_read": sum(path.stat().st_size for path in todo if path.name not in dropped),
+    }
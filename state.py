@@ -0,0 +1,391 @@
+"""
+Private run state kept between SyftBox runs of the app.
+
+Everything in here lives in the datasite's PRIVATE folder (see STATE_DIR
+in main.py). It contains pattern IDs and fingerprints, so it must never
+be written next to the public summary.
+
+Input manifest
+--------------
+The manifest records the mtime, size and a content hash of every input
+file (patterns.json and the other dataset files) as of the last
+successful run. If every file's stat is identical, the run is skipped
+without reading any file; if only a stat changed (e.g. the file was
+touched or re-synced) but the content hash matches, the run is skipped
+as well and just the stat is refreshed.
+
+A run that stops at its time budget (see checkpoint.py) saves the
+manifest too, marked incomplete: the next run reuses its content hashes
+instead of hashing the inputs again, but never skips because of it.
+
+Incremental state
+-----------------
+The incremental state database (SQLite, from the standard library)
+records, for every pattern ID seen on the last run:
+  - a fingerprint of the entry's raw JSON text
+  - the entry's contribution to the summary (see summary.py)
+
+plus the summary totals themselves. On the next run, entries whose
+fingerprint did not change keep their recorded contribution, and only
+added, removed and modified patterns are applied as deltas to the
+previous totals.
+
+The records stay on disk, keyed by pattern ID: a run looks them up in
+batches as the scan goes and only writes the ones that changed, so
+memory does not grow with the number of patterns. Each run is one
+transaction; a run that fails leaves the previous state as it was.
+Long-running processes (daemon mode) can keep the database open between
+runs, see keep_state_resident().
+"""
+
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+import hashlib
+import json
+import os
+import sqlite3
+
+from decoder import loads
+from reader import iter_file_chunks, iter_pattern_spans
+from summary import SUMMARY_VERSION, SummaryAccumulator, pattern_contribution
+
+# Bytes read per step when hashing a whole file.
+HASH_CHUNK_SIZE = 1 << 20
+
+# Bump whenever the layout of the manifest changes.
+MANIFEST_VERSION = 3
+
+# Bump the first part whenever the layout of the state database changes;
+# older states are then ignored. They hold pattern contributions, so a
+# new summary.SUMMARY_VERSION invalidates them as well.
+STATE_VERSION = f"4.{SUMMARY_VERSION}"
+
+# Pattern records are looked up and written this many entries at a time,
+# one query per batch instead of one per entry.
+STATE_BATCH_SIZE = 512
+
+# Incremental state databases kept open between runs of a long-running
+# process, keyed by path. Only used after keep_state_resident(True).
+_resident_states: Dict[Path, sqlite3.Connection] = {}
+_keep_resident = False
+
+
+def fingerprint(raw: str) -> str:
+    """Short, fast content fingerprint of one entry's raw JSON text."""
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def content_hash(path: Path) -> str:
+    """Content hash of a whole file, read in chunks to keep memory flat."""
+    digest = hashlib.blake2b(digest_size=16)
+    for chunk in iter_file_chunks(path, HASH_CHUNK_SIZE):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_json_atomic(path: Path, obj, **dump_kwargs) -> None:
+    """
+    Write `obj` as JSON to `path` via a temporary file and rename, so a
+    crash mid-write never leaves a truncated file behind.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with tmp_path.open("w", encoding="utf-8") as f:
+        json.dump(obj, f, **dump_kwargs)
+    os.replace(tmp_path, path)
+
+
+def read_json_object(path: Path) -> dict:
+    """Load a JSON object, treating a missing or broken file as empty."""
+    try:
+        obj = loads(path.read_bytes())
+    except (OSError, ValueError):
+        return {}
+    return obj if isinstance(obj, dict) else {}
+
+
+def _check_input_file(path: Path, previous: Optional[dict]) -> Tuple[bool, Optional[dict]]:
+    """
+    Compare one input file against its record from the last run.
+
+    Returns (unchanged, record). A missing file has record None and is
+    unchanged if it was missing last time too.
+    """
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return previous is None, None
+
+    record = {"mtime_ns": st.st_mtime_ns, "size": st.st_size}
+    if (
+        previous is not None
+        and previous.get("mtime_ns") == record["mtime_ns"]
+        and previous.get("size") == record["size"]
+    ):
+        record["content_hash"] = previous["content_hash"]
+        return True, record
+
+    record["content_hash"] = content_hash(path)
+    return previous is not None and previous.get("content_hash") == record["content_hash"], record
+
+
+def manifest_key(path: Path, base_dir: Optional[Path] = None) -> str:
+    """Key of an input file in the manifest (see check_manifest())."""
+    return path.relative_to(base_dir).as_posix() if base_dir is not None else path.name
+
+
+def check_manifest(
+    input_paths: List[Path],
+    manifest_path: Path,
+    base_dir: Optional[Path] = None,
+    settings: Optional[dict] = None,
+) -> Tuple[bool, dict]:
+    """
+    Compare the input files against the manifest from the last run.
+
+    Returns (unchanged, manifest). `unchanged` is True when the same set
+    of inputs is known to be identical to the last run's (including files
+    that were and still are missing). `manifest` describes the current
+    inputs, keyed by file name (or by path relative to `base_dir`, e.g.
+    "patterns/part-0000.json" for shards), and should be saved with
+    save_manifest() once the run has succeeded (or right away, when
+    skipping).
+
+    For each file, the cheap stat comparison is tried first; its content
+    hash is only computed when the stat differs.
+
+    `settings` (JSON-serializable) describes configuration the outputs
+    depend on besides the inputs, e.g. the summary version and the
+    configured filters; if it differs from the last run's, nothing
+    counts as unchanged. Neither does anything after a run that was
+    saved as incomplete.
+    """
+    previous = read_json_object(manifest_path)
+    previous_files = previous.get("files") if previous.get("version") == MANIFEST_VERSION else None
+
+    unchanged = previous_files is not None
+    files = {}
+    for path in input_paths:
+        key = manifest_key(path, base_dir)
+        same, record = _check_input_file(path, (previous_files or {}).get(key))
+        files[key] = record
+        unchanged = unchanged and same
+    # A shard that disappeared changes the dataset too.
+    unchanged = unchanged and set(files) == set(previous_files)
+    unchanged = unchanged and previous.get("settings") == settings
+    unchanged = unchanged and previous.get("complete", True)
+    return unchanged, {"version": MANIFEST_VERSION, "files": files, "settings": settings}
+
+
+def save_manifest(manifest_path: Path, manifest: dict, complete: bool = True) -> None:
+    """
+    Persist the manifest returned by check_manifest(), for a run that
+    published its summaries (`complete`) or one that stopped early.
+    """
+    write_json_atomic(manifest_path, {**manifest, "complete": complete}, indent=2)
+
+
+def keep_state_resident(enabled: bool) -> None:
+    """
+    Keep incremental state databases open between runs of this process.
+
+    Saves reopening the database (and re-reading its first pages) on
+    every run of a resident process. Only the SQLite page cache stays in
+    memory, never the pattern records.
+    """
+    global _keep_resident
+    _keep_resident = enabled
+    if not enabled:
+        for conn in _resident_states.values():
+            conn.close()
+        _resident_states.clear()
+
+
+def open_database(path: Path, schema: List[str], version: str) -> sqlite3.Connection:
+    """
+    Open (creating if needed) a private SQLite database: a key/value meta
+    table plus the tables of `schema` (CREATE ... IF NOT EXISTS
+    statements).
+
+    A database that cannot be read, or whose meta "version" is not
+    `version`, is not an error: it is deleted and created afresh.
+    Transactions are started explicitly (isolation_level None).
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    for _attempt in range(2):
+        conn = sqlite3.connect(path, isolation_level=None)
+        try:
+            conn.execute("PRAGMA temp_store = FILE")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            for statement in schema:
+                conn.execute(statement)
+            if read_meta(conn).get("version", version) == version:
+                return conn
+        except sqlite3.DatabaseError:
+            pass
+        # Damaged, or of another version: start over.
+        conn.close()
+        path.unlink(missing_ok=True)
+        path.with_name(path.name + "-journal").unlink(missing_ok=True)
+    raise sqlite3.DatabaseError(f"cannot create the database {path}")
+
+
+def _connect_state(path: Path) -> sqlite3.Connection:
+    """Open the incremental state database at `path` (see open_database())."""
+    conn = _resident_states.get(path)
+    if conn is None:
+        conn = open_database(
+            path,
+            [
+                "CREATE TABLE IF NOT EXISTS patterns ("
+                "pattern_id TEXT PRIMARY KEY, fingerprint TEXT NOT NULL, "
+                "race TEXT NOT NULL, strategy_type TEXT NOT NULL"
+                ") WITHOUT ROWID"
+            ],
+            STATE_VERSION,
+        )
+        if _keep_resident:
+            _resident_states[path] = conn
+    return conn
+
+
+def read_meta(conn: sqlite3.Connection) -> dict:
+    """The meta table of a database from open_database()."""
+    return {key: json.loads(value) for key, value in conn.execute("SELECT key, value FROM meta")}
+
+
+def write_meta(conn: sqlite3.Connection, **values) -> None:
+    """Set values in the meta table of a database from open_database()."""
+    conn.executemany(
+        "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+        [(key, json.dumps(value, separators=(",", ":"))) for key, value in values.items()],
+    )
+
+
+def update_incremental(
+    patterns_path: Path,
+    state_path: Path,
+    on_entry: Optional[Callable[[str, dict], None]] = None,
+    index=None,
+    source_hash: Optional[str] = None,
+) -> Tuple[SummaryAccumulator, dict]:
+    """
+    Bring the summary up to date by applying per-pattern deltas.
+
+    Returns the updated accumulator and counts of added, removed, modified
+    and unchanged patterns. The new state is committed before returning.
+    `on_entry`, if given, is called with the ID and decoded entry of every
+    pattern (changed or not), e.g. to build other caches from the same
+    scan.
+
+    The whole file is still streamed (that is how changes are found), but
+    unchanged entries reuse their recorded contribution and the totals
+    are adjusted only by what actually changed.
+
+    `index`, if given, is a PatternIndex (see index.py) that receives the
+    same deltas. If it does not describe the dataset the previous state
+    was built from, it is rebuilt from the new state instead. Either way
+    it describes `source_hash` afterwards; saving it is up to the caller.
+    """
+    conn = _connect_state(state_path)
+    # The state file of older versions was one JSON document.
+    state_path.with_suffix(".json").unlink(missing_ok=True)
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        meta = read_meta(conn)
+        acc = (
+            SummaryAccumulator.from_dict(meta["summary"])
+            if "summary" in meta
+            else SummaryAccumulator()
+        )
+        rebuild_index = index is not None and (
+            "summary" not in meta
+            or index.source_hash is None
+            or index.source_hash != meta.get("source_hash")
+        )
+        if rebuild_index:
+            index.clear()
+        track_index = index is not None and not rebuild_index
+
+        # IDs seen in this run's file, to find the removed ones afterwards.
+        conn.execute("CREATE TEMP TABLE seen (pattern_id TEXT PRIMARY KEY) WITHOUT ROWID")
+        changes = {"added": 0, "removed": 0, "modified": 0, "unchanged": 0}
+
+        def apply(batch: List[Tuple[str, str, tuple]]) -> None:
+            ids = [pattern_id for pattern_id, _fp, _contribution in batch]
+            recorded = {
+                pattern_id: (fp, (race, strategy_type))
+                for pattern_id, fp, race, strategy_type in conn.execute(
+                    "SELECT pattern_id, fingerprint, race, strategy_type FROM patterns "
+                    f"WHERE pattern_id IN ({','.join('?' * len(ids))})",
+                    ids,
+                )
+            }
+            conn.executemany("INSERT OR IGNORE INTO seen VALUES (?)", ((pattern_id,) for pattern_id in ids))
+            written = []
+            for pattern_id, fp, contribution in batch:
+                previous = recorded.get(pattern_id)
+                if previous is not None and previous[0] == fp:
+                    changes["unchanged"] += 1
+                    continue
+
+                if previous is not None:
+                    acc.remove(previous[1])
+                    if track_index:
+                        index.remove(pattern_id, previous[1])
+                    changes["modified"] += 1
+                else:
+                    changes["added"] += 1
+
+                acc.add(contribution)
+                if track_index:
+                    index.add(pattern_id, contribution)
+                written.append((pattern_id, fp, *contribution))
+            conn.executemany("INSERT OR REPLACE INTO patterns VALUES (?, ?, ?, ?)", written)
+
+        batch = []
+        for pattern_id, entry, raw in iter_pattern_spans(patterns_path):
+            if on_entry is not None:
+                on_entry(pattern_id, entry)
+            batch.append((pattern_id, fingerprint(raw), pattern_contribution(entry)))
+            if len(batch) == STATE_BATCH_SIZE:
+                apply(batch)
+                batch = []
+        if batch:
+            apply(batch)
+
+        # Patterns recorded last time but not seen in this run's file.
+        # Every seen ID has a record by now, so equal counts mean none.
+        recorded_count = conn.execute("SELECT COUNT(*) FROM patterns").fetchone()[0]
+        seen_count = conn.execute("SELECT COUNT(*) FROM temp.seen").fetchone()[0]
+        if recorded_count != seen_count:
+            removed = conn.execute(
+                "SELECT pattern_id, race, strategy_type FROM patterns "
+                "WHERE pattern_id NOT IN (SELECT pattern_id FROM temp.seen)"
+            )
+            for pattern_id, race, strategy_type in removed:
+                acc.remove((race, strategy_type))
+                if track_index:
+                    index.remove(pattern_id, (race, strategy_type))
+                changes["removed"] += 1
+            conn.execute("DELETE FROM patterns WHERE pattern_id NOT IN (SELECT pattern_id FROM temp.seen)")
+        conn.execute("DROP TABLE temp.seen")
+
+        if rebuild_index:
+            for pattern_id, race, strategy_type in conn.execute(
+                "SELECT pattern_id, race, strategy_type FROM patterns"
+            ):
+                index.add(pattern_id, (race, strategy_type))
+        if index is not None:
+            index.source_hash = source_hash
+
+        write_meta(conn, version=STATE_VERSION, source_hash=source_hash, summary=acc.to_dict())
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        if not _keep_resident:
+            conn.close()
+    return acc, changes
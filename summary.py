@@ -0,0 +1,142 @@
+"""
+Privacy-safe aggregation of pattern entries.
+
+Every pattern entry is reduced to its *contribution* to the summary: a
+(race, strategy_type) pair of general categories. The accumulator only
+ever sees contributions, never raw entries, so nothing but counts can
+end up in the published summaries.
+
+All races are counted in the same single pass. The per-race document
+and the original Protoss-only document are both derived from the same
+running totals.
+
+Contributions can be added AND removed, which lets incremental runs
+apply deltas (added, removed, modified patterns) to a previous summary
+instead of recounting everything.
+"""
+
+from collections import Counter
+from typing import Dict, Tuple
+
+from normalize import RACE, STRATEGY_TYPE
+
+# Races reported in the all-races summary, in output order. Patterns
+# whose "race" is missing or not recognized (see normalize.py) count as
+# "unknown".
+RACES = ("Protoss", "Terran", "Zerg", "Random", "unknown")
+
+_race = RACE.canonical
+_strategy_type = STRATEGY_TYPE.canonical
+
+# Bump whenever the published summaries change for the same input: what
+# a pattern contributes (e.g. a new normalization, see normalize.py) or
+# the format of a summary document. Runs then never skip as unchanged.
+SUMMARY_VERSION = 1
+
+# (race, strategy_type) -- see pattern_contribution().
+Contribution = Tuple[str, str]
+
+# The pattern entry fields pattern_contribution() reads. Loaders can
+# skip everything else (see reader.py).
+CONTRIBUTION_FIELDS = ("race", "strategy_type")
+
+
+def pattern_contribution(entry: dict) -> Contribution:
+    """
+    Reduce one pattern entry to what it contributes to the summary.
+
+    Returns the canonical race name ("Protoss" for "protoss", "toss" or
+    "P", or "unknown") and the canonical strategy type (case-folded, or
+    "unknown" when it is missing); see normalize.py.
+    """
+    # The "strategy_type" field is safe to share because it's a general
+    # category like "protoss_aggression" or "economic_expansion".
+    try:
+        return _race(entry.get("race")), _strategy_type(entry.get("strategy_type"))
+    except TypeError:
+        # A list or object where a category should be.
+        return RACE(entry.get("race")), STRATEGY_TYPE(entry.get("strategy_type"))
+
+
+class SummaryAccumulator:
+    """
+    Running totals for the public summaries.
+
+    Holds only aggregate counts per race and strategy type; it can be
+    serialized into the all-races summary document and restored from it.
+    """
+
+    def __init__(self) -> None:
+        self.total_patterns = 0
+        self.breakdowns: Dict[str, Counter] = {race: Counter() for race in RACES}
+
+    def add(self, contribution: Contribution, count: int = 1) -> None:
+        """Count `count` patterns with the given contribution."""
+        race, strategy_type = contribution
+        self.total_patterns += count
+        self.breakdowns[race][strategy_type] += count
+
+    def remove(self, contribution: Contribution) -> None:
+        """Un-count a pattern previously added with `contribution`."""
+        race, strategy_type = contribution
+        breakdown = self.breakdowns[race]
+        self.total_patterns -= 1
+        breakdown[strategy_type] -= 1
+        if breakdown[strategy_type] <= 0:
+            del breakdown[strategy_type]
+
+    def merge(self, other: "SummaryAccumulator") -> None:
+        """Add the totals of `other` (e.g. one shard's) to these."""
+        self.total_patterns += other.total_patterns
+        for race, breakdown in other.breakdowns.items():
+            self.breakdowns[race].update(breakdown)
+
+    def to_dict(self) -> dict:
+        """
+        Build the privacy-safe all-races summary document.
+
+        We DO NOT include:
+          - individual build steps
+          - pattern IDs
+          - comments
+          - timestamps
+          - opponent information
+          - raw gameplay data
+
+        Only aggregate counts are returned. Breakdown keys are sorted so
+        the document is identical no matter in which order (or across how
+        many incremental runs) the counts were accumulated.
+        """
+        return {
+            "total_patterns_in_dataset": self.total_patterns,
+            "races": {
+                race: {
+                    "pattern_count": sum(breakdown.values()),
+                    "strategy_breakdown": dict(sorted(breakdown.items())),
+                }
+                for race, breakdown in self.breakdowns.items()
+            },
+        }
+
+    def protoss_dict(self) -> dict:
+        """
+        Build the original Protoss-only summary document.
+
+        Kept for backward compatibility with readers of
+        protoss_summary.json; it is a subset of to_dict().
+        """
+        breakdown = self.breakdowns["Protoss"]
+        return {
+            "total_patterns_in_dataset": self.total_patterns,
+            "protoss_pattern_count": sum(breakdown.values()),
+            "protoss_strategy_breakdown": dict(sorted(breakdown.items())),
+        }
+
+    @classmethod
+    def from_dict(cls, summary: dict) -> "SummaryAccumulator":
+        """Restore running totals from a summary built by to_dict()."""
+        acc = cls()
+        acc.total_patterns = summary["total_patterns_in_dataset"]
+        for race, race_summary in summary["races"].items():
+            acc.breakdowns[race] = Counter(race_summary["strategy_breakdown"])
+        return acc
@@ -0,0 +1,6 @@
+# The app modules live at the top level of the repository (SyftBox runs
+# main.py from there), so make them importable from the tests.
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
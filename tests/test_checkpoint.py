@@ -0,0 +1,191 @@
+"""
+Tests of time budgets and checkpoint/resume (checkpoint.py, and the
+budgeted stages of main.py): a pass resumed over and over with a budget
+of 0 must end with exactly the output of an unbudgeted pass.
+
+Run with: python -m pytest -q
+"""
+
+import json
+import random
+
+import pytest
+
+import main
+from checkpoint import Budget, ScanCheckpoint, resumable_pass, resumable_scan
+from extras import PatternStrategyJoin
+from filters import FilterSet
+from reader import PATTERN_ID_FIELD
+from summary import SummaryAccumulator, pattern_contribution
+
+FILTERS = {
+    "protoss": 'race == "toss"',
+    "confident": "confidence > 0.5 and not strategy_type == 'macro'",
+}
+
+
+def _patterns(count, seed=3):
+    rnd = random.Random(seed)
+    return {
+        f"pattern_{i:05d}": {
+            "race": rnd.choice(["Protoss", "Terran", "zerg", "P"]),
+            "strategy_type": rnd.choice(["macro", "Tech Rush", "cheese"]),
+            "confidence": rnd.random(),
+            "signature": {"early_game": [{"unit": "Probe ✦", "supply": rnd.randrange(20)}]},
+        }
+        for i in range(count)
+    }
+
+
+def _write_json(path, patterns):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(patterns, indent=1, ensure_ascii=False), encoding="utf-8")
+
+
+def _write_jsonl(path, patterns):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w", encoding="utf-8") as f:
+        for pattern_id, entry in patterns.items():
+            f.write(json.dumps({PATTERN_ID_FIELD: pattern_id, **entry}, ensure_ascii=False) + "\n")
+
+
+class _Pass:
+    """Everything one run of a pass accumulates, as a fresh process has it."""
+
+    def __init__(self, commented):
+        self.filters = FilterSet(FILTERS)
+        self.join = PatternStrategyJoin(wanted=commented)
+        self.parts = {"filters": self.filters, "join": self.join}
+
+    def observe(self, pattern_id, entry):
+        self.filters.observe(entry)
+        self.join.observe(pattern_id, entry)
+
+    def outputs(self):
+        return dict(self.filters.documents()), self.join.strategies
+
+
+def test_pass_resumes_across_files_to_the_unbudgeted_result(tmp_path):
+    patterns = _patterns(5000)
+    ids = list(patterns)
+    paths = [tmp_path / "part-0000.json", tmp_path / "part-0001.jsonl", tmp_path / "part-0002.json"]
+    _write_json(paths[0], {pid: patterns[pid] for pid in ids[:1500]})
+    _write_jsonl(paths[1], {pid: patterns[pid] for pid in ids[1500:3800]})
+    _write_json(paths[2], {pid: patterns[pid] for pid in ids[3800:]})
+    commented = set(ids[::7])
+
+    expected = _Pass(commented)
+    complete, stats = resumable_pass(
+        paths, ScanCheckpoint(tmp_path / "unused.json", "source"), Budget(), 60,
+        on_entry=expected.observe, parts=expected.parts,
+    )
+    assert complete and stats["entries"] == 5000
+
+    checkpoint = ScanCheckpoint(tmp_path / "checkpoint.json", {"patterns": "hash"}, {"filters": FILTERS})
+    runs, entries = 0, 0
+    while True:
+        resumed = _Pass(commented)
+        complete, stats = resumable_pass(
+            paths, checkpoint, Budget(0), 60, on_entry=resumed.observe, parts=resumed.parts,
+        )
+        runs += 1
+        entries += stats["entries"]
+        if complete:
+            break
+        assert checkpoint.path.exists()
+    assert runs > 3
+    assert entries == 5000
+    assert stats["position"][0] == len(paths) - 1
+    assert not checkpoint.path.exists()
+    assert resumed.outputs() == expected.outputs()
+
+
+def test_checkpoint_of_other_input_or_settings_is_ignored(tmp_path):
+    path = tmp_path / "patterns.json"
+    _write_json(path, _patterns(3000))
+    checkpoint_path = tmp_path / "checkpoint.json"
+    complete, _stats = resumable_pass(
+        [path], ScanCheckpoint(checkpoint_path, "a", {"x": 1}), Budget(0), 60,
+        on_entry=lambda *_: None,
+    )
+    assert not complete
+
+    for source, settings in (("b", {"x": 1}), ("a", {"x": 2}), (None, {"x": 1})):
+        assert ScanCheckpoint(checkpoint_path, source, settings).load() is None
+    assert ScanCheckpoint(checkpoint_path, "a", {"x": 1}).load()["position"] != [0, 0]
+
+
+def test_scan_resumes_to_the_unbudgeted_summary(tmp_path):
+    patterns = _patterns(4000)
+    path = tmp_path / "patterns.json"
+    _write_json(path, patterns)
+    expected = SummaryAccumulator()
+    for entry in patterns.values():
+        expected.add(pattern_contribution(entry))
+
+    checkpoint = ScanCheckpoint(tmp_path / "checkpoint.json", "hash")
+    acc = None
+    while acc is None:
+        acc, _stats = resumable_scan(path, checkpoint, Budget(0), 60)
+    assert acc.to_dict() == expected.to_dict()
+
+
+# ----------------------------------------------------------------
+# Whole runs of main.py
+# ----------------------------------------------------------------
+
+def _datasite(root, layout):
+    """A datasite with 5000 patterns in `layout`, comments and learning stats."""
+    patterns = _patterns(5000)
+    ids = list(patterns)
+    dataset = root / main.DATASET_REL_PATH
+    if layout == "json":
+        _write_json(dataset / "patterns.json", patterns)
+    else:
+        shards = dataset / "patterns"
+        _write_jsonl(shards / "part-0000.jsonl", {pid: patterns[pid] for pid in ids[:2000]})
+        _write_json(shards / "part-0001.json", {pid: patterns[pid] for pid in ids[2000:]})
+    (dataset / "comments.json").write_text(json.dumps(
+        [{"pattern_id": pid, "text": "gg"} for pid in ids[::11]]
+        + [{"strategy_type": "Tech Rush", "text": "wp"}]
+    ))
+    (dataset / "learning_stats.json").write_text(json.dumps(
+        {"per_game": [{"accuracy": i / 10} for i in range(10)]}
+    ))
+    return root
+
+
+def _run_until_complete(monkeypatch, datasite_root, budget):
+    monkeypatch.setattr(main, "TIME_BUDGET_SECONDS", budget)
+    statuses = []
+    while not statuses or statuses[-1] == "partial":
+        statuses.append(main.summarize_datasite(datasite_root))
+        assert len(statuses) < 50
+    return statuses
+
+
+def _published(datasite_root):
+    public = datasite_root / "public"
+    return {
+        str(path.relative_to(public)): json.loads(path.read_text())
+        for path in sorted(public.rglob("*.json"))
+    }
+
+
+@pytest.mark.parametrize("layout", ["json", "shards"])
+def test_budget_of_zero_resumes_to_the_unbudgeted_output(tmp_path, monkeypatch, layout):
+    monkeypatch.setattr(main, "FILTERS", FILTERS)
+    monkeypatch.setattr(main, "SHARD_WORKERS", 2)
+    monkeypatch.setattr(main, "INSTRUMENTATION", False)
+
+    full = _datasite(tmp_path / "full", layout)
+    assert _run_until_complete(monkeypatch, full, None) == ["written"]
+
+    budgeted = _datasite(tmp_path / "budgeted", layout)
+    statuses = _run_until_complete(monkeypatch, budgeted, 0)
+    assert statuses[-1] == "written" and len(statuses) > 2
+    assert _published(budgeted) == _published(full)
+    assert not list((budgeted / main.STATE_DIR).glob("*checkpoint*.json"))
+
+    # The finished run leaves a complete manifest behind.
+    assert main.summarize_datasite(budgeted) == "unchanged"
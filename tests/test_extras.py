@@ -0,0 +1,52 @@
+"""
+Tests of the learning_stats.json summary in extras.py: nothing that
+could identify a pattern, player or game may be published.
+
+Run with: python -m pytest -q
+"""
+
+import json
+
+from extras import summarize_learning_stats
+
+
+def _summarize(tmp_path, stats):
+    path = tmp_path / "learning_stats.json"
+    path.write_text(json.dumps(stats), encoding="utf-8")
+    return summarize_learning_stats(path)
+
+
+def test_id_keys_never_appear_in_group_names(tmp_path):
+    summary = _summarize(tmp_path, {
+        "pattern_001": {"games": [3, 4, 5, 6, 7]},
+        "pattern_002": {"games": [1, 2]},
+        "per_player": {"alice@x.com": [1, 2, 3, 4, 5], "bob@y.org": [6]},
+        "per_game": [{"accuracy": 0.5 + i / 100, "game_7f3a": i} for i in range(6)],
+    })
+    published = json.dumps(summary)
+    for identifier in ("pattern_001", "pattern_002", "alice@x.com", "bob@y.org", "game_7f3a"):
+        assert identifier not in published
+
+    distributions = summary["distributions"]
+    assert set(distributions) == {"games", "per_player", "per_game.accuracy", "per_game"}
+    # Values under ID keys are pooled with their siblings'.
+    assert distributions["games"] == {"count": 7, "mean": 4.0}
+    assert distributions["per_player"] == {"count": 6, "mean": 3.5}
+
+
+def test_no_single_values_are_published(tmp_path):
+    summary = _summarize(tmp_path, {"per_game": [{"duration": 600 + i} for i in range(10)]})
+    assert summary["distributions"] == {"per_game.duration": {"count": 10, "mean": 604.5}}
+
+
+def test_small_and_unlisted_groups_are_suppressed(tmp_path):
+    summary = _summarize(tmp_path, {
+        "games_analyzed": 120,
+        "secret_section": {"player_42": [1, 2, 3, 4, 5, 6]},
+        "per_game": [{"apm": 150}],
+    })
+    assert summary == {
+        "distributions": {},
+        "suppressed_groups": 2,
+        "unlisted_values": 6,
+    }
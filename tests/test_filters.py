@@ -0,0 +1,116 @@
+"""
+Tests of the filter expression language in filters.py.
+
+Run with: python -m pytest -q
+"""
+
+import pytest
+
+from filters import Filter, FilterError
+
+
+def _matches(expression, entries):
+    predicate = Filter("test", expression).predicate
+    return [predicate(entry) for entry in entries]
+
+
+@pytest.mark.parametrize("field", ["race", "strategy_type"])
+def test_bare_categorical_field_is_false_when_unknown(field):
+    entries = [{}, {field: None}, {field: ""}, {field: 3}, {field: "unknown"}]
+    assert _matches(field, entries) == [False] * len(entries)
+    assert _matches(f"not {field}", entries) == [True] * len(entries)
+
+
+def test_bare_categorical_field_is_true_for_a_category():
+    assert _matches("race", [{"race": "toss"}, {"race": "Xel'Naga"}]) == [True, False]
+    assert _matches("strategy_type", [{"strategy_type": "Tech Rush"}]) == [True]
+
+
+@pytest.mark.parametrize(
+    "expression, message",
+    [
+        ("", "empty expression"),
+        ("race ==", "expected a field or value, got end of expression"),
+        ("race == 'Protoss' and", "expected a field or value, got end of expression"),
+        ("(race == 'Protoss'", "expected ')'"),
+        ("race == 'Protoss')", "unexpected ')'"),
+        ("race $ 'Protoss'", "unexpected character at 5"),
+        ("1 == 2", "a comparison needs a field, got only values"),
+        ("'Protoss'", "a value on its own is not a condition"),
+        ("1 in [1]", "'in' needs a field on its left"),
+        ("race in [strategy_type]", "lists may only hold values"),
+        ("race in ['Protoss' 'Zerg']", "expected ','"),
+        ("confidence > null", "> needs a number or string to compare with"),
+        ("confidence <= true", "<= needs a number or string to compare with"),
+        ("race == 'Xel'Naga'", "unexpected"),
+        ("race == 'Xelnaga'", "race: 'Xelnaga' is not one of Protoss, Random, Terran, Zerg or 'unknown'"),
+        ("race in ['toss', 'Tosh']", "race: 'Tosh' is not one of"),
+    ],
+)
+def test_parser_errors(expression, message):
+    with pytest.raises(FilterError) as raised:
+        Filter("test", expression)
+    assert message in str(raised.value)
+    assert str(raised.value).startswith("filter 'test': ")
+
+
+@pytest.mark.parametrize("name", ["", "../escape", "a b", "café", None])
+def test_invalid_names(name):
+    with pytest.raises(FilterError):
+        Filter(name, "race")
+
+
+ENTRIES = [
+    {"race": "Protoss", "strategy_type": "Tech Rush", "confidence": 0.9, "sample_count": 25},
+    {"race": "toss", "strategy_type": "tech_rush", "confidence": "0.95", "sample_count": 5},
+    {"race": " ZERG ", "strategy_type": "macro", "confidence": 0.5, "tags": {"early": True}},
+    {"race": "Xel'Naga", "confidence": None, "sample_count": 30.0, "tags": {"early": False}},
+    {},
+]
+
+
+@pytest.mark.parametrize(
+    "expression, expected",
+    [
+        # Categories compare by canonical form, on both sides.
+        ("race == 'P'", [True, True, False, False, False]),
+        ("race != 'Protoss'", [False, False, True, True, True]),
+        ("race == 'unknown'", [False, False, False, True, True]),
+        ("race == null", [False, False, False, True, True]),
+        ("strategy_type == 'TECH RUSH'", [True, True, False, False, False]),
+        ("race in ['toss', 'z']", [True, True, True, False, False]),
+        ("race not in ['toss', 'z']", [False, False, False, True, True]),
+        ("strategy_type in ['Macro', 'unknown']", [False, False, True, True, True]),
+        # Ordering only matches values of the literal's kind.
+        ("confidence > 0.8", [True, False, False, False, False]),
+        ("confidence >= '0.9'", [False, True, False, False, False]),
+        ("0.8 < confidence", [True, False, False, False, False]),
+        ("sample_count >= 20", [True, False, False, True, False]),
+        ("sample_count == 30", [False, False, False, True, False]),
+        ("sample_count != 25", [False, True, True, True, True]),
+        # Missing fields are null.
+        ("confidence == null", [False, False, False, True, True]),
+        ("sample_count in [5, null]", [False, True, True, False, True]),
+        # Dotted paths and truth tests.
+        ("tags.early", [False, False, True, False, False]),
+        ("tags.early == false", [False, False, False, True, False]),
+        ("not tags.early", [True, True, False, True, True]),
+        ("tags.missing.deeper == null", [True, True, True, True, True]),
+        # Field against field never raises.
+        ("confidence > sample_count", [False, False, False, False, False]),
+        ("sample_count > confidence", [True, False, False, False, False]),
+        # Precedence: not > and > or.
+        ("race == 'Z' or race == 'P' and confidence > 0.8", [True, False, True, False, False]),
+        ("(race == 'Z' or race == 'P') and confidence > 0.8", [True, False, False, False, False]),
+        ("not race == 'P' and not race == 'unknown'", [False, False, True, False, False]),
+        ("not not race", [True, True, True, False, False]),
+    ],
+)
+def test_operator_semantics(expression, expected):
+    assert _matches(expression, ENTRIES) == expected
+
+
+def test_fields_read():
+    assert Filter("test", "race == 'P' and tags.early or confidence > 1").fields == {
+        "race", "tags", "confidence",
+    }
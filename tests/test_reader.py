@@ -0,0 +1,135 @@
+"""
+Tests of the streaming readers in reader.py, checked against json.load().
+
+Run with: python -m pytest -q
+"""
+
+import json
+
+import pytest
+
+from reader import (
+    PATTERN_ID_FIELD,
+    PatternCursor,
+    iter_pattern_lines,
+    iter_patterns,
+    split_line_ranges,
+)
+
+
+def _patterns(count=40):
+    # Multi-byte UTF-8 (2, 3 and 4 bytes), escapes and brackets inside
+    # strings, so a small chunk_size splits characters and tokens alike.
+    return {
+        f"pattern_{i:03d}": {
+            "race": ["Protoss", "Terran", "Zerg"][i % 3],
+            "strategy_type": ["rush", "macro", "timing"][i % 4 % 3],
+            "name": f"Sturmläufer ✦ 星灵 {i} 🛸",
+            "notes": 'braces } { and "quotes" \\ inside ]',
+            "build_order": [{"supply": s, "unit": "Zélote"} for s in range(i % 5)],
+            "success_rate": i / 40,
+        }
+        for i in range(count)
+    }
+
+
+@pytest.fixture(params=[{"indent": 2}, {"separators": (",", ":")}], ids=["indented", "compact"])
+def patterns_json(tmp_path, request):
+    path = tmp_path / "patterns.json"
+    path.write_text(json.dumps(_patterns(), ensure_ascii=False, **request.param), encoding="utf-8")
+    return path
+
+
+@pytest.fixture
+def patterns_jsonl(tmp_path):
+    path = tmp_path / "patterns.jsonl"
+    with path.open("w", encoding="utf-8") as f:
+        for pattern_id, entry in _patterns().items():
+            f.write(json.dumps({PATTERN_ID_FIELD: pattern_id, **entry}, ensure_ascii=False) + "\n")
+            if pattern_id.endswith("7"):
+                f.write("\n")
+    return path
+
+
+def _expected_lines(path):
+    expected = []
+    for line in path.read_bytes().splitlines():
+        if line.strip():
+            entry = json.loads(line)
+            expected.append((entry.pop(PATTERN_ID_FIELD), entry))
+    return expected
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 64, 1 << 20])
+def test_iter_patterns_matches_json_load(patterns_json, chunk_size):
+    with patterns_json.open(encoding="utf-8") as f:
+        expected = list(json.load(f).items())
+    assert list(iter_patterns(patterns_json, chunk_size=chunk_size)) == expected
+
+
+def test_iter_patterns_fields(patterns_json):
+    with patterns_json.open(encoding="utf-8") as f:
+        expected = [
+            (pattern_id, {"race": entry["race"]}) for pattern_id, entry in json.load(f).items()
+        ]
+    assert list(iter_patterns(patterns_json, chunk_size=5, fields=["race"])) == expected
+
+
+@pytest.mark.parametrize("chunk_size", [3, 64, 1 << 20])
+def test_pattern_cursor_resumes_at_every_offset(patterns_json, chunk_size):
+    with patterns_json.open(encoding="utf-8") as f:
+        expected = list(json.load(f).items())
+
+    # The offset after each entry, as a checkpoint would record it.
+    cursor = PatternCursor(patterns_json, chunk_size=chunk_size)
+    offsets = []
+    for _pair in cursor:
+        offsets.append(cursor.offset())
+    assert offsets == sorted(offsets)
+
+    for done, offset in enumerate(offsets):
+        resumed = PatternCursor(patterns_json, start=offset, chunk_size=chunk_size)
+        assert list(resumed) == expected[done + 1:]
+
+
+def test_pattern_cursor_resumes_json_lines(patterns_jsonl):
+    expected = _expected_lines(patterns_jsonl)
+    cursor = PatternCursor(patterns_jsonl)
+    offsets = []
+    for _pair in cursor:
+        offsets.append(cursor.offset())
+
+    for done, offset in enumerate(offsets):
+        assert list(PatternCursor(patterns_jsonl, start=offset)) == expected[done + 1:]
+
+
+@pytest.mark.parametrize("parts", [1, 2, 3, 8, 1000])
+def test_split_line_ranges_cover_every_line_once(patterns_jsonl, parts):
+    ranges = split_line_ranges(patterns_jsonl, parts)
+    assert ranges[0][0] == 0
+    assert ranges[-1][1] == patterns_jsonl.stat().st_size
+    assert all(end == start for (_, end), (start, _) in zip(ranges, ranges[1:]))
+
+    read = [pair for start, end in ranges for pair in iter_pattern_lines(patterns_jsonl, start, end)]
+    assert read == _expected_lines(patterns_jsonl)
+
+
+def test_syntax_error_raises_without_reading_the_rest(tmp_path):
+    # A broken first entry followed by a few MB of valid ones: the error
+    # must come from the window at hand, not after reading everything.
+    path = tmp_path / "patterns.json"
+    body = ",".join(f'"pattern_{i:06d}": {{"race": "Zerg"}}' for i in range(100_000))
+    path.write_text('{"pattern_bad": {"race" "Protoss"}, ' + body + "}", encoding="utf-8")
+
+    with pytest.raises(json.JSONDecodeError) as raised:
+        list(iter_patterns(path, chunk_size=4096))
+    assert raised.value.msg == "Expecting ':' delimiter"
+    assert len(raised.value.doc) <= 2 * 4096
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1 << 20])
+def test_truncated_file_raises(patterns_json, chunk_size):
+    text = patterns_json.read_text(encoding="utf-8")
+    patterns_json.write_text(text[: len(text) // 2], encoding="utf-8")
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_patterns(patterns_json, chunk_size=chunk_size))
@@ -0,0 +1,134 @@
+"""
+Tests of the incremental state (state.update_incremental()) and of the
+manifest: every incremental result must equal a full recount.
+
+Run with: python -m pytest -q
+"""
+
+from collections import Counter
+import json
+import random
+
+import pytest
+
+from index import PatternIndex
+from state import check_manifest, save_manifest, update_incremental
+from summary import SummaryAccumulator, pattern_contribution
+
+RACES = ["Protoss", "toss", "Terran", "T", "zerg", "Random", "Xel'Naga", None]
+STRATEGIES = ["Tech Rush", "tech_rush", "macro", "Protoss Aggression", "", None]
+
+
+def _entry(rnd):
+    entry = {"sample_count": rnd.randrange(100), "signature": {"early_game": [rnd.random()]}}
+    for field, values in (("race", RACES), ("strategy_type", STRATEGIES)):
+        value = rnd.choice(values)
+        if value is not None:
+            entry[field] = value
+    return entry
+
+
+def _recount(patterns):
+    acc = SummaryAccumulator()
+    for entry in patterns.values():
+        acc.add(pattern_contribution(entry))
+    return acc
+
+
+def _mutate(rnd, patterns, next_id):
+    """Add, remove and modify some patterns; returns the expected changes."""
+    ids = sorted(patterns)
+    removed = rnd.sample(ids, 15)
+    for pattern_id in removed:
+        del patterns[pattern_id]
+    modified = rnd.sample(sorted(patterns), 20)
+    for pattern_id in modified:
+        entry = patterns[pattern_id]
+        # Always a change of an unrelated field, often of the contribution.
+        entry["sample_count"] += 1
+        if rnd.random() < 0.5:
+            entry["race"] = rnd.choice(["Zerg", "P", "unknown"])
+    added = [f"pattern_{next_id + i:05d}" for i in range(25)]
+    for pattern_id in added:
+        patterns[pattern_id] = _entry(rnd)
+    return {
+        "added": len(added),
+        "removed": len(removed),
+        "modified": len(modified),
+        "unchanged": len(patterns) - len(added) - len(modified),
+    }
+
+
+@pytest.mark.parametrize("with_index", [False, True])
+def test_incremental_equals_full_recount(tmp_path, with_index):
+    rnd = random.Random(7)
+    patterns = {f"pattern_{i:05d}": _entry(rnd) for i in range(300)}
+    patterns_path = tmp_path / "patterns.json"
+    state_path = tmp_path / "state" / "incremental_state.sqlite"
+    state_path.parent.mkdir()
+    index_dir = tmp_path / "index"
+
+    expected_changes = {"added": 300, "removed": 0, "modified": 0, "unchanged": 0}
+    for round_number in range(5):
+        if round_number:
+            expected_changes = _mutate(rnd, patterns, 1000 * round_number)
+        # Round 2 only is indented, so rounds 2 and 3 change every entry's text.
+        reformatted = round_number in (2, 3)
+        patterns_path.write_text(json.dumps(patterns, indent=2 if round_number == 2 else None))
+        source_hash = f"hash-{round_number}"
+
+        index = PatternIndex(index_dir) if with_index else None
+        seen = {}
+        acc, changes = update_incremental(
+            patterns_path,
+            state_path,
+            on_entry=seen.__setitem__,
+            index=index,
+            source_hash=source_hash,
+        )
+        assert acc.to_dict() == _recount(patterns).to_dict()
+        assert seen == patterns
+        if not reformatted:
+            assert changes == expected_changes
+        else:
+            # Every surviving pattern reads as modified.
+            assert changes["added"] == expected_changes["added"]
+            assert changes["removed"] == expected_changes["removed"]
+            assert changes["unchanged"] == 0
+
+        if index is not None:
+            # Round 3's index is never saved, so round 4 rebuilds it.
+            if round_number != 3:
+                index.save()
+            index.close()
+            if round_number == 3:
+                continue
+            index = PatternIndex.load(index_dir, source_hash)
+            contributions = {pid: pattern_contribution(entry) for pid, entry in patterns.items()}
+            assert index.counts() == Counter(contributions.values())
+            assert index.pattern_ids(race="Protoss") == {
+                pid for pid, (race, _strategy) in contributions.items() if race == "Protoss"
+            }
+            assert index.contributions_of(["missing", *contributions]) == contributions
+            index.close()
+
+
+def test_manifest_skips_only_complete_unchanged_runs(tmp_path):
+    data = tmp_path / "patterns.json"
+    data.write_text("{}")
+    manifest_path = tmp_path / "manifest.json"
+    settings = {"summary_version": 1}
+
+    unchanged, manifest = check_manifest([data], manifest_path, base_dir=tmp_path, settings=settings)
+    assert not unchanged
+    save_manifest(manifest_path, manifest, complete=False)
+    # A partial run's hashes are kept, but it never counts as unchanged.
+    unchanged, manifest = check_manifest([data], manifest_path, base_dir=tmp_path, settings=settings)
+    assert not unchanged
+    save_manifest(manifest_path, manifest)
+    assert check_manifest([data], manifest_path, base_dir=tmp_path, settings=settings)[0]
+    assert not check_manifest(
+        [data], manifest_path, base_dir=tmp_path, settings={"summary_version": 2}
+    )[0]
+    data.write_text('{"pattern_1": {}}')
+    assert not check_manifest([data], manifest_path, base_dir=tmp_path, settings=settings)[0]